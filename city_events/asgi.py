@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'city_events.settings')
+# Публичные страницы и API - асинхронными представлениями (ASYNC_VIEWS)
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
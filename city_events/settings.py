@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,12 +47,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Статика отвечает раньше всего остального (events/staticfiles.py)
+    'events.middleware.StaticFilesMiddleware',
+    # Следом, чтобы замерять и остальные middleware (events/middleware.py)
+    'events.middleware.PerformanceMiddleware',
+    # Сброс кэшей процесса после изменений в других воркерах (events/invalidation.py)
+    'events.middleware.InvalidationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'events.middleware.ReplicaPinMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -58,7 +67,8 @@ ROOT_URLCONF = 'city_events.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Стандартный бэкенд с замером времени отрисовки
+        'BACKEND': 'events.template_backends.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,6 +83,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'city_events.wsgi.application'
 
+# Асинхронные версии публичных страниц и API (events/async_views.py).
+# Включается в city_events/asgi.py: под WSGI каждый асинхронный
+# запрос запускал бы собственный цикл событий.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -81,9 +96,93 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Соединение живёт между запросами воркера, а не открывается заново
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Реплика для чтения (events/routers.py). Включается переменной окружения
+# DATABASE_REPLICA_NAME - путь ко второму файлу SQLite, который
+# поддерживает в актуальном виде команда replicate_db. Публичные страницы
+# и API читают мероприятия с реплики, запись всегда идёт в основную базу.
+
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DATABASE_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['events.routers.ReadReplicaRouter']
+
+# Сколько секунд после записи браузер читает из основной базы
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = 'use_primary'
+
+# Параметры SQLite для каждого соединения (events/db.py).
+# WAL: читатели не блокируются записью; synchronous=normal в режиме WAL
+# не теряет целостность базы; busy_timeout - сколько миллисекунд ждать
+# блокировку вместо ошибки "database is locked"; cache_size в КиБ со
+# знаком минус; mmap_size - сколько байт базы читать через mmap.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 134217728,
+    'temp_store': 'memory',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Кэш готовых страниц афиши (events/page_cache.py). Для нескольких процессов
+# gunicorn лучше использовать общий бэкенд (Redis, Memcached, база данных).
+# Блоки ленты iCalendar (events/ical.py) - по одному на мероприятие - живут
+# в отдельном кэше, чтобы не вытеснять страницы из 'default'.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'city-events',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'city-events-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
 }
 
+# Домен в UID мероприятий ленты iCalendar. UID должен быть постоянным:
+# календари подписчиков узнают по нему уже добавленные мероприятия.
+
+ICAL_UID_DOMAIN = os.environ.get('ICAL_UID_DOMAIN', 'city-events.local')
+
+
+# Повторяющиеся мероприятия (events/recurrence.py): на сколько дней вперёд
+# повторы создаются строками для афиши и поиска
+
+RECURRENCE_WINDOW_DAYS = 90
+
+
+# Общий номер поколения данных для всех воркеров (events/invalidation.py).
+# Процессы одного сайта должны видеть один и тот же файл.
+
+INVALIDATION_FILE = Path(os.environ.get(
+    'INVALIDATION_FILE', Path(tempfile.gettempdir()) / 'city-events-invalidation'
+))
+
+
+# Метрики производительности (events/metrics.py)
+# Каждый процесс пишет свои метрики в METRICS_DIR, страница /metrics
+# суммирует их. Сборщик метрик может обращаться к странице с токеном.
+
+METRICS_DIR = Path(os.environ.get('METRICS_DIR', Path(tempfile.gettempdir()) / 'city-events-metrics'))
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -125,5 +224,29 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Загруженные афиши: ширины уменьшенных копий (JPEG и WebP), число
+# фоновых потоков, которые их готовят, и предельный размер файла
+IMAGE_WIDTHS = (320, 640, 1280)
+IMAGE_WORKERS = 2
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
 STATIC_URL = '/static/'
-STATIC_ROOT = BASE_DIR / 'staticfiles'
\ No newline at end of file
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic даёт файлам имена с хэшем содержимого и пишет .gz-копии;
+# такие файлы отдаются с Cache-Control: immutable
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'events.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Статические копии публичных страниц (команда prerender_site).
+# PRERENDER_ON_SAVE обновляет их в фоне после каждого изменения
+# мероприятий - в админке, при импорте и деактивации прошедших.
+PRERENDER_ROOT = BASE_DIR / 'prerendered'
+PRERENDER_HOST = 'localhost'
+PRERENDER_ON_SAVE = os.environ.get('PRERENDER_ON_SAVE', '') == '1'
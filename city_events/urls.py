@@ -2,24 +2,43 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
-from events import views
+from events import api, async_views, views
+
+# Под ASGI публичные страницы и API обслуживают асинхронные представления
+public_views = async_views if settings.ASYNC_VIEWS else views
+api_views = async_views if settings.ASYNC_VIEWS else api
 
 urlpatterns = [
     # Django admin (встроенная панель)
     path('django-admin/', admin.site.urls),
     
     # Публичные страницы
-    path('', views.event_list, name='event_list'),
-    path('event/<int:event_id>/', views.event_detail, name='event_detail'),
+    path('', public_views.event_list, name='event_list'),
+    path('search/', views.event_search, name='event_search'),
+    path('event/<int:event_id>/', public_views.event_detail, name='event_detail'),
+    path('event/<int:event_id>.ics', views.event_ics, name='event_ics'),
+    path('calendar/', views.event_calendar, name='event_calendar'),
+    path('events.ics', views.events_ics, name='events_ics'),
+    
+    # JSON API
+    path('api/events/', api_views.api_event_list, name='api_event_list'),
+    path('api/events/changes/', api.api_event_changes, name='api_event_changes'),
+    path('api/events/<int:event_id>/', api_views.api_event_detail, name='api_event_detail'),
+    path('api/venues/', api.api_venue_list, name='api_venue_list'),
+    path('api/calendar/', api.api_event_calendar, name='api_event_calendar'),
     
     # Административная панель (кастомная)
     path('admin/login/', views.admin_login, name='admin_login'),
     path('admin/logout/', views.admin_logout, name='admin_logout'),
     path('admin/events/', views.admin_events, name='admin_events'),
+    path('admin/events/bulk/', views.admin_events_bulk, name='admin_events_bulk'),
     path('admin/events/add/', views.admin_event_add, name='admin_event_add'),
     path('admin/events/<int:event_id>/edit/', views.admin_event_edit, name='admin_event_edit'),
     path('admin/events/<int:event_id>/toggle/', views.admin_event_toggle, name='admin_event_toggle'),
     path('admin/events/<int:event_id>/delete/', views.admin_event_delete, name='admin_event_delete'),
+    
+    # Метрики производительности (Prometheus)
+    path('metrics', views.metrics_view, name='metrics'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
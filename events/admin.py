@@ -1,22 +1,41 @@
 from django.contrib import admin
-from .models import Event
+from .models import Event, Venue
+
+
+@admin.register(Venue)
+class VenueAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key')
+    search_fields = ('name', 'key')
+    readonly_fields = ('key',)
+
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     list_display = ('title', 'date', 'location', 'is_active')
-    list_filter = ('is_active', 'date')
+    list_filter = ('is_active', 'date', 'venue', 'recurrence')
     search_fields = ('title', 'location')
+    autocomplete_fields = ('venue',)
     
     fieldsets = (
         ('Основная информация', {
-            'fields': ('title', 'date', 'time', 'location', 'description')
+            'fields': ('title', 'date', 'time', 'venue', 'description')
         }),
         ('Изображение', {
-            'fields': ('image_url',),
+            'fields': ('image', 'image_url'),
+            'classes': ('collapse',)
+        }),
+        ('Повторение', {
+            'fields': ('recurrence', 'recurrence_interval', 'recurrence_until'),
             'classes': ('collapse',)
         }),
         ('Системные настройки', {
             'fields': ('is_active',),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Поля location в форме нет, поэтому место обязательно
+        if db_field.name == 'venue':
+            kwargs['required'] = True
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
@@ -0,0 +1,160 @@
+"""JSON API для внешних клиентов (киоски, мобильное приложение).
+
+Данные берутся прямо из ``.values()`` без создания объектов Event, а
+большие списки отдаются потоком, порциями по ``CHUNK_SIZE`` строк.
+"""
+from datetime import date, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from . import changes, day_counts
+from .models import Event, Venue
+
+
+CHUNK_SIZE = 500
+
+LIST_FIELDS = ('id', 'title', 'date', 'time', 'starts_at', 'location', 'venue_id', 'image_url')
+DETAIL_FIELDS = LIST_FIELDS + ('description', 'updated_at')
+
+LIST_ORDERING = ('date', 'time', 'id')
+
+# Поля мероприятия в журнале изменений: клиент сам скрывает неактивные
+CHANGE_FIELDS = DETAIL_FIELDS + ('is_active',)
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise FilterError(f'Параметр {name} должен быть датой в формате ГГГГ-ММ-ДД.')
+
+
+def filter_events(queryset, params):
+    """Применяет фильтры date_from, date_to, venue и location из GET-параметров"""
+    if params.get('date_from'):
+        queryset = queryset.filter(date__gte=_parse_date(params['date_from'], 'date_from'))
+    if params.get('date_to'):
+        queryset = queryset.filter(date__lte=_parse_date(params['date_to'], 'date_to'))
+    if params.get('venue'):
+        if not params['venue'].isdigit():
+            raise FilterError('Параметр venue должен быть id места.')
+        queryset = queryset.filter(venue_id=int(params['venue']))
+    if params.get('location'):
+        queryset = queryset.filter(location__icontains=params['location'])
+    return queryset
+
+
+def stream_json_array(rows, chunk_size=CHUNK_SIZE):
+    """Отдаёт строки как JSON-массив порциями по ``chunk_size``"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield '['
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(encoder.encode(row))
+        if len(chunk) >= chunk_size:
+            yield ('' if first else ',') + ','.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield ('' if first else ',') + ','.join(chunk)
+    yield ']'
+
+
+async def astream_json_array(rows, chunk_size=CHUNK_SIZE):
+    """То же, что ``stream_json_array``, для асинхронного итератора строк"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield '['
+    chunk = []
+    first = True
+    async for row in rows:
+        chunk.append(encoder.encode(row))
+        if len(chunk) >= chunk_size:
+            yield ('' if first else ',') + ','.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield ('' if first else ',') + ','.join(chunk)
+    yield ']'
+
+
+@require_GET
+def api_event_list(request):
+    """Список предстоящих мероприятий"""
+    try:
+        events = filter_events(Event.objects.upcoming(), request.GET)
+    except FilterError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    # Строки читаются уже после выхода из представления, поэтому база
+    # (реплика или основная) выбирается сейчас, пока идёт запрос
+    events = events.using(events.db)
+    rows = events.order_by(*LIST_ORDERING).values(*LIST_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    return StreamingHttpResponse(
+        stream_json_array(rows),
+        content_type='application/json; charset=utf-8',
+    )
+
+
+@require_GET
+def api_event_detail(request, event_id):
+    """Одно предстоящее мероприятие"""
+    event = Event.objects.upcoming().filter(id=event_id).values(*DETAIL_FIELDS).first()
+    if event is None:
+        return JsonResponse({'error': 'Мероприятие не найдено.'}, status=404)
+    return JsonResponse(event, json_dumps_params={'ensure_ascii': False})
+
+
+@require_GET
+def api_venue_list(request):
+    """Места проведения (id для фильтра venue)"""
+    venues = list(Venue.objects.order_by('name').values('id', 'name'))
+    return JsonResponse(venues, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+@require_GET
+def api_event_calendar(request):
+    """Число активных мероприятий по дням месяца (?month=ГГГГ-ММ)"""
+    try:
+        month = day_counts.parse_month(request.GET.get('month'), timezone.localdate())
+    except ValueError:
+        return JsonResponse({'error': 'Параметр month должен быть месяцем в формате ГГГГ-ММ.'}, status=400)
+
+    _, following = day_counts.adjacent_months(month)
+    counts = day_counts.active_counts(month, following - timedelta(days=1))
+    return JsonResponse({
+        'month': month.strftime('%Y-%m'),
+        'days': [{'date': day, 'events': counts[day]} for day in sorted(counts)],
+    })
+
+
+@require_GET
+def api_event_changes(request):
+    """Изменения мероприятий после курсора ?since= (без него - все с начала
+    журнала), порциями по ?limit= записей"""
+    limit = request.GET.get('limit', '')
+    if limit and (not limit.isdigit() or not 1 <= int(limit) <= changes.MAX_PAGE_SIZE):
+        return JsonResponse(
+            {'error': f'Параметр limit должен быть числом от 1 до {changes.MAX_PAGE_SIZE}.'}, status=400
+        )
+    try:
+        entries, following, has_more = changes.read_changes(
+            request.GET.get('since'), int(limit or changes.PAGE_SIZE), CHANGE_FIELDS
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Неверный курсор since.'}, status=400)
+    except changes.StaleCursor:
+        return JsonResponse(
+            {'error': 'Курсор не найден в журнале изменений: загрузите список заново без since.'}, status=410
+        )
+    return JsonResponse(
+        {'changes': entries, 'next': following, 'has_more': has_more},
+        json_dumps_params={'ensure_ascii': False},
+    )
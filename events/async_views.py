@@ -0,0 +1,105 @@
+"""Асинхронные версии публичных страниц и JSON API.
+
+Подключаются вместо синхронных, когда проект запущен под ASGI (настройка
+ASYNC_VIEWS, её включает city_events/asgi.py). Запросы к базе идут через
+асинхронный ORM, кэш - через асинхронный API кэша, поэтому запрос не
+занимает поток на всё время обработки. Логика та же, что в
+events/views.py и events/api.py.
+"""
+from functools import wraps
+
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+
+from . import conditional
+from .api import (
+    CHUNK_SIZE, DETAIL_FIELDS, LIST_FIELDS, LIST_ORDERING, FilterError, astream_json_array, filter_events,
+)
+from .models import Event, Venue
+from .page_cache import cache_public_page
+from .pagination import KeysetPaginator
+from .views import EVENT_LIST_ORDERING, EVENT_LIST_PAGE_SIZE, event_cards, venue_id
+
+
+def no_cache(view):
+    """Асинхронный аналог ``cache_control(no_cache=True)``"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        response = await view(request, *args, **kwargs)
+        patch_cache_control(response, no_cache=True)
+        return response
+    return wrapper
+
+
+def require_get(view):
+    """Асинхронный аналог ``require_GET``"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@no_cache
+@conditional.acondition(etag_func=conditional.aevent_list_etag,
+                        last_modified_func=conditional.aevent_list_last_modified)
+@cache_public_page('event_list')
+async def event_list(request):
+    """Главная страница - список будущих мероприятий"""
+    selected = venue_id(request)
+    venue = None
+    if selected is not None:
+        venue = await Venue.objects.filter(id=selected).afirst()
+        if venue is None:
+            raise Http404('Место не найдено.')
+    paginator = KeysetPaginator(
+        event_cards(venue), EVENT_LIST_ORDERING, EVENT_LIST_PAGE_SIZE
+    )
+    page = await paginator.apage(request.GET.get('cursor'))
+
+    return render(request, 'events/event_list.html', {
+        'events': page.object_list,
+        'page': page,
+        'venue': venue
+    })
+
+
+@no_cache
+@conditional.acondition(etag_func=conditional.aevent_detail_etag,
+                        last_modified_func=conditional.aevent_detail_last_modified)
+@cache_public_page('event_detail')
+async def event_detail(request, event_id):
+    """Страница деталей мероприятия"""
+    event = await Event.objects.upcoming().filter(id=event_id).afirst()
+    if event is None:
+        raise Http404('Мероприятие не найдено.')
+    return render(request, 'events/event_detail.html', {'event': event})
+
+
+@require_get
+async def api_event_list(request):
+    """Список предстоящих мероприятий"""
+    try:
+        events = filter_events(Event.objects.upcoming(), request.GET)
+    except FilterError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    # Строки читаются уже после выхода из представления, поэтому база
+    # (реплика или основная) выбирается сейчас, пока идёт запрос
+    events = events.using(events.db)
+    rows = events.order_by(*LIST_ORDERING).values(*LIST_FIELDS).aiterator(chunk_size=CHUNK_SIZE)
+    return StreamingHttpResponse(
+        astream_json_array(rows),
+        content_type='application/json; charset=utf-8',
+    )
+
+
+@require_get
+async def api_event_detail(request, event_id):
+    """Одно предстоящее мероприятие"""
+    event = await Event.objects.upcoming().filter(id=event_id).values(*DETAIL_FIELDS).afirst()
+    if event is None:
+        return JsonResponse({'error': 'Мероприятие не найдено.'}, status=404)
+    return JsonResponse(event, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,374 @@
+"""Генератор тестовых мероприятий и замер скорости страниц.
+
+Используется командами ``seed_events``, ``benchmark_views``, ``page_weight``,
+``benchmark_servers`` и ``benchmark_startup``. Замеры
+выполняются через тестовый клиент Django во временной базе, поэтому
+результаты воспроизводимы и не зависят от рабочих данных.
+"""
+import asyncio
+import gzip
+import http.client
+import os
+import random
+import re
+import socket
+import statistics
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import time as dt_time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import search
+from .models import Event, Venue
+from .signals import events_changed
+
+
+LOCATIONS = (
+    'Центральный парк', 'Парк Горького', 'Городской музей', 'Дом культуры',
+    'Концертный зал', 'Драматический театр', 'Центральная библиотека',
+    'Стадион «Динамо»', 'Набережная', 'Площадь Победы', 'Галерея современного искусства',
+    'Филармония', 'Ботанический сад', 'Выставочный центр', 'Ледовый дворец',
+    'Кинотеатр «Октябрь»', 'Молодёжный центр', 'Планетарий', 'Зоопарк', 'Речной вокзал',
+)
+
+TITLES = (
+    'Концерт', 'Выставка', 'Лекция', 'Фестиваль', 'Ярмарка', 'Спектакль',
+    'Мастер-класс', 'Кинопоказ', 'Экскурсия', 'Турнир', 'Встреча', 'Праздник',
+)
+
+TOPICS = (
+    'джаза', 'классической музыки', 'современного искусства', 'уличной еды',
+    'народных ремёсел', 'фотографии', 'истории города', 'науки', 'книг',
+    'настольных игр', 'рок-музыки', 'детского творчества',
+)
+
+WORDS = (
+    'приглашаем', 'всех', 'жителей', 'и', 'гостей', 'города', 'на', 'яркое',
+    'событие', 'программа', 'включает', 'выступления', 'гостей', 'угощения',
+    'вход', 'свободный', 'для', 'детей', 'и', 'взрослых', 'подробности', 'на', 'месте',
+)
+
+
+def generate_events(count, seed=0, past_ratio=0.2, now=None):
+    """Генерирует несохранённые мероприятия: прошедшие и будущие,
+    со временем и без, в разных местах и с описаниями разной длины"""
+    rng = random.Random(seed)
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+
+    for _ in range(count):
+        if rng.random() < past_ratio:
+            date = today - timedelta(days=rng.randint(1, 365))
+        else:
+            date = today + timedelta(days=rng.randint(1, 365))
+        start_time = None if rng.random() < 0.3 else dt_time(rng.randint(8, 22), rng.choice((0, 15, 30, 45)))
+        starts_at = Event.compute_starts_at(date, start_time)
+        description = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 150))).capitalize()
+
+        yield Event(
+            title=f'{rng.choice(TITLES)} {rng.choice(TOPICS)}',
+            date=date,
+            time=start_time,
+            location=rng.choice(LOCATIONS),
+            description=description + '.',
+            is_active=starts_at > now,
+            starts_at=starts_at,
+        )
+
+
+def seed_events(count, seed=0, past_ratio=0.2, batch_size=1000):
+    """Сохраняет ``count`` сгенерированных мероприятий; возвращает их число"""
+    created = 0
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            Venue.objects.assign(batch)
+            events = Event.objects.bulk_create(batch)
+            search.index_events(events)
+        events_changed.send(
+            sender=Event, event_ids=[event.id for event in events], using='default', action='created'
+        )
+        return len(events)
+
+    for event in generate_events(count, seed=seed, past_ratio=past_ratio):
+        batch.append(event)
+        if len(batch) >= batch_size:
+            created += flush()
+            batch = []
+    if batch:
+        created += flush()
+    return created
+
+
+@contextmanager
+def temporary_database(filename='benchmark.sqlite3'):
+    """Временная файловая база вместо основной на время замера.
+
+    Файловая база ближе к рабочей, чем база в памяти. Реплики чтения
+    (псевдонимы с TEST MIRROR) на это время смотрят в неё же.
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        test_settings['NAME'] = str(Path(tempfile.mkdtemp()) / filename)
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    mirrors = {}
+    for alias in connections:
+        if connections[alias].settings_dict.get('TEST', {}).get('MIRROR') == connection.alias:
+            mirrors[alias] = dict(connections[alias].settings_dict)
+            connections[alias].close()
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield
+    finally:
+        for alias, settings_dict in mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict = settings_dict
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class Scenario:
+    """Один замеряемый запрос.
+
+    ``path`` может быть функцией от генератора случайных чисел, чтобы
+    разные запросы сценария обращались к разным страницам.
+    """
+
+    def __init__(self, name, path, staff=False, cached=False):
+        self.name = name
+        self.path = path
+        self.staff = staff
+        self.cached = cached
+
+    def make_path(self, rng):
+        return self.path(rng) if callable(self.path) else self.path
+
+
+def default_scenarios():
+    upcoming_ids = list(Event.objects.upcoming().values_list('id', flat=True)[:1000])
+    today = timezone.localdate()
+    week = f'date_from={today}&date_to={today + timedelta(days=7)}'
+
+    return [
+        Scenario('event_list', '/'),
+        Scenario('event_list (кэш)', '/', cached=True),
+        Scenario('event_detail', lambda rng: f'/event/{rng.choice(upcoming_ids)}/'),
+        Scenario('event_search', lambda rng: f'/search/?q={rng.choice(TOPICS).split()[0]}'),
+        Scenario('admin_events', '/admin/events/', staff=True),
+        Scenario('admin_search', lambda rng: f'/admin/events/?search={rng.choice(LOCATIONS).split()[0]}', staff=True),
+        Scenario('api_event_list', f'/api/events/?{week}'),
+        Scenario('events_ics', '/events.ics'),
+    ]
+
+
+def _request(client, path):
+    response = client.get(path)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def run_scenario(scenario, requests, staff_user=None, warmup=5, seed=0):
+    """Выполняет сценарий и возвращает задержки (мс), пропускную способность
+    и число SQL-запросов на один запрос"""
+    rng = random.Random(seed)
+    client = Client(HTTP_HOST='localhost')
+    if scenario.staff:
+        client.force_login(staff_user)
+
+    for _ in range(warmup):
+        _request(client, scenario.make_path(rng))
+
+    if not scenario.cached:
+        cache.clear()
+    with ExitStack() as stack:
+        captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        _request(client, scenario.make_path(rng))
+    # Журнал запросов очищается в начале каждого запроса, поэтому
+    # число запросов нужно взять сразу
+    query_count = sum(len(queries) for queries in captured)
+
+    latencies = []
+    total = 0.0
+    for _ in range(requests):
+        path = scenario.make_path(rng)
+        if not scenario.cached:
+            cache.clear()
+        started = time.perf_counter()
+        response = _request(client, path)
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f'{scenario.name}: {path} вернул {response.status_code}')
+        latencies.append(elapsed * 1000)
+        total += elapsed
+
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'p50': round(percentiles[49], 3),
+        'p95': round(percentiles[94], 3),
+        'p99': round(percentiles[98], 3),
+        'rps': round(requests / total, 1),
+        'queries': query_count,
+    }
+
+
+# Настройки для серверов, которые замеры запускают отдельными процессами
+SERVER_SETTINGS_TEMPLATE = """from {settings_module} import *
+
+DATABASES['default']['NAME'] = {database!r}
+ALLOWED_HOSTS = ['127.0.0.1']
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_environment(directory, **overrides):
+    """Окружение процесса сервера с настройками на текущую (временную)
+    базу: модуль ``benchmark_settings`` пишется в ``directory``"""
+    Path(directory, 'benchmark_settings.py').write_text(SERVER_SETTINGS_TEMPLATE.format(
+        settings_module=settings.SETTINGS_MODULE,
+        database=str(connection.settings_dict['NAME']),
+    ), encoding='utf-8')
+    return dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [str(directory), str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+        DJANGO_SETTINGS_MODULE='benchmark_settings',
+        **overrides,
+    )
+
+
+def wait_for_port(process, port, timeout=30):
+    """Ждёт, пока сервер начнёт принимать соединения. False, если
+    процесс завершился; TimeoutError, если не дождались."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.01)
+    raise TimeoutError(port)
+
+
+def timed_get(host, port, path):
+    """Время ответа на один запрос в миллисекундах, с чтением тела"""
+    client = http.client.HTTPConnection(host, port, timeout=60)
+    try:
+        started = time.perf_counter()
+        client.request('GET', path)
+        response = client.getresponse()
+        response.read()
+        elapsed = (time.perf_counter() - started) * 1000
+    finally:
+        client.close()
+    if response.status != 200:
+        raise RuntimeError(f'{path} вернул {response.status}')
+    return elapsed
+
+
+async def _http_get(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+def run_http_load(host, port, paths, concurrency=32, duration=10.0):
+    """Нагружает запущенный сервер ``concurrency`` одновременными
+    клиентами в течение ``duration`` секунд; пути берутся по кругу.
+    Возвращает задержки (мс), пропускную способность и число ошибок."""
+    latencies = []
+    errors = 0
+
+    async def client(offset):
+        nonlocal errors
+        index = offset
+        while time.monotonic() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                status = await _http_get(host, port, path)
+            except (OSError, IndexError, ValueError):
+                errors += 1
+                continue
+            if status != 200:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async def main():
+        await asyncio.gather(*(client(offset) for offset in range(concurrency)))
+
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    asyncio.run(main())
+    elapsed = time.monotonic() - started
+
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else [0.0] * 99
+    return {
+        'p50': round(percentiles[49], 3),
+        'p95': round(percentiles[94], 3),
+        'p99': round(percentiles[98], 3),
+        'rps': round(len(latencies) / elapsed, 1),
+        'errors': errors,
+    }
+
+
+ASSET_REFERENCE = re.compile(r'(?:href|src)="([^"#]+\.(?:css|js|svg|woff2?))(?:#[^"]*)?"')
+
+
+def page_weight(client, path):
+    """Сколько байт передаётся при открытии страницы: HTML (как есть и в
+    gzip) и подключённая статика при первом и повторном визите.
+
+    Статика запрашивается тем же клиентом с Accept-Encoding: gzip, то есть
+    считается то, что реально уйдёт в сеть. При повторном визите браузер
+    заново скачивает HTML и файлы без Cache-Control: immutable.
+    Файлы с других сайтов (CDN) измерить нельзя, они только считаются.
+    """
+    response = client.get(path)
+    if response.status_code != 200:
+        raise RuntimeError(f'{path} вернул {response.status_code}')
+    html = response.content
+    html_gzip = len(gzip.compress(html, 6))
+    result = {
+        'html': len(html), 'html_gzip': html_gzip, 'assets': 0,
+        'first_visit': html_gzip, 'repeat_visit': html_gzip, 'external': 0,
+    }
+    for url in sorted(set(ASSET_REFERENCE.findall(html.decode()))):
+        if not url.startswith(settings.STATIC_URL):
+            result['external'] += 1
+            continue
+        asset = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        if asset.status_code != 200:
+            raise RuntimeError(f'{url} вернул {asset.status_code}')
+        size = len(asset.content)
+        result['assets'] += size
+        result['first_visit'] += size
+        if 'immutable' not in asset.get('Cache-Control', ''):
+            result['repeat_visit'] += size
+    return result
@@ -0,0 +1,107 @@
+"""Журнал изменений мероприятий для синхронизации клиентов.
+
+Каждое создание, правка (в том числе скрытие и снятие прошедших) и
+удаление мероприятия дописывает запись в EventChange. Клиент хранит
+курсор ``<время в микросекундах>-<id>`` последней прочитанной записи и
+получает только записи после него, поэтому синхронизация стоит столько,
+сколько было изменений, а не сколько мероприятий в афише. Удалённые
+мероприятия приходят записями ``deleted`` без данных.
+
+Записи читаются по порядку id: SQLite выдаёт id под единственной
+блокировкой записи, поэтому их порядок совпадает с порядком фиксации
+транзакций. Время записи берётся до блокировки, и запись с меньшим
+временем может зафиксироваться позже - курсор по одному времени её бы
+пропустил. Время в курсоре сверяется с журналом: курсор от другой базы
+или пересозданного журнала отклоняется, и клиент синхронизируется заново.
+"""
+import datetime
+
+from django.utils import timezone
+
+from .models import Event, EventChange
+
+
+# Сколько записей журнала отдаётся за один запрос
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class StaleCursor(Exception):
+    """Курсора нет в журнале: нужна полная синхронизация"""
+
+
+def record(event_ids, action, using='default'):
+    """Дописывает в журнал действие ``action`` над мероприятиями ``event_ids``"""
+    now = timezone.now()
+    EventChange.objects.using(using).bulk_create(
+        [EventChange(event_id=event_id, action=action, changed_at=now) for event_id in event_ids],
+        batch_size=PAGE_SIZE,
+    )
+
+
+def encode_cursor(changed_at, change_id):
+    return f'{(changed_at - EPOCH) // MICROSECOND}-{change_id}'
+
+
+def parse_cursor(value):
+    """Время и id записи из курсора. Неверная строка - ValueError."""
+    micros, separator, change_id = value.partition('-')
+    if not separator or not micros.isdigit() or not change_id.isdigit():
+        raise ValueError(value)
+    try:
+        return EPOCH + int(micros) * MICROSECOND, int(change_id)
+    except OverflowError:
+        raise ValueError(value)
+
+
+def read_changes(since=None, limit=PAGE_SIZE, fields=('id',)):
+    """Изменения после курсора ``since`` (без него - с начала журнала).
+
+    Возвращает список изменений, курсор для следующего запроса и признак,
+    что в журнале есть ещё записи. Несколько записей об одном мероприятии
+    схлопываются в последнюю; у созданных и изменённых мероприятий есть
+    текущие значения полей ``fields``.
+    """
+    entries = EventChange.objects.order_by('id')
+    # Журнал и мероприятия читаются из одной базы (реплики или основной)
+    using = entries.db
+    if since:
+        changed_at, last_id = parse_cursor(since)
+        if not EventChange.objects.using(using).filter(id=last_id, changed_at=changed_at).exists():
+            raise StaleCursor(since)
+        entries = entries.filter(id__gt=last_id)
+
+    rows = list(entries.using(using).values('id', 'event_id', 'action', 'changed_at')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for row in rows:
+        # Мероприятие встаёт на место своей последней записи
+        latest.pop(row['event_id'], None)
+        latest[row['event_id']] = row
+
+    alive = [event_id for event_id, row in latest.items() if row['action'] != 'deleted']
+    events = {
+        event['id']: event
+        for event in Event.objects.using(using).filter(id__in=alive).values(*fields)
+    } if alive else {}
+
+    changes = []
+    for event_id, row in latest.items():
+        event = events.get(event_id)
+        # Мероприятие удалили позже: запись об удалении будет дальше в журнале
+        if row['action'] != 'deleted' and event is None:
+            continue
+        changes.append({
+            'event_id': event_id,
+            'action': row['action'],
+            'changed_at': row['changed_at'],
+            'event': event,
+        })
+
+    following = encode_cursor(rows[-1]['changed_at'], rows[-1]['id']) if rows else since
+    return changes, following, has_more
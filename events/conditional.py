@@ -0,0 +1,182 @@
+"""Валидаторы для условных GET-запросов (ETag / Last-Modified).
+
+Валидатор вычисляется несколькими запросами по индексам до основного
+запроса и рендеринга шаблона, поэтому ответ 304 почти ничего не стоит. Состояние
+афиши хранится в кэше вместе со страницами (тот же номер поколения) до
+начала ближайшего мероприятия. Используется вместе с
+``django.views.decorators.http.condition``, а в асинхронных
+представлениях - с ``acondition``.
+"""
+import datetime
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .expiry import anext_expiry, next_expiry
+from .models import Event, EventChange
+from .page_cache import acache, aversioned_key, timeout_until, versioned_key
+
+
+def _etag(*parts):
+    return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _list_state(request):
+    """Состояние афиши: последняя запись журнала изменений, ближайшее
+    и последнее начавшееся активное мероприятие"""
+    if not hasattr(request, '_event_list_state'):
+        key = versioned_key('list-validators')
+        state = cache.get(key)
+        if state is None:
+            now = timezone.now()
+            state = {
+                'change': _last_change().first(),
+                'next_start': next_expiry(now),
+                'last_start': _last_start(now).first(),
+            }
+            timeout = timeout_until(state['next_start'], now)
+            if timeout > 0:
+                cache.set(key, state, timeout)
+        request._event_list_state = state
+    return request._event_list_state
+
+
+async def _alist_state(request):
+    if not hasattr(request, '_event_list_state'):
+        key = await aversioned_key('list-validators')
+        state = await acache('get', key)
+        if state is None:
+            now = timezone.now()
+            state = {
+                'change': await _last_change().afirst(),
+                'next_start': await anext_expiry(now),
+                'last_start': await _last_start(now).afirst(),
+            }
+            timeout = timeout_until(state['next_start'], now)
+            if timeout > 0:
+                await acache('set', key, state, timeout)
+        request._event_list_state = state
+    return request._event_list_state
+
+
+def _last_change():
+    # Последняя запись журнала изменений (по первичному ключу). Журнал
+    # пишут сохранение, удаление и массовые действия, поэтому агрегаты по
+    # всей таблице Event не нужны
+    return EventChange.objects.order_by('-id').values_list('id', 'changed_at')
+
+
+def _last_start(now):
+    # Начавшееся, но ещё не снятое с публикации мероприятие (поиск по
+    # индексу (is_active, starts_at)); снятие с публикации попадает в журнал
+    return Event.objects.active().filter(starts_at__lte=now).order_by('-starts_at').values_list('starts_at', flat=True)
+
+
+def _list_etag(request, state):
+    # Любая запись меняет журнал, а начало события - ближайший старт
+    return _etag(state['change'], state['next_start'], request.get_full_path())
+
+
+def _list_last_modified(state):
+    moments = [
+        moment for moment in (state['change'] and state['change'][1], state['last_start']) if moment
+    ]
+    return max(moments) if moments else None
+
+
+def event_list_etag(request, *args, **kwargs):
+    return _list_etag(request, _list_state(request))
+
+
+def event_list_last_modified(request, *args, **kwargs):
+    return _list_last_modified(_list_state(request))
+
+
+async def aevent_list_etag(request, *args, **kwargs):
+    return _list_etag(request, await _alist_state(request))
+
+
+async def aevent_list_last_modified(request, *args, **kwargs):
+    return _list_last_modified(await _alist_state(request))
+
+
+def _detail_query(event_id):
+    return Event.objects.filter(id=event_id).values('updated_at', 'starts_at', 'is_active')
+
+
+def _detail_state(request, event_id):
+    if not hasattr(request, '_event_detail_state'):
+        request._event_detail_state = _detail_query(event_id).first()
+    return request._event_detail_state
+
+
+async def _adetail_state(request, event_id):
+    if not hasattr(request, '_event_detail_state'):
+        request._event_detail_state = await _detail_query(event_id).afirst()
+    return request._event_detail_state
+
+
+def _detail_etag(request, event_id, state):
+    if state is None:
+        return None
+    started = state['starts_at'] <= timezone.now()
+    # Страница и .ics одного мероприятия - разные представления: путь в
+    # ETag не даёт кэшу подставить одно вместо другого
+    return _etag(event_id, state['updated_at'], state['is_active'], started, request.path)
+
+
+def _detail_last_modified(state):
+    if state is None:
+        return None
+    if state['starts_at'] <= timezone.now():
+        return max(state['updated_at'], state['starts_at'])
+    return state['updated_at']
+
+
+def event_detail_etag(request, event_id, *args, **kwargs):
+    return _detail_etag(request, event_id, _detail_state(request, event_id))
+
+
+def event_detail_last_modified(request, event_id, *args, **kwargs):
+    return _detail_last_modified(_detail_state(request, event_id))
+
+
+async def aevent_detail_etag(request, event_id, *args, **kwargs):
+    return _detail_etag(request, event_id, await _adetail_state(request, event_id))
+
+
+async def aevent_detail_last_modified(request, event_id, *args, **kwargs):
+    return _detail_last_modified(await _adetail_state(request, event_id))
+
+
+def acondition(etag_func, last_modified_func):
+    """Асинхронный аналог ``django.views.decorators.http.condition``
+    (в Django 4.2 он поддерживает только синхронные представления).
+    Функции валидаторов тоже асинхронные."""
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            last_modified = await last_modified_func(request, *args, **kwargs)
+            if last_modified:
+                if not timezone.is_aware(last_modified):
+                    last_modified = timezone.make_aware(last_modified, datetime.timezone.utc)
+                last_modified = int(last_modified.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,130 @@
+"""Счётчики мероприятий по дням для календаря (таблица DailyEventCount).
+
+Изменившиеся дни не увеличиваются на единицу, а пересчитываются
+целиком по индексу (date, time, id): пересчёт идемпотентен и не
+расходится с таблицей Event при повторах. Чтение и запись идут одним
+запросом INSERT ... SELECT, поэтому между ними не вклинится чужая запись.
+Дни, изменённые внутри транзакции, пересчитываются один раз после её
+фиксации - массовое удаление из админки не пересчитывает один и тот же
+день для каждой строки.
+"""
+import threading
+from calendar import Calendar
+from datetime import date, timedelta
+
+from django.db import connections, transaction
+
+from . import recurrence
+from .models import DailyEventCount, Event
+
+
+_local = threading.local()
+
+
+def _tables(connection):
+    quote = connection.ops.quote_name
+    return quote(DailyEventCount._meta.db_table), quote(Event._meta.db_table)
+
+
+def refresh_days(dates, using='default'):
+    """Пересчитывает счётчики указанных дней"""
+    dates = sorted({day for day in dates if day is not None})
+    if not dates:
+        return
+    connection = connections[using]
+    counts, events = _tables(connection)
+    placeholders = ', '.join(['%s'] * len(dates))
+    params = [connection.ops.adapt_datefield_value(day) for day in dates]
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {counts} (date, active, total) '
+            f'SELECT date, SUM(CASE WHEN is_active THEN 1 ELSE 0 END), COUNT(*) '
+            f'FROM {events} WHERE date IN ({placeholders}) GROUP BY date '
+            f'ON CONFLICT (date) DO UPDATE SET active = excluded.active, total = excluded.total',
+            params,
+        )
+        cursor.execute(
+            f'DELETE FROM {counts} WHERE date IN ({placeholders}) '
+            f'AND NOT EXISTS (SELECT 1 FROM {events} WHERE {events}.date = {counts}.date)',
+            params,
+        )
+
+
+def rebuild(using='default'):
+    """Пересчитывает счётчики всех дней заново"""
+    connection = connections[using]
+    counts, events = _tables(connection)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {counts}')
+        cursor.execute(
+            f'INSERT INTO {counts} (date, active, total) '
+            f'SELECT date, SUM(CASE WHEN is_active THEN 1 ELSE 0 END), COUNT(*) '
+            f'FROM {events} GROUP BY date'
+        )
+
+
+def mark_days(dates, using='default'):
+    """Отмечает изменившиеся дни; пересчёт - после фиксации транзакции
+    (вне транзакции - сразу)"""
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = {}
+    pending.setdefault(using, set()).update(day for day in dates if day is not None)
+    # Колбэк ставится на каждую отметку: после отката транзакции её
+    # колбэки пропадают, а дни остаются и пересчитаются со следующей
+    transaction.on_commit(lambda: _flush(using), using=using)
+
+
+def _flush(using):
+    dates = _local.pending.pop(using, None)
+    if dates:
+        refresh_days(dates, using)
+
+
+def mark_events(event_ids, using='default'):
+    """Отмечает дни, на которые приходятся мероприятия ``event_ids``"""
+    dates = (
+        Event.objects.using(using).filter(id__in=event_ids)
+        .order_by().values_list('date', flat=True).distinct()
+    )
+    mark_days(list(dates), using)
+
+
+def active_counts(start, end):
+    """Число активных мероприятий по датам с ``start`` по ``end``: из
+    таблицы счётчиков и ещё не созданные повторы серий"""
+    counts = recurrence.count_beyond_window(start, end)
+    counts.update(dict(
+        DailyEventCount.objects.filter(date__range=(start, end), active__gt=0)
+        .values_list('date', 'active')
+    ))
+    return dict(counts)
+
+
+def month_grid(year, month, firstweekday=0):
+    """Недели месяца (списки дат, с соседними днями по краям) и число
+    активных мероприятий по датам. Читает не больше 42 строк счётчиков."""
+    weeks = Calendar(firstweekday).monthdatescalendar(year, month)
+    return weeks, active_counts(weeks[0][0], weeks[-1][-1])
+
+
+def parse_month(value, today):
+    """Первый день месяца из строки ``ГГГГ-ММ``; без значения - текущий
+    месяц. Неверная строка - ValueError."""
+    if not value:
+        return today.replace(day=1)
+    year, separator, month = value.partition('-')
+    if not separator or len(year) != 4 or not year.isdigit() or not month.isdigit():
+        raise ValueError(value)
+    # Крайние годы отсекаются, чтобы у месяца всегда были соседние
+    if not date.min.year < int(year) < date.max.year:
+        raise ValueError(value)
+    return date(int(year), int(month), 1)
+
+
+def adjacent_months(month):
+    """Первые дни предыдущего и следующего месяцев"""
+    previous = (month.replace(day=1) - timedelta(days=1)).replace(day=1)
+    following = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return previous, following
@@ -0,0 +1,32 @@
+"""Настройка соединений SQLite для работы под несколькими процессами.
+
+Параметры (PRAGMA) берутся из ``settings.SQLITE_PRAGMAS`` и применяются к
+каждому новому соединению. Главное из них - журнал WAL: читатели работают
+со снимком базы и не ждут, пока админка записывает изменения.
+"""
+from django.conf import settings
+
+
+def sqlite_pragmas():
+    """PRAGMA из настроек; порядок важен - режим журнала идёт первым"""
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def configure_connection(connection, pragmas=None):
+    """Применяет PRAGMA к соединению SQLite; остальные базы не трогает"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    # Сырое соединение: PRAGMA не попадают в журнал запросов и метрики
+    database = connection.connection
+    for name, value in pragmas.items():
+        if not name.isidentifier():
+            raise ValueError(f'Некорректное имя PRAGMA: {name!r}')
+        if name == 'journal_mode':
+            # Режим журнала хранится в файле базы, а его смена требует
+            # монопольного доступа - при одновременном старте воркеров
+            # переключает только первый, остальные видят готовый режим
+            current = database.execute('PRAGMA journal_mode').fetchone()[0]
+            if current.lower() == str(value).lower():
+                continue
+        database.execute(f'PRAGMA {name} = {value}')
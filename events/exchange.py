@@ -0,0 +1,77 @@
+"""Чтение и запись мероприятий в файлах CSV и JSON Lines.
+
+Файлы читаются и пишутся построчно, поэтому размер файла не влияет
+на расход памяти. Используется командами ``import_events`` и
+``export_events``.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# Столбцы файла обмена - те же поля, что и в EventForm
+FIELDS = ('title', 'date', 'time', 'location', 'description', 'image_url', 'is_active')
+
+FORMATS = ('csv', 'jsonl')
+
+_EXTENSIONS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+
+def detect_format(path, default=None):
+    """Определяет формат по расширению файла"""
+    for extension, file_format in _EXTENSIONS.items():
+        if str(path).lower().endswith(extension):
+            return file_format
+    return default
+
+
+def read_rows(stream, file_format):
+    """Построчно читает файл; возвращает пары (номер строки, словарь)"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, error
+            continue
+        yield line_number, row
+
+
+class RowWriter:
+    """Пишет строки (кортежи значений FIELDS) в CSV или JSON Lines"""
+
+    def __init__(self, stream, file_format):
+        self.stream = stream
+        self.file_format = file_format
+        if file_format == 'csv':
+            self.writer = csv.writer(stream)
+            self.writer.writerow(FIELDS)
+        else:
+            self.encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+    def write(self, values):
+        if self.file_format == 'csv':
+            self.writer.writerow(['' if value is None else _format_value(value) for value in values])
+        else:
+            self.stream.write(self.encoder.encode(dict(zip(FIELDS, values))) + '\n')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
@@ -0,0 +1,87 @@
+"""Снятие с публикации прошедших мероприятий.
+
+Раньше деактивация выполнялась прямо в GET-запросах к афише и админке.
+Теперь этим занимается отдельный планировщик (команда ``expire_events``),
+а публичные страницы только читают данные. Раз в сутки планировщик
+также продлевает окно повторов серий (events/recurrence.py).
+"""
+import time as time_module
+
+from django.utils import timezone
+
+from .models import Event
+from .recurrence import roll_window
+from .signals import events_changed
+
+
+# Сколько мероприятий деактивируется одним UPDATE
+BATCH_SIZE = 500
+
+# Максимальная пауза планировщика: за это время могут появиться
+# новые мероприятия с более ранним временем начала
+MAX_SLEEP = 60
+
+
+def expire_past_events(now=None, batch_size=BATCH_SIZE):
+    """Деактивирует прошедшие активные мероприятия пачками.
+
+    Возвращает количество деактивированных мероприятий.
+    """
+    now = now or timezone.now()
+    expired = 0
+
+    while True:
+        ids = list(
+            Event.objects.active()
+            .past(now)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        # updated_at меняется, как и при правке: по нему обновляются блоки
+        # ленты iCalendar и клиенты API
+        expired += Event.objects.filter(id__in=ids).update(is_active=False, updated_at=timezone.now())
+        events_changed.send(sender=Event, event_ids=ids, using='default')
+
+    return expired
+
+
+def _next_expiry_query(now):
+    return (
+        Event.objects.upcoming(now)
+        .order_by('starts_at')
+        .values_list('starts_at', flat=True)
+    )
+
+
+def next_expiry(now=None):
+    """Момент, когда начнётся ближайшее активное мероприятие (или None)"""
+    return _next_expiry_query(now or timezone.now()).first()
+
+
+async def anext_expiry(now=None):
+    return await _next_expiry_query(now or timezone.now()).afirst()
+
+
+def run_scheduler(batch_size=BATCH_SIZE, max_sleep=MAX_SLEEP, should_stop=None, log=None):
+    """Цикл планировщика: деактивирует прошедшие мероприятия и спит
+    до начала следующего (но не дольше ``max_sleep`` секунд)."""
+    rolled_on = None
+    while should_stop is None or not should_stop():
+        now = timezone.now()
+        expired = expire_past_events(now, batch_size=batch_size)
+        if expired and log:
+            log(f'Деактивировано прошедших мероприятий: {expired}')
+
+        today = timezone.localdate(now)
+        if today != rolled_on:
+            created, deleted = roll_window(today)
+            rolled_on = today
+            if (created or deleted) and log:
+                log(f'Повторы серий: создано {created}, удалено прошедших {deleted}')
+
+        upcoming = next_expiry(now)
+        sleep_for = max_sleep
+        if upcoming is not None:
+            sleep_for = min(max_sleep, (upcoming - timezone.now()).total_seconds())
+        time_module.sleep(max(sleep_for, 0.1))
@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from .models import Event
@@ -10,7 +11,10 @@ class EventForm(forms.ModelForm):
     
     class Meta:
         model = Event
-        fields = ['title', 'date', 'time', 'location', 'description', 'image_url', 'is_active']
+        fields = [
+            'title', 'date', 'time', 'venue', 'location', 'description', 'image', 'image_url',
+            'recurrence', 'recurrence_interval', 'recurrence_until', 'is_active',
+        ]
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -28,10 +32,12 @@ class EventForm(forms.ModelForm):
                 'type': 'time',
                 'placeholder': '--:--'
             }),
+            'venue': forms.Select(attrs={
+                'class': 'form-select'
+            }),
             'location': forms.TextInput(attrs={
                 'class': 'form-control',
-                'required': True,
-                'placeholder': 'например, Центральный парк'
+                'placeholder': 'если места нет в списке, например, Центральный парк'
             }),
             'description': forms.Textarea(attrs={
                 'class': 'form-control',
@@ -39,70 +45,117 @@ class EventForm(forms.ModelForm):
                 'required': True,
                 'placeholder': 'Полное описание мероприятия'
             }),
+            'image': forms.ClearableFileInput(attrs={
+                'class': 'form-control',
+                'accept': 'image/jpeg,image/png,image/webp,image/gif'
+            }),
             'image_url': forms.URLInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'https://example.com/image.jpg'
             }),
+            'recurrence': forms.Select(attrs={
+                'class': 'form-select'
+            }),
+            'recurrence_interval': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': 1
+            }),
+            'recurrence_until': forms.DateInput(attrs={
+                'class': 'form-control',
+                'type': 'date'
+            }, format='%Y-%m-%d'),
             'is_active': forms.CheckboxInput(attrs={
                 'class': 'form-check-input'
             })
         }
     
-    def clean_date(self):
-        """Проверка, что дата не в прошлом"""
-        date = self.cleaned_data.get('date')
-        if date and date < timezone.now().date():
-            raise ValidationError('Нельзя создать мероприятие с прошедшей датой.')
-        return date
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Поле location - для нового места: существующее выбирается из
+        # списка, и его название не нужно набирать заново
+        self.fields['venue'].empty_label = 'Выберите место'
+        self.fields['location'].required = False
+        if self.instance.venue_id is not None:
+            self.initial['location'] = ''
+        self.fields['recurrence_interval'].required = False
+        # Повтор серии правится как отдельное мероприятие, правило - у первого
+        if self.instance.series_id is not None:
+            for field in ('recurrence', 'recurrence_interval', 'recurrence_until'):
+                del self.fields[field]
     
-    def clean_image_url(self):
-        """Проверка URL изображения (если указан)"""
-        image_url = self.cleaned_data.get('image_url')
-        if image_url:
-            # Простая проверка формата URL
-            url_pattern = re.compile(
-                r'^https?://'  # http:// or https://
-                r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
-                r'localhost|'  # localhost...
-                r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
-                r'(?::\d+)?'  # optional port
-                r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-            if not url_pattern.match(image_url):
-                raise ValidationError('Введите корректный URL изображения.')
-        return image_url
+    def clean_image(self):
+        """Ограничение размера загружаемого изображения"""
+        image = self.cleaned_data.get('image')
+        if image and image.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+            limit = settings.IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)
+            raise ValidationError(f'Файл слишком большой: не более {limit} МБ.')
+        return image
     
-    def clean_description(self):
-        """Экранирование HTML-тегов для защиты от XSS"""
-        description = self.cleaned_data.get('description')
-        if description:
-            # Django автоматически экранирует HTML при рендеринге в шаблонах через |escape
-            # Дополнительная проверка на потенциально опасные теги
-            # Простая защита: удаляем явные скрипты
-            dangerous_patterns = ['<script', '</script>', 'javascript:', 'onerror=', 'onclick=']
-            description_lower = description.lower()
-            for pattern in dangerous_patterns:
-                if pattern in description_lower:
-                    raise ValidationError('Описание содержит недопустимые элементы.')
-        return description
-    
-    def clean_is_active(self):
-        """Проверка, что нельзя активировать прошедшее событие"""
-        is_active = self.cleaned_data.get('is_active')
-        date = self.cleaned_data.get('date')
-        time = self.cleaned_data.get('time')
-        
-        # Если пытаемся активировать событие
-        if is_active:
-            now = timezone.now()
-            now_date = now.date()
-            now_time = now.time()
-            
-            # Проверяем, прошло ли событие
-            if date and date < now_date:
-                raise ValidationError('Нельзя активировать событие с прошедшей датой.')
-            
-            if date and date == now_date and time and time <= now_time:
-                raise ValidationError('Нельзя активировать событие, которое уже прошло.')
-        
-        return is_active
+    def clean(self):
+        """Правила мероприятия - общие с загрузкой из файла"""
+        cleaned_data = super().clean()
+        for field, message in clean_event_values(cleaned_data, self.instance).items():
+            self.add_error(field, message)
+        return cleaned_data
+
+
+# Простая проверка формата URL
+IMAGE_URL_PATTERN = re.compile(
+    r'^https?://'  # http:// or https://
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
+    r'localhost|'  # localhost...
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
+    r'(?::\d+)?'  # optional port
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+# Django автоматически экранирует HTML при рендеринге в шаблонах через |escape,
+# а описания с явными скриптами не принимаются вовсе
+DANGEROUS_PATTERNS = ['<script', '</script>', 'javascript:', 'onerror=', 'onclick=']
+
+
+def clean_event_values(values, instance=None):
+    """Проверки мероприятия поверх разобранных значений полей: их делают
+    и EventForm, и import_events. Значения приводятся на месте; поля,
+    которые не разобрались, пропускаются. Возвращает ошибки {поле: текст}."""
+    errors = {}
+
+    date = values.get('date')
+    if date and date < timezone.localdate():
+        # Первое мероприятие серии остаётся в прошлом, пока идут повторы
+        if not (instance is not None and instance.recurrence and date == instance.date):
+            errors['date'] = 'Нельзя создать мероприятие с прошедшей датой.'
+
+    # Пустой интервал - каждый день, неделю или месяц
+    if 'recurrence_interval' in values:
+        values['recurrence_interval'] = values['recurrence_interval'] or 1
+
+    image_url = values.get('image_url')
+    if image_url and not IMAGE_URL_PATTERN.match(image_url):
+        errors['image_url'] = 'Введите корректный URL изображения.'
+
+    description = values.get('description')
+    if description:
+        description_lower = description.lower()
+        if any(pattern in description_lower for pattern in DANGEROUS_PATTERNS):
+            errors['description'] = 'Описание содержит недопустимые элементы.'
+
+    # Нельзя активировать событие, которое уже началось
+    if values.get('is_active') and date and 'date' not in errors:
+        starts_at = Event.compute_starts_at(date, values.get('time'))
+        if starts_at <= timezone.now():
+            if date < timezone.localdate():
+                errors['is_active'] = 'Нельзя активировать событие с прошедшей датой.'
+            else:
+                errors['is_active'] = 'Нельзя активировать событие, которое уже прошло.'
+
+    # Место: выбранное из списка или новое по введённому названию
+    venue = values.get('venue')
+    if values.get('location'):
+        # Место с таким названием найдётся или создастся при сохранении
+        values['venue'] = None
+    elif venue is not None:
+        values['location'] = venue.name
+    elif 'venue' in values:
+        errors['venue'] = 'Выберите место из списка или введите новое.'
 
+    return errors
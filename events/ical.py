@@ -0,0 +1,170 @@
+"""Афиша в формате iCalendar (RFC 5545) для календарей партнёров.
+
+Лента ``/events.ics`` собирается из готовых блоков VEVENT. Блок
+мероприятия хранится в кэше под ключом из ``(id, updated_at)``: правка
+меняет ``updated_at``, а значит и ключ, поэтому блоки не нужно сбрасывать
+- устаревшие просто истекают. Сборка ленты - один запрос за id и
+``updated_at`` по индексу и чтение полей только тех мероприятий, чьих
+блоков ещё нет в кэше. Повторные опросы с тем же ETag получают 304
+(см. events/conditional.py) и до сборки не доходят.
+"""
+import datetime
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.urls import reverse
+
+from .models import Event
+
+
+CONTENT_TYPE = 'text/calendar; charset=utf-8'
+
+# Кэш блоков VEVENT (settings.CACHES)
+CACHE_ALIAS = 'fragments'
+
+# Сколько хранится блок VEVENT. Ключ меняется при каждой правке, поэтому
+# срок ограничивает только память под блоки удалённых и прошедших событий.
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+# Поля, из которых строится блок
+FRAGMENT_FIELDS = ('id', 'title', 'date', 'time', 'starts_at', 'location', 'description', 'updated_at')
+
+# Сколько недостающих блоков читается из базы одним запросом
+FETCH_BATCH_SIZE = 500
+
+# Максимальная длина строки в октетах без перевода строки (RFC 5545, 3.1)
+LINE_LENGTH = 75
+
+
+def escape(value):
+    """Экранирует значение TEXT (RFC 5545, 3.3.11)"""
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '')
+    )
+
+
+def fold(line):
+    """Переносит строку длиннее 75 октетов, не разрывая символы UTF-8"""
+    if len(line.encode()) <= LINE_LENGTH:
+        return line
+    parts = []
+    current = ''
+    size = 0
+    # Строки продолжения начинаются с пробела, который тоже считается
+    limit = LINE_LENGTH
+    for char in line:
+        char_size = len(char.encode())
+        if size + char_size > limit:
+            parts.append(current)
+            current = ''
+            size = 0
+            limit = LINE_LENGTH - 1
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n '.join(parts)
+
+
+def _utc(moment):
+    return moment.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _fragment_key(event_id, updated_at, base_url):
+    # Ссылки в блоке абсолютные, поэтому адрес сайта (и домен UID) тоже входит в ключ
+    site = hashlib.md5(f'{base_url} {settings.ICAL_UID_DOMAIN}'.encode()).hexdigest()[:8]
+    return f'ics:vevent:{site}:{event_id}:{updated_at.timestamp()}'
+
+
+def render_fragment(row, base_url):
+    """Блок VEVENT мероприятия из словаря с полями FRAGMENT_FIELDS"""
+    lines = [
+        'BEGIN:VEVENT',
+        # UID не зависит от адреса, по которому открыли ленту: иначе
+        # календарь подписчика продублирует все мероприятия
+        f'UID:event-{row["id"]}@{settings.ICAL_UID_DOMAIN}',
+        f'DTSTAMP:{_utc(row["updated_at"])}',
+        f'LAST-MODIFIED:{_utc(row["updated_at"])}',
+    ]
+    if row['time'] is None:
+        # Мероприятие без времени идёт весь день
+        lines.append(f'DTSTART;VALUE=DATE:{row["date"]:%Y%m%d}')
+        lines.append(f'DTEND;VALUE=DATE:{row["date"] + timedelta(days=1):%Y%m%d}')
+    else:
+        lines.append(f'DTSTART:{_utc(row["starts_at"])}')
+    lines += [
+        f'SUMMARY:{escape(row["title"])}',
+        f'LOCATION:{escape(row["location"])}',
+        f'DESCRIPTION:{escape(row["description"])}',
+        f'URL:{base_url}{reverse("event_detail", args=[row["id"]])}',
+        'END:VEVENT',
+    ]
+    return ''.join(fold(line) + '\r\n' for line in lines)
+
+
+def fragments(stamps, base_url):
+    """Блоки VEVENT для пар ``(id, updated_at)`` в том же порядке.
+    Из базы читаются только мероприятия, чьих блоков нет в кэше."""
+    keys = [_fragment_key(event_id, updated_at, base_url) for event_id, updated_at in stamps]
+    cache = caches[CACHE_ALIAS]
+    cached = cache.get_many(keys)
+
+    missing = {event_id: key for (event_id, _), key in zip(stamps, keys) if key not in cached}
+    if missing:
+        rendered = {}
+        ids = list(missing)
+        for start in range(0, len(ids), FETCH_BATCH_SIZE):
+            rows = Event.objects.filter(id__in=ids[start:start + FETCH_BATCH_SIZE]).values(*FRAGMENT_FIELDS)
+            for row in rows:
+                # Мероприятие могли изменить между запросами: блок
+                # сохраняется под ключом своего updated_at
+                key = _fragment_key(row['id'], row['updated_at'], base_url)
+                rendered[key] = cached[missing[row['id']]] = render_fragment(row, base_url)
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+
+    # Удалённые между запросами мероприятия пропускаются
+    return [cached[key] for key in keys if key in cached]
+
+
+def calendar(blocks, name=None):
+    """Календарь VCALENDAR из готовых блоков VEVENT"""
+    header = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//City Events//Afisha//RU',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-TIMEZONE:{settings.TIME_ZONE}',
+    ]
+    if name:
+        header.append(f'X-WR-CALNAME:{escape(name)}')
+    return (
+        ''.join(fold(line) + '\r\n' for line in header)
+        + ''.join(blocks)
+        + 'END:VCALENDAR\r\n'
+    )
+
+
+def _base_url(request):
+    return f'{request.scheme}://{request.get_host()}'
+
+
+def render_feed(request):
+    """Лента всех предстоящих мероприятий"""
+    stamps = list(
+        Event.objects.upcoming().order_by('date', 'time', 'id').values_list('id', 'updated_at')
+    )
+    return calendar(fragments(stamps, _base_url(request)), name='Афиша городских мероприятий')
+
+
+def render_event(request, event_id):
+    """Календарь из одного предстоящего мероприятия (None, если его нет)"""
+    stamp = Event.objects.upcoming().filter(id=event_id).values_list('id', 'updated_at').first()
+    if stamp is None:
+        return None
+    blocks = fragments([stamp], _base_url(request))
+    if not blocks:
+        return None
+    return calendar(blocks)
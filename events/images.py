@@ -0,0 +1,180 @@
+"""Загруженные афиши мероприятий и их уменьшенные копии.
+
+Оригинал сохраняется в ``MEDIA_ROOT/events/originals`` под именем из
+SHA-256 содержимого: повторная загрузка того же файла не создаёт копию.
+Уменьшенные копии шириной ``settings.IMAGE_WIDTHS`` в JPEG и WebP
+готовит пул фоновых потоков после фиксации транзакции; пока их нет,
+страницы показывают оригинал. Готовые ширины записываются в
+``Event.image_variants``.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+ORIGINALS_DIR = 'events/originals'
+VARIANTS_DIR = 'events/variants'
+
+# Расширение и параметры сохранения для каждого формата копий
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла - хэш его содержимого"""
+
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest.hexdigest() + extension).replace('\\', '/')
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя означает одинаковое содержимое
+        return name
+
+
+def image_storage():
+    return ContentHashStorage()
+
+
+def variant_storage():
+    # Имена копий выводятся из имени оригинала, хэшировать их не нужно
+    return FileSystemStorage()
+
+
+def _digest(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def variant_name(name, width, image_format):
+    extension = FORMATS[image_format][0]
+    return f'{VARIANTS_DIR}/{_digest(name)}-{width}.{extension}'
+
+
+def target_widths(width):
+    """Ширины копий для оригинала шириной ``width``: копии не бывают шире
+    оригинала, но самая маленькая есть всегда"""
+    widths = [w for w in settings.IMAGE_WIDTHS if w < width]
+    if len(widths) < len(settings.IMAGE_WIDTHS):
+        widths.append(min(width, max(settings.IMAGE_WIDTHS)))
+    return widths
+
+
+def sources(name, widths):
+    """Адреса для <img>/<picture>: src и srcset в JPEG и WebP"""
+    if not widths:
+        return {'src': image_storage().url(name), 'jpeg': '', 'webp': ''}
+    storage = variant_storage()
+    srcsets = {
+        image_format: ', '.join(
+            f'{storage.url(variant_name(name, width, image_format))} {width}w' for width in widths
+        )
+        for image_format in FORMATS
+    }
+    srcsets['src'] = storage.url(variant_name(name, widths[0], 'jpeg'))
+    return srcsets
+
+
+def _resize(image, width):
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _flatten(image):
+    """RGB без прозрачности: JPEG не хранит альфа-канал"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def build_variants(name):
+    """Готовит копии оригинала ``name``; возвращает список ширин"""
+    with image_storage().open(name, 'rb') as original:
+        image = Image.open(original)
+        image = _flatten(ImageOps.exif_transpose(image))
+
+    storage = variant_storage()
+    widths = target_widths(image.width)
+    # Копии режутся от большей к меньшей: каждая следующая уменьшается
+    # из предыдущей, а не из полного оригинала
+    source = image
+    for width in sorted(widths, reverse=True):
+        source = _resize(source, width)
+        for image_format, (extension, options) in FORMATS.items():
+            target = variant_name(name, width, image_format)
+            if storage.exists(target):
+                continue
+            buffer = BytesIO()
+            source.save(buffer, image_format.upper(), **options)
+            storage.save(target, ContentFile(buffer.getvalue()))
+    return sorted(widths)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS, thread_name_prefix='event-images',
+            )
+        return _executor
+
+
+def schedule_variants(event_id, name, using='default'):
+    """Ставит подготовку копий в очередь после фиксации транзакции"""
+    transaction.on_commit(
+        lambda: _get_executor().submit(_process, event_id, name, using), using=using,
+    )
+
+
+def _process(event_id, name, using):
+    from .models import Event
+    from .signals import events_changed
+
+    try:
+        widths = build_variants(name)
+        # Картинку могли заменить, пока готовились копии. updated_at
+        # меняется, чтобы сбросить ETag страниц со старыми адресами.
+        # Повторы серии (events/recurrence.py) показывают ту же картинку.
+        events = Event.objects.using(using).filter(Q(id=event_id) | Q(series_id=event_id), image=name)
+        ids = list(events.values_list('id', flat=True))
+        if ids:
+            Event.objects.using(using).filter(id__in=ids).update(
+                image_variants=widths, updated_at=timezone.now(),
+            )
+            events_changed.send(sender=Event, event_ids=ids, using=using)
+    except Exception:
+        logger.exception('Не удалось подготовить копии изображения %s', name)
+    finally:
+        connections.close_all()
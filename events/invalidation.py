@@ -0,0 +1,114 @@
+"""Оповещение воркеров об изменении мероприятий.
+
+Кэш в памяти процесса (LocMemCache, кэши модулей) сбрасывается только в
+том воркере gunicorn, где сохранили мероприятие; остальные продолжали бы
+отдавать старые данные. Поэтому после фиксации изменения номер поколения
+в общем файле ``settings.INVALIDATION_FILE`` увеличивается на единицу.
+Файл отображён в память (mmap), и проверка номера в начале запроса
+(``InvalidationMiddleware``) - чтение восьми байт без системных вызовов.
+Увидев новый номер, воркер отправляет сигнал ``events_invalidated``, и его
+получатели сбрасывают свои кэши.
+
+Номер увеличивают и отдельные процессы (``expire_events --watch``,
+``import_events``), если они работают с тем же файлом.
+"""
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from .signals import events_invalidated
+
+try:
+    import fcntl
+except ImportError:  # Windows: номер согласуется только внутри процесса
+    fcntl = None
+
+
+COUNTER = struct.Struct('<Q')
+
+_lock = threading.Lock()
+_state = None
+_seen = None
+
+
+class _Counter:
+    def __init__(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size < COUNTER.size:
+            os.ftruncate(self.fd, COUNTER.size)
+        self.map = mmap.mmap(self.fd, COUNTER.size)
+
+    def read(self):
+        return COUNTER.unpack_from(self.map)[0]
+
+    def increment(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            value = self.read() + 1
+            COUNTER.pack_into(self.map, 0, value)
+            return value
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+
+def _counter():
+    global _state
+    state = _state
+    if state is None:
+        with _lock:
+            state = _state
+            if state is None:
+                state = _state = _Counter(settings.INVALIDATION_FILE)
+    return state
+
+
+def _reopen_after_fork():
+    # После fork (gunicorn --preload) файл открывается заново: блокировка
+    # flock общая у всех копий одного дескриптора
+    global _lock, _state
+    _lock = threading.Lock()
+    if _state is not None:
+        _state.close()
+        _state = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reopen_after_fork)
+
+
+def generation():
+    """Текущий номер поколения"""
+    return _counter().read()
+
+
+def publish(using='default'):
+    """Увеличивает номер после фиксации транзакции (вне транзакции -
+    сразу). Сам этот процесс тоже увидит новый номер в начале следующего
+    запроса: страницы, построенные до фиксации, могли взять старые данные."""
+    transaction.on_commit(lambda: _counter().increment(), using=using)
+
+
+def check():
+    """Сравнивает номер с последним увиденным; при изменении отправляет
+    ``events_invalidated``. Возвращает True, если кэши сброшены."""
+    global _seen
+    current = _counter().read()
+    if current == _seen:
+        return False
+    first = _seen is None
+    _seen = current
+    # При первой проверке в процессе сбрасывать ещё нечего
+    if not first:
+        events_invalidated.send(sender=None, generation=current)
+    return not first
@@ -0,0 +1,139 @@
+import multiprocessing
+import queue
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.utils import timezone
+
+from events.benchmarks import seed_events, temporary_database
+from events.models import Event
+
+
+# Настройки SQLite по умолчанию: журнал отката и полная синхронизация
+ROLLBACK_JOURNAL = {'journal_mode': 'delete', 'synchronous': 'full'}
+
+
+def read_loop(deadline, results):
+    """Читатель: как главная страница, берёт первую страницу афиши"""
+    latencies = []
+    errors = 0
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            list(Event.objects.upcoming().order_by('date', 'time', 'id')[:20])
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    connections.close_all()
+    results.put(('read', latencies, errors))
+
+
+def write_loop(deadline, results, batch_size, hold, pause):
+    """Писатель: как массовое действие в админке, обновляет пачку
+    мероприятий и держит транзакцию открытой ``hold`` секунд"""
+    ids = list(Event.objects.values_list('id', flat=True))
+    writes = 0
+    errors = 0
+    offset = 0
+    while time.monotonic() < deadline:
+        batch = ids[offset:offset + batch_size] or ids[:batch_size]
+        offset = (offset + batch_size) % max(len(ids), 1)
+        try:
+            with transaction.atomic():
+                Event.objects.filter(id__in=batch).update(updated_at=timezone.now())
+                time.sleep(hold)
+            writes += 1
+        except OperationalError:
+            errors += 1
+        time.sleep(pause)
+    connections.close_all()
+    results.put(('write', writes, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет, как читатели в нескольких процессах работают во время записи '
+        'из админки: с журналом отката SQLite и с настройками SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10000, help='Мероприятий во временной базе')
+        parser.add_argument('--readers', type=int, default=4, help='Процессов-читателей')
+        parser.add_argument('--duration', type=float, default=5.0, help='Длительность замера, с')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Мероприятий в одной записи')
+        parser.add_argument('--hold', type=float, default=0.05, help='Сколько секунд держать транзакцию записи')
+        parser.add_argument('--pause', type=float, default=0.05, help='Пауза между записями, с')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда проверяет только SQLite.')
+
+        configured = getattr(settings, 'SQLITE_PRAGMAS', {})
+        with temporary_database('concurrency.sqlite3'):
+            try:
+                seed_events(options['events'])
+                self.stdout.write(
+                    f'{"профиль":<16} {"чтений/с":>9} {"p50, мс":>8} {"p99, мс":>8} '
+                    f'{"макс, мс":>9} {"ошибок чтения":>14} {"записей":>8} {"ошибок записи":>14}'
+                )
+                for name, pragmas in (('журнал отката', ROLLBACK_JOURNAL), ('SQLITE_PRAGMAS', configured)):
+                    settings.SQLITE_PRAGMAS = pragmas
+                    self.report(name, self.run_profile(options))
+            finally:
+                settings.SQLITE_PRAGMAS = configured
+
+    def run_profile(self, options):
+        # Режим журнала переключается заранее, пока нет других соединений;
+        # процессы наследуют настройки и открывают свои соединения
+        connections.close_all()
+        connection.ensure_connection()
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        deadline = time.monotonic() + options['duration']
+        processes = [
+            context.Process(target=read_loop, args=(deadline, results))
+            for _ in range(options['readers'])
+        ]
+        processes.append(context.Process(
+            target=write_loop,
+            args=(deadline, results, options['batch_size'], options['hold'], options['pause']),
+        ))
+        for process in processes:
+            process.start()
+        try:
+            collected = [results.get(timeout=options['duration'] + 30) for _ in processes]
+        except queue.Empty:
+            raise CommandError('Процесс замера завершился с ошибкой.')
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+
+        latencies = []
+        read_errors = writes = write_errors = 0
+        for kind, value, errors in collected:
+            if kind == 'read':
+                latencies.extend(value)
+                read_errors += errors
+            else:
+                writes += value
+                write_errors += errors
+        return {
+            'latencies': latencies, 'read_errors': read_errors,
+            'writes': writes, 'write_errors': write_errors,
+            'duration': options['duration'],
+        }
+
+    def report(self, name, result):
+        latencies = sorted(result['latencies']) or [0.0]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f'{name:<16} {len(result["latencies"]) / result["duration"]:>9.0f} '
+            f'{statistics.median(latencies) * 1000:>8.2f} {p99 * 1000:>8.2f} '
+            f'{latencies[-1] * 1000:>9.1f} {result["read_errors"]:>14} '
+            f'{result["writes"]:>8} {result["write_errors"]:>14}'
+        )
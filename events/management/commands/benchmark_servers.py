@@ -0,0 +1,109 @@
+import signal
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from events.benchmarks import (
+    free_port, run_http_load, seed_events, server_environment, temporary_database, wait_for_port,
+)
+from events.models import Event
+
+
+WSGI = ['-m', 'gunicorn', 'city_events.wsgi:application']
+ASGI = ['-m', 'gunicorn', 'city_events.asgi:application', '-k', 'uvicorn.workers.UvicornWorker']
+
+# Аргументы запуска и переменные окружения: синхронные воркеры gunicorn
+# (WSGI, как сейчас), воркеры uvicorn с асинхронными представлениями и,
+# для сравнения, ASGI с синхронными представлениями
+SERVERS = {
+    'wsgi': (WSGI, {}),
+    'asgi': (ASGI, {'ASYNC_VIEWS': '1'}),
+    'asgi-sync': (ASGI, {'ASYNC_VIEWS': '0'}),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность публичных страниц и API под одновременной '
+        'нагрузкой: gunicorn с WSGI и gunicorn с воркерами uvicorn (ASGI) с асинхронными '
+        'и синхронными представлениями'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10000, help='Мероприятий во временной базе')
+        parser.add_argument('--workers', type=int, default=2, help='Воркеров сервера')
+        parser.add_argument('--concurrency', type=int, default=32, help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=10.0, help='Длительность замера, с')
+        parser.add_argument('--servers', default='wsgi,asgi,asgi-sync', help='Какие серверы сравнивать')
+
+    def handle(self, *args, **options):
+        servers = options['servers'].split(',')
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Неизвестные серверы: {", ".join(sorted(unknown))}')
+
+        with temporary_database('servers.sqlite3'), tempfile.TemporaryDirectory() as directory:
+            seed_events(options['events'])
+            paths = self.make_paths()
+
+            self.stdout.write(
+                f'{options["workers"]} воркера, {options["concurrency"]} клиентов, {options["duration"]:.0f} с'
+            )
+            self.stdout.write(
+                f'{"сервер":<10} {"запр/с":>8} {"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9} {"ошибок":>7}'
+            )
+            for name in servers:
+                result = self.run_server(name, directory, paths, options)
+                self.stdout.write(
+                    f'{name:<10} {result["rps"]:>8.1f} {result["p50"]:>9.2f} {result["p95"]:>9.2f} '
+                    f'{result["p99"]:>9.2f} {result["errors"]:>7}'
+                )
+
+    def make_paths(self):
+        """Смесь запросов: главная страница, карточки мероприятий и API за неделю"""
+        ids = list(Event.objects.upcoming().values_list('id', flat=True)[:50])
+        today = timezone.localdate()
+        week = f'date_from={today}&date_to={today + timedelta(days=7)}'
+        paths = []
+        for event_id in ids:
+            paths += ['/', f'/event/{event_id}/', f'/api/events/?{week}', f'/api/events/{event_id}/']
+        return paths
+
+    def run_server(self, name, directory, paths, options):
+        port = free_port()
+        arguments, overrides = SERVERS[name]
+        environment = server_environment(directory, **overrides)
+        command = [sys.executable, *arguments, '-b', f'127.0.0.1:{port}', '-w', str(options['workers'])]
+        log_path = Path(directory) / f'{name}.log'
+        with open(log_path, 'wb') as log:
+            process = subprocess.Popen(
+                command, cwd=settings.BASE_DIR, env=environment,
+                stdout=subprocess.DEVNULL, stderr=log,
+            )
+        try:
+            self.wait_ready(process, port, log_path)
+            return run_http_load(
+                '127.0.0.1', port, paths,
+                concurrency=options['concurrency'], duration=options['duration'],
+            )
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def wait_ready(self, process, port, log_path):
+        try:
+            started = wait_for_port(process, port)
+        except TimeoutError:
+            raise CommandError('Сервер не ответил за отведённое время.')
+        if not started:
+            log = log_path.read_text(encoding='utf-8', errors='replace')
+            raise CommandError(f'Сервер не запустился:\n{log}')
@@ -0,0 +1,130 @@
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from events.benchmarks import (
+    free_port, seed_events, server_environment, temporary_database, timed_get, wait_for_port,
+)
+from events.models import Event
+
+
+IMPORT_SCRIPT = (
+    'import time; started = time.perf_counter(); import city_events.wsgi; '
+    'print((time.perf_counter() - started) * 1000)'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет холодный старт gunicorn: время импорта приложения, первого ответа после '
+        'запуска и первых запросов к каждой странице - без настроек и с gunicorn.conf.py '
+        '(preload и прогрев), в том числе после перезапуска воркера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1000, help='Мероприятий во временной базе')
+        parser.add_argument('--repeat', type=int, default=5, help='Прогретых повторов каждой страницы')
+        parser.add_argument('--imports', type=int, default=3, help='Сколько раз замерять импорт')
+
+    def handle(self, *args, **options):
+        with temporary_database('startup.sqlite3'), tempfile.TemporaryDirectory() as directory:
+            seed_events(options['events'])
+            paths = self.make_paths()
+            environment = server_environment(directory)
+
+            imports = [self.measure_import(environment) for _ in range(options['imports'])]
+            self.stdout.write(f'Импорт city_events.wsgi в новом процессе: {statistics.median(imports):.0f} мс')
+
+            # Пустой файл: иначе gunicorn сам прочитает gunicorn.conf.py из корня
+            empty = Path(directory) / 'empty.conf.py'
+            empty.write_text('', encoding='utf-8')
+            variants = [
+                ('без настроек', empty),
+                ('gunicorn.conf.py', settings.BASE_DIR / 'gunicorn.conf.py'),
+            ]
+            results = [
+                self.run_server(config, directory, environment, paths, options['repeat'])
+                for _, config in variants
+            ]
+
+            rows = [
+                ('запуск → первый ответ', 'startup'),
+                ('первый запрос', 'first'),
+                ('первые запросы страниц, сумма', 'cold'),
+                ('прогретые запросы, p50', 'warm'),
+                ('новый воркер: первые запросы, сумма', 'recycled'),
+            ]
+            self.stdout.write(f'{"мс":<38}' + ''.join(f'{name:>18}' for name, _ in variants))
+            for title, key in rows:
+                self.stdout.write(f'{title:<38}' + ''.join(f'{result[key]:>18.1f}' for result in results))
+
+    def make_paths(self):
+        """По одному запросу к каждой публичной странице и API. Ленты .ics
+        здесь нет: её первый запрос заполняет кэш блоков VEVENT, а это
+        стоимость данных, а не запуска (см. benchmark_views)"""
+        event_id = Event.objects.upcoming().values_list('id', flat=True).first()
+        return [
+            '/', f'/event/{event_id}/', '/calendar/', '/search/?' + urlencode({'q': 'концерт'}),
+            '/api/events/', f'/api/events/{event_id}/',
+        ]
+
+    def measure_import(self, environment):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_SCRIPT],
+            cwd=settings.BASE_DIR, env=environment, capture_output=True, text=True, check=True,
+        )
+        return float(output.stdout)
+
+    def run_server(self, config, directory, environment, paths, repeat):
+        """Один воркер. После первых и прогретых запросов он перезапускается
+        (--max-requests), и первые запросы замеряются ещё раз на новом."""
+        port = free_port()
+        served = len(paths) * (1 + repeat)
+        command = [
+            sys.executable, '-m', 'gunicorn', '-c', str(config), 'city_events.wsgi:application',
+            '-b', f'127.0.0.1:{port}', '-w', '1',
+            '--max-requests', str(served), '--max-requests-jitter', '0',
+        ]
+        log_path = Path(directory) / f'{Path(config).stem}.log'
+        started = time.perf_counter()
+        with open(log_path, 'wb') as log:
+            process = subprocess.Popen(
+                command, cwd=settings.BASE_DIR, env=environment,
+                stdout=subprocess.DEVNULL, stderr=log,
+            )
+        try:
+            try:
+                ready = wait_for_port(process, port)
+            except TimeoutError:
+                raise CommandError('Сервер не ответил за отведённое время.')
+            if not ready:
+                log = log_path.read_text(encoding='utf-8', errors='replace')
+                raise CommandError(f'Сервер не запустился:\n{log}')
+
+            cold = [timed_get('127.0.0.1', port, paths[0])]
+            startup = (time.perf_counter() - started) * 1000
+            cold += [timed_get('127.0.0.1', port, path) for path in paths[1:]]
+            warm = [timed_get('127.0.0.1', port, path) for _ in range(repeat) for path in paths]
+            recycled = [timed_get('127.0.0.1', port, path) for path in paths]
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+        return {
+            'startup': startup,
+            'first': cold[0],
+            'cold': sum(cold),
+            'warm': statistics.median(warm),
+            'recycled': sum(recycled),
+        }
@@ -0,0 +1,81 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from events.benchmarks import default_scenarios, run_scenario, seed_events, temporary_database
+
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку (p50/p95/p99), пропускную способность и число SQL-запросов '
+        'публичных страниц, API и поиска в админке на временной базе с N мероприятиями'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000,100000',
+            help='Размеры базы через запятую (по умолчанию 1000,10000,100000)',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Файл базовых результатов')
+        parser.add_argument('--save-baseline', action='store_true', help='Сохранить результаты как базовые')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        baseline_path = Path(options['baseline'])
+        baseline = {}
+        if baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+
+        results = {}
+        for size in sizes:
+            results.update(self.run_size(size, options, baseline))
+
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline.update(results)
+            baseline_path.write_text(
+                json.dumps(baseline, ensure_ascii=False, indent=2, sort_keys=True) + '\n',
+                encoding='utf-8',
+            )
+            self.stdout.write(self.style.SUCCESS(f'Базовые результаты сохранены в {baseline_path}'))
+
+    def run_size(self, size, options, baseline):
+        """Создаёт временную базу с ``size`` мероприятиями и прогоняет сценарии"""
+        with temporary_database():
+            seed_events(size, seed=options['seed'])
+            staff_user = get_user_model().objects.create_user(
+                'benchmark', password='benchmark', is_staff=True
+            )
+
+            self.stdout.write(f'\n{size} мероприятий')
+            self.stdout.write(
+                f'{"сценарий":<20} {"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9} '
+                f'{"запр/с":>8} {"SQL":>4}  {"p50 к базовому":>14}'
+            )
+            results = {}
+            for scenario in default_scenarios():
+                result = run_scenario(
+                    scenario, options['requests'], staff_user=staff_user, seed=options['seed']
+                )
+                key = f'{size}:{scenario.name}'
+                results[key] = result
+                self.stdout.write(
+                    f'{scenario.name:<20} {result["p50"]:>9.2f} {result["p95"]:>9.2f} '
+                    f'{result["p99"]:>9.2f} {result["rps"]:>8.1f} {result["queries"]:>4}  '
+                    f'{self.compare(result, baseline.get(key)):>14}'
+                )
+            return results
+
+    def compare(self, result, reference):
+        if not reference:
+            return '-'
+        change = (result['p50'] - reference['p50']) / reference['p50'] * 100
+        return f'{change:+.0f}%'
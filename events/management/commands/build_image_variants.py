@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events import images
+from events.models import Event
+from events.signals import events_changed
+
+
+class Command(BaseCommand):
+    help = 'Готовит уменьшенные копии афиш, для которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Пересчитать копии всех загруженных афиш')
+
+    def handle(self, *args, **options):
+        # Очередь фоновых потоков живёт в памяти процесса и теряется при
+        # перезапуске; команда добирает то, что не успело обработаться
+        events = Event.objects.exclude(image='')
+        if not options['all']:
+            events = events.filter(image_variants=[])
+
+        changed = []
+        for event_id, name in events.values_list('id', 'image').iterator():
+            try:
+                widths = images.build_variants(name)
+            except OSError as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            Event.objects.filter(id=event_id, image=name).update(
+                image_variants=widths, updated_at=timezone.now(),
+            )
+            changed.append(event_id)
+
+        if changed:
+            events_changed.send(sender=Event, event_ids=changed, using='default')
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {len(changed)}'))
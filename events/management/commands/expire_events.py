@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from events.expiry import BATCH_SIZE, MAX_SLEEP, expire_past_events, next_expiry, run_scheduler
+from events.recurrence import roll_window
+
+
+class Command(BaseCommand):
+    help = (
+        'Деактивирует прошедшие мероприятия и продлевает окно повторов серий '
+        '(однократно или в режиме планировщика)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Работать постоянно, просыпаясь к началу ближайшего мероприятия',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Сколько мероприятий деактивировать одним запросом',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=float,
+            default=MAX_SLEEP,
+            help='Максимальная пауза между проверками в секундах',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['watch']:
+            self.stdout.write('Планировщик запущен. Для остановки нажмите CONTROL-C.')
+            try:
+                run_scheduler(
+                    batch_size=batch_size,
+                    max_sleep=options['max_sleep'],
+                    log=self.stdout.write,
+                )
+            except KeyboardInterrupt:
+                self.stdout.write('Планировщик остановлен.')
+            return
+
+        expired = expire_past_events(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Деактивировано прошедших мероприятий: {expired}'))
+
+        created, deleted = roll_window()
+        self.stdout.write(f'Повторы серий: создано {created}, удалено прошедших {deleted}')
+
+        upcoming = next_expiry()
+        if upcoming is not None:
+            self.stdout.write(f'Следующее мероприятие начнётся: {upcoming:%d.%m.%Y %H:%M}')
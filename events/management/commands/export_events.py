@@ -0,0 +1,48 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.exchange import FIELDS, FORMATS, RowWriter, detect_format
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Выгружает мероприятия в файл CSV или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или "-" для стандартного вывода')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию - по расширению)')
+        parser.add_argument('--active-only', action='store_true', help='Только активные мероприятия')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Сколько строк читать из базы за раз')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        if file_format is None:
+            raise CommandError('Не удалось определить формат файла, укажите --format.')
+
+        events = Event.objects.order_by('date', 'time', 'id')
+        if options['active_only']:
+            events = events.filter(is_active=True)
+        rows = events.values_list(*FIELDS).iterator(chunk_size=options['chunk_size'])
+
+        started = time.monotonic()
+        if path == '-':
+            exported = self.export(rows, sys.stdout, file_format)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                exported = self.export(rows, stream, file_format)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        # При выводе в stdout отчёт не должен попасть в сам файл
+        report = self.stderr if path == '-' else self.stdout
+        report.write(f'Выгружено мероприятий: {exported}, {exported / elapsed:.0f} строк/с')
+
+    def export(self, rows, stream, file_format):
+        writer = RowWriter(stream, file_format)
+        exported = 0
+        for values in rows:
+            writer.write(values)
+            exported += 1
+        return exported
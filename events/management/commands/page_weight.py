@@ -0,0 +1,61 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from events.benchmarks import page_weight, seed_events, temporary_database
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько байт передаётся при открытии страниц: HTML, '
+        'подключённые CSS/JS при первом визите и при повторном (с учётом кэша браузера)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=200, help='Мероприятий во временной базе')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        if not staticfiles_storage.hashed_files:
+            self.stderr.write(
+                'Статика не собрана (manage.py collectstatic): файлы без хэша в имени '
+                'не кэшируются надолго, и повторный визит будет тяжелее.'
+            )
+
+        with temporary_database():
+            seed_events(options['events'])
+            staff_user = get_user_model().objects.create_user(
+                'benchmark', password='benchmark', is_staff=True
+            )
+            event_id = Event.objects.upcoming().values_list('id', flat=True).first()
+
+            anonymous = Client(HTTP_HOST='localhost')
+            staff = Client(HTTP_HOST='localhost')
+            staff.force_login(staff_user)
+            pages = [
+                ('/', anonymous),
+                (f'/event/{event_id}/', anonymous),
+                ('/admin/login/', anonymous),
+                ('/admin/events/', staff),
+                ('/admin/events/add/', staff),
+            ]
+            results = {path: page_weight(client, path) for path, client in pages}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f'{"страница":<22} {"HTML":>8} {"HTML gz":>8} {"статика":>9} '
+            f'{"1-й визит":>10} {"повторный":>10} {"CDN":>4}'
+        )
+        for path, result in results.items():
+            self.stdout.write(
+                f'{path:<22} {result["html"]:>8} {result["html_gzip"]:>8} {result["assets"]:>9} '
+                f'{result["first_visit"]:>10} {result["repeat_visit"]:>10} {result["external"]:>4}'
+            )
+        self.stdout.write('Размеры в байтах; HTML gz и статика - то, что передаётся по сети.')
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from events.prerender import prerender_site
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет главную страницу и страницы мероприятий в статические HTML-файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перерисовать все страницы, а не только изменившиеся',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        result = prerender_site(force=options['force'])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Страниц мероприятий записано: {result.rendered}, удалено: {result.removed}, '
+            f'главная {"обновлена" if result.list_changed else "не изменилась"} ({elapsed:.1f} с)'
+        ))
+        self.stdout.write(f'Каталог: {settings.PRERENDER_ROOT}')
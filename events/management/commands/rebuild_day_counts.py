@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from events import day_counts
+from events.models import DailyEventCount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает число мероприятий по дням для календаря'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Псевдоним базы данных')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        day_counts.rebuild(using)
+        days = DailyEventCount.objects.using(using).count()
+        self.stdout.write(self.style.SUCCESS(f'Дней с мероприятиями: {days}'))
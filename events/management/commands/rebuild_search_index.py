@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from events import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс мероприятий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Псевдоним базы данных')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not search.is_available(using):
+            self.stdout.write(self.style.WARNING('Полнотекстовый индекс в этой базе недоступен.'))
+            return
+        count = search.rebuild_index(using)
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано мероприятий: {count}'))
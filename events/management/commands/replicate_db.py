@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from events.replication import INTERVAL, copy_database, run_replication
+from events.routers import PRIMARY_ALIAS, REPLICA_ALIAS, replica_configured
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в реплику для чтения (однократно или постоянно)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Работать постоянно и копировать базу после каждого изменения',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=INTERVAL,
+            help='Пауза между проверками изменений в секундах',
+        )
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('Реплика не настроена: задайте переменную окружения DATABASE_REPLICA_NAME.')
+        for alias in (PRIMARY_ALIAS, REPLICA_ALIAS):
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError('Команда копирует только базы SQLite.')
+
+        if options['watch']:
+            self.stdout.write('Репликация запущена. Для остановки нажмите CONTROL-C.')
+            try:
+                run_replication(interval=options['interval'], log=self.stdout.write)
+            except KeyboardInterrupt:
+                self.stdout.write('Репликация остановлена.')
+            return
+
+        copy_database()
+        self.stdout.write(self.style.SUCCESS('Реплика обновлена.'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.benchmarks import seed_events
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Создаёт N тестовых мероприятий (для нагрузочного тестирования)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help='Сколько мероприятий создать')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+        parser.add_argument('--past-ratio', type=float, default=0.2, help='Доля прошедших мероприятий')
+        parser.add_argument('--clear', action='store_true', help='Удалить существующие мероприятия')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted, _ = Event.objects.all().delete()
+            self.stdout.write(f'Удалено мероприятий: {deleted}')
+
+        started = time.monotonic()
+        created = seed_events(options['count'], seed=options['seed'], past_ratio=options['past_ratio'])
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано мероприятий: {created} за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,304 @@
+"""Метрики производительности запросов в формате Prometheus.
+
+Каждый процесс копит гистограммы в памяти и не чаще раза в
+``FLUSH_INTERVAL`` секунд сбрасывает их в свой файл ``<pid>.json`` в
+каталоге ``settings.METRICS_DIR``. Страница ``/metrics`` складывает файлы
+всех процессов, поэтому показывает сумму по всем воркерам gunicorn.
+
+Файл завершившегося процесса (воркер перезапущен по ``max_requests``)
+переносится в общий ``retired.json`` и удаляется: счётчики не
+уменьшаются, а каталог не растёт с каждым перезапуском. Переносит его
+главный процесс gunicorn (``child_exit`` в gunicorn.conf.py), а без
+gunicorn - ``collect()``, заметив файл процесса, которого больше нет.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: файлы переносятся без блокировки
+    fcntl = None
+
+
+# Границы корзин гистограмм в секундах
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+FLUSH_INTERVAL = 1.0
+
+# Сумма метрик завершившихся процессов
+RETIRED_FILE = 'retired.json'
+
+HISTOGRAMS = {
+    'city_events_request_duration_seconds': 'Время обработки запроса',
+    'city_events_db_duration_seconds': 'Время SQL-запросов за один запрос',
+    'city_events_template_duration_seconds': 'Время отрисовки шаблонов за один запрос',
+}
+
+COUNTERS = {
+    'city_events_requests_total': 'Число обработанных запросов',
+    'city_events_db_queries_total': 'Число SQL-запросов',
+    'city_events_db_writes_total': 'Число SQL-запросов на запись (INSERT, UPDATE, DELETE)',
+}
+
+
+class Registry:
+    """Метрики одного процесса"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.counters = {name: {} for name in COUNTERS}
+        self.flushed_at = 0.0
+
+    def observe(self, name, view, seconds):
+        with self.lock:
+            histogram = self.histograms[name].get(view)
+            if histogram is None:
+                histogram = self.histograms[name][view] = {
+                    'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0,
+                }
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def increment(self, name, view, amount=1):
+        with self.lock:
+            self.counters[name][view] = self.counters[name].get(view, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps({
+                'histograms': self.histograms, 'counters': self.counters,
+            }))
+
+    def flush(self, force=False):
+        """Записывает метрики процесса в его файл (не чаще FLUSH_INTERVAL)"""
+        directory = _metrics_dir()
+        now = time.monotonic()
+        if directory is None or (not force and now - self.flushed_at < FLUSH_INTERVAL):
+            return
+        self.flushed_at = now
+
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{os.getpid()}.json'
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self.snapshot()), encoding='utf-8')
+        os.replace(temporary, path)
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush(force=True))
+
+
+class RequestTimer:
+    """Время SQL и шаблонов в рамках одного запроса"""
+
+    WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+    def __init__(self):
+        self.db = 0.0
+        self.template = 0.0
+        self.queries = 0
+        self.writes = 0
+        self.template_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+            if sql.lstrip()[:7].upper().startswith(self.WRITE_STATEMENTS):
+                self.writes += 1
+
+
+current_timer = ContextVar('events_request_timer', default=None)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Постоянная обёртка запросов соединения (ставится при его создании).
+
+    Соединения с базой у каждого потока свои, а асинхронный ORM выполняет
+    запросы в отдельном потоке, поэтому замер ищет таймер запроса через
+    ContextVar - контекст передаётся в этот поток.
+    """
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer.execute(execute, sql, params, many, context)
+
+
+@contextmanager
+def template_timer():
+    """Учитывает время отрисовки шаблона; вложенные отрисовки
+    (render_to_string внутри тега и т. п.) не считаются дважды"""
+    timer = current_timer.get()
+    if timer is None:
+        yield
+        return
+    timer.template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.template_depth -= 1
+        if timer.template_depth == 0:
+            timer.template += time.perf_counter() - started
+
+
+def _metrics_dir():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+def record_request(view, duration, db_duration, template_duration, queries, writes):
+    """Учитывает один обработанный запрос"""
+    registry.observe('city_events_request_duration_seconds', view, duration)
+    registry.observe('city_events_db_duration_seconds', view, db_duration)
+    registry.observe('city_events_template_duration_seconds', view, template_duration)
+    registry.increment('city_events_requests_total', view)
+    registry.increment('city_events_db_queries_total', view, queries)
+    registry.increment('city_events_db_writes_total', view, writes)
+    registry.flush()
+
+
+def _empty():
+    return {'histograms': {}, 'counters': {}}
+
+
+@contextmanager
+def _directory_lock(directory):
+    with open(directory / '.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def retire(pid):
+    """Переносит метрики завершившегося процесса ``pid`` в RETIRED_FILE
+    и удаляет его файл"""
+    directory = _metrics_dir()
+    if directory is None or not directory.is_dir():
+        return
+    path = directory / f'{pid}.json'
+    retired = directory / RETIRED_FILE
+    with _directory_lock(directory):
+        # Файл мог уже перенести другой процесс
+        try:
+            snapshot = json.loads(path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return
+        except ValueError:
+            snapshot = _empty()
+        total = _empty()
+        try:
+            _merge(total, json.loads(retired.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            pass
+        _merge(total, snapshot)
+        temporary = retired.with_suffix('.tmp')
+        temporary.write_text(json.dumps(total), encoding='utf-8')
+        os.replace(temporary, retired)
+        path.unlink()
+
+
+def retire_exited(directory):
+    """Переносит файлы процессов, которых больше нет"""
+    # os.kill с сигналом 0 проверяет процесс только в POSIX
+    if os.name != 'posix':
+        return
+    for path in directory.glob('*.json'):
+        if path.stem.isdigit() and not _process_exists(int(path.stem)):
+            retire(int(path.stem))
+
+
+def _merge(total, snapshot):
+    for name, views in snapshot.get('histograms', {}).items():
+        for view, histogram in views.items():
+            merged = total['histograms'].setdefault(name, {}).setdefault(
+                view, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            )
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+    for name, views in snapshot.get('counters', {}).items():
+        for view, value in views.items():
+            counters = total['counters'].setdefault(name, {})
+            counters[view] = counters.get(view, 0) + value
+
+
+def collect():
+    """Метрики всех процессов: файлы остальных воркеров и текущее
+    состояние своего процесса"""
+    total = _empty()
+    directory = _metrics_dir()
+    own_file = f'{os.getpid()}.json'
+    if directory is not None and directory.is_dir():
+        # До чтения: иначе метрики процесса могли бы не попасть ни в его
+        # файл, ни в уже прочитанный RETIRED_FILE, и счётчики уменьшились бы
+        retire_exited(directory)
+        for path in directory.glob('*.json'):
+            if path.name == own_file:
+                continue
+            try:
+                _merge(total, json.loads(path.read_text(encoding='utf-8')))
+            except (OSError, ValueError):
+                # Файл мог быть удалён или ещё не дописан
+                continue
+    _merge(total, registry.snapshot())
+    return total
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def render_prometheus(metrics=None):
+    """Текстовый формат Prometheus (exposition format 0.0.4)"""
+    metrics = metrics or collect()
+    lines = []
+
+    for name, help_text in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for view, histogram in sorted(metrics['histograms'].get(name, {}).items()):
+            label = f'view="{_escape(view)}"'
+            for bound, count in zip(BUCKETS, histogram['buckets']):
+                lines.append(f'{name}_bucket{{{label},le="{_format_bound(bound)}"}} {count}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{name}_sum{{{label}}} {histogram["sum"]!r}')
+            lines.append(f'{name}_count{{{label}}} {histogram["count"]}')
+
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for view, value in sorted(metrics['counters'].get(name, {}).items()):
+            lines.append(f'{name}{{view="{_escape(view)}"}} {value}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,171 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import empty
+
+from . import invalidation, metrics, routers, staticfiles
+
+
+# Методы, которые не меняют данные (RFC 9110, 9.2.1)
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class HybridMiddleware:
+    """Основа middleware, которое работает и под WSGI, и под ASGI без
+    переключения потоков: подклассы задают ``before()`` и ``after()``,
+    а ``process_request()`` может ответить сам, не вызывая приложение"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.process_request(request)
+        if response is not None:
+            return response
+        state = self.before(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.finish(state)
+        return self.after(request, response, state)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is not None:
+            return response
+        state = self.before(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.finish(state)
+        return self.after(request, response, state)
+
+    def process_request(self, request):
+        return None
+
+    def before(self, request):
+        return None
+
+    def finish(self, state):
+        pass
+
+    def after(self, request, response, state):
+        return response
+
+
+class StaticFilesMiddleware(HybridMiddleware):
+    """Раздаёт статику из STATIC_ROOT (см. events/staticfiles.py).
+
+    Стоит в MIDDLEWARE самым первым: запросы статики не проходят через
+    сессии и остальные middleware и не попадают в метрики представлений.
+    """
+
+    def process_request(self, request):
+        return staticfiles.serve(request)
+
+
+class InvalidationMiddleware(HybridMiddleware):
+    """Перед запросом проверяет общий номер поколения и, если другой
+    воркер изменил мероприятия, сбрасывает кэши этого процесса"""
+
+    def process_request(self, request):
+        invalidation.check()
+
+
+class PerformanceMiddleware(HybridMiddleware):
+    """Замеряет время запроса, SQL и шаблонов по имени представления.
+
+    Результат записывается в метрики (страница /metrics) и в заголовок
+    Server-Timing, который видно во вкладке Network инструментов
+    разработчика браузера. Заголовок выдаёт число запросов и время
+    каждой страницы, поэтому его получают только сотрудники (с DEBUG -
+    все). Подключается первым в MIDDLEWARE, чтобы учитывать и запросы
+    остальных middleware (сессии, пользователь).
+    """
+
+    def before(self, request):
+        timer = metrics.RequestTimer()
+        token = metrics.current_timer.set(timer)
+        return timer, token, time.perf_counter()
+
+    def finish(self, state):
+        metrics.current_timer.reset(state[1])
+
+    def after(self, request, response, state):
+        timer, token, started = state
+        duration = time.perf_counter() - started
+
+        metrics.record_request(
+            self.view_name(request), duration, timer.db, timer.template,
+            timer.queries, timer.writes,
+        )
+        if self.shows_timing(request):
+            response['Server-Timing'] = (
+                f'db;dur={timer.db * 1000:.1f};desc="SQL: {timer.queries}", '
+                f'tpl;dur={timer.template * 1000:.1f};desc="templates", '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        return response
+
+    def shows_timing(self, request):
+        if settings.DEBUG:
+            return True
+        # Без cookie сессии пользователь анонимный - база не нужна
+        user = getattr(request, 'user', None)
+        if user is None or settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return False
+        # Под ASGI пользователя здесь не загрузить из базы: если его не
+        # загрузило представление, заголовок не отправляется
+        if iscoroutinefunction(self) and getattr(user, '_wrapped', None) is empty:
+            return False
+        return user.is_staff
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        return match.view_name or match._func_path
+
+
+class ReplicaPinMiddleware(HybridMiddleware):
+    """Выбирает базу для чтения в рамках запроса (events/routers.py).
+
+    Из основной базы целиком читают запросы, которые могут писать (не
+    GET/HEAD/OPTIONS), и запросы с сессией - вошедшие сотрудники правят
+    мероприятия, а проверки форм (уникальность, Venue.clean) по реплике
+    пропустили бы только что записанные строки. После запроса, который
+    что-то записал, браузер получает cookie на ``REPLICA_PIN_SECONDS``
+    секунд, и пока она есть, чтение тоже идёт из основной базы - реплика
+    могла ещё не получить изменения.
+    """
+
+    def before(self, request):
+        # Сессия проверяется по cookie: пользователь ещё не загружен, а в
+        # асинхронных представлениях его нельзя загрузить из базы здесь
+        pinned = (
+            request.method not in SAFE_METHODS
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+            or settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+        return routers.start_request(pinned=pinned)
+
+    def finish(self, state):
+        routers.end_request(state[1])
+
+    def after(self, request, response, state):
+        routing_state, token = state
+        if routing_state.wrote and routers.replica_configured():
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:00
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_starts_at(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    manager = Event.objects.using(schema_editor.connection.alias)
+    batch = []
+    for event in manager.only('id', 'date', 'time'):
+        if event.time is None:
+            starts_at = datetime.combine(event.date + timedelta(days=1), datetime.min.time())
+        else:
+            starts_at = datetime.combine(event.date, event.time)
+        event.starts_at = timezone.make_aware(starts_at)
+        batch.append(event)
+        if len(batch) >= 500:
+            manager.bulk_update(batch, ['starts_at'])
+            batch = []
+    if batch:
+        manager.bulk_update(batch, ['starts_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_alter_event_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Начало'),
+        ),
+        migrations.RunPython(fill_starts_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='event',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, verbose_name='Начало'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_active', 'starts_at'], name='event_active_starts_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:00
+
+from django.db import migrations
+
+
+def create_fts_index(apps, schema_editor):
+    # Полнотекстовый индекс есть только в SQLite (модуль FTS5)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS events_event_fts "
+        "USING fts5(title, location, description, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO events_event_fts (rowid, title, location, description) "
+        "SELECT id, title, location, description FROM events_event"
+    )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS events_event_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_date_time_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_active', 'date', 'time', 'id'], name='event_active_date_time_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:35
+
+from django.db import migrations, models
+import events.images
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_active_date_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='image',
+            field=models.ImageField(blank=True, storage=events.images.image_storage, upload_to='events/originals', verbose_name='Изображение'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Уменьшенные копии'),
+        ),
+    ]
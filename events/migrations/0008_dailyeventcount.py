@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:48
+
+from django.db import migrations, models
+
+
+def fill_counts(apps, schema_editor):
+    schema_editor.execute(
+        "INSERT INTO events_dailyeventcount (date, active, total) "
+        "SELECT date, SUM(CASE WHEN is_active THEN 1 ELSE 0 END), COUNT(*) "
+        "FROM events_event GROUP BY date"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyEventCount',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False, verbose_name='Дата')),
+                ('active', models.PositiveIntegerField(default=0, verbose_name='Активных')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Всего')),
+            ],
+            options={
+                'verbose_name': 'Мероприятий за день',
+                'verbose_name_plural': 'Мероприятий по дням',
+            },
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:52
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def normalize_venue(name):
+    # Копия events.models.normalize_venue на момент миграции
+    name = name.casefold().replace('ё', 'е')
+    key = ' '.join(re.sub(r'[^\w\s]', ' ', name).split())
+    return key or ' '.join(name.split())
+
+
+def fill_venues(apps, schema_editor):
+    """Одно место на каждый ключ; название - самое частое написание.
+    Мероприятия получают ссылку на место и его название."""
+    alias = schema_editor.connection.alias
+    Event = apps.get_model('events', 'Event')
+    Venue = apps.get_model('events', 'Venue')
+
+    spellings = {}
+    locations = {}
+    for location, count in (
+        Event.objects.using(alias).order_by().values_list('location').annotate(count=models.Count('id'))
+    ):
+        key = normalize_venue(location)
+        spellings.setdefault(key, Counter())[' '.join(location.split())] += count
+        locations.setdefault(key, []).append(location)
+    if not spellings:
+        return
+
+    Venue.objects.using(alias).bulk_create(
+        Venue(key=key, name=counter.most_common(1)[0][0]) for key, counter in spellings.items()
+    )
+    venues = Venue.objects.using(alias).in_bulk(list(spellings), field_name='key')
+
+    fts = (
+        schema_editor.connection.vendor == 'sqlite'
+        and 'events_event_fts' in schema_editor.connection.introspection.table_names()
+    )
+    now = timezone.now()
+    for key, venue in venues.items():
+        events = Event.objects.using(alias).filter(location__in=locations[key])
+        events.filter(location=venue.name).update(venue=venue)
+        # Другие написания заменяются названием места; updated_at
+        # меняется, чтобы обновились кэши и статические копии страниц
+        renamed = events.exclude(location=venue.name)
+        ids = list(renamed.values_list('id', flat=True))
+        if not ids:
+            continue
+        renamed.update(venue=venue, location=venue.name, updated_at=now)
+        if fts:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                schema_editor.execute(
+                    f"UPDATE events_event_fts SET location = %s WHERE rowid IN ({', '.join(['%s'] * len(batch))})",
+                    [venue.name, *batch],
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_dailyeventcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Venue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Название')),
+                ('key', models.CharField(editable=False, max_length=200, unique=True, verbose_name='Ключ')),
+            ],
+            options={
+                'verbose_name': 'Место проведения',
+                'verbose_name_plural': 'Места проведения',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='venue',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='events', to='events.venue', verbose_name='Площадка'),
+        ),
+        migrations.RunPython(fill_venues, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['venue', 'is_active', 'date', 'time', 'id'], name='event_venue_date_idx'),
+        ),
+    ]
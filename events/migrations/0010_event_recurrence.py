@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_venue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='recurrence',
+            field=models.CharField(blank=True, choices=[('', 'Не повторяется'), ('daily', 'Каждый день'), ('weekly', 'Каждую неделю'), ('monthly', 'Каждый месяц')], default='', max_length=10, verbose_name='Повторение'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_exclude',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Исключённые даты'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_interval',
+            field=models.PositiveSmallIntegerField(default=1, verbose_name='Интервал повторения'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_materialized_until',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Повторы созданы до'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_until',
+            field=models.DateField(blank=True, null=True, verbose_name='Повторять до'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='series',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='events.event', verbose_name='Серия'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('recurrence', ''), _negated=True), fields=['recurrence'], name='event_recurrence_idx'),
+        ),
+    ]
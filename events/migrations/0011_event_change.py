@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:03
+
+from django.db import migrations, models
+
+
+def fill_changes(apps, schema_editor):
+    # Существующие мероприятия - записи о создании: синхронизация с начала
+    # журнала получает всю афишу
+    schema_editor.execute(
+        "INSERT INTO events_eventchange (event_id, action, changed_at) "
+        "SELECT id, 'created', updated_at FROM events_event ORDER BY id"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_event_recurrence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.IntegerField(verbose_name='Мероприятие')),
+                ('action', models.CharField(choices=[('created', 'Создано'), ('updated', 'Изменено'), ('deleted', 'Удалено')], max_length=10, verbose_name='Действие')),
+                ('changed_at', models.DateTimeField(verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение мероприятия',
+                'verbose_name_plural': 'Журнал изменений мероприятий',
+            },
+        ),
+        migrations.RunPython(fill_changes, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,158 @@
 from django.db import models
+from django.db.models import BooleanField, ExpressionWrapper, Func, Q, TextField
 from django.utils import timezone
-from datetime import datetime
+from django.core.exceptions import ValidationError
+from datetime import datetime, timedelta
 import os
+import re
+
+from . import images
+
+
+# Длина анонса описания в списках
+TEASER_LENGTH = 100
+
+RECURRENCE_CHOICES = [
+    ('', 'Не повторяется'),
+    ('daily', 'Каждый день'),
+    ('weekly', 'Каждую неделю'),
+    ('monthly', 'Каждый месяц'),
+]
+
+
+class Teaser(Func):
+    """Первые ``length`` символов текста и многоточие, если текст длиннее.
+
+    Одно выражение с готовым шаблоном вместо Case/When/Concat: такое
+    дерево ORM собирает в SQL заметно дольше, чем выполняется сам запрос.
+    """
+    template = (
+        "CASE WHEN LENGTH(%(expressions)s) > %(length)d "
+        "THEN SUBSTR(%(expressions)s, 1, %(length)d) || '...' "
+        "ELSE %(expressions)s END"
+    )
+    output_field = TextField()
+
+    def __init__(self, expression, length):
+        super().__init__(expression, length=int(length))
+
+
+def normalize_venue(name):
+    """Ключ места проведения: разные написания одного места («Парк
+    Горького», парк горького) дают один ключ. Регистр, кавычки, знаки
+    препинания и лишние пробелы не учитываются, «ё» равна «е»."""
+    name = name.casefold().replace('ё', 'е')
+    key = ' '.join(re.sub(r'[^\w\s]', ' ', name).split())
+    # Название из одних знаков препинания сравнивается как есть
+    return key or ' '.join(name.split())
+
+
+class VenueQuerySet(models.QuerySet):
+    def for_name(self, name):
+        """Место с названием ``name`` (в любом написании); новое
+        создаётся"""
+        venue, _ = self.get_or_create(
+            key=normalize_venue(name), defaults={'name': ' '.join(name.split())}
+        )
+        return venue
+
+    def for_names(self, names):
+        """Места для набора названий: словарь {ключ: Venue}. Недостающие
+        создаются одним запросом, всего запросов не больше трёх."""
+        wanted = {}
+        for name in names:
+            wanted.setdefault(normalize_venue(name), ' '.join(name.split()))
+        venues = self.in_bulk(list(wanted), field_name='key')
+        missing = [Venue(key=key, name=name) for key, name in wanted.items() if key not in venues]
+        if missing:
+            # Параллельная загрузка могла успеть создать те же места
+            self.bulk_create(missing, ignore_conflicts=True)
+            venues.update(self.in_bulk([venue.key for venue in missing], field_name='key'))
+        return venues
+
+    def assign(self, events):
+        """Проставляет место мероприятиям без него по тексту ``location``
+        (для bulk_create, который не вызывает save())"""
+        events = [event for event in events if event.venue_id is None and event.location]
+        venues = self.for_names(event.location for event in events)
+        for event in events:
+            event.venue = venues[normalize_venue(event.location)]
+            event.location = event.venue.name
+
+
+class Venue(models.Model):
+    """Место проведения. Мероприятия ссылаются на него, а в
+    ``Event.location`` хранится копия названия для вывода и поиска."""
+    name = models.CharField(
+        max_length=200,
+        verbose_name='Название'
+    )
+    
+    # Нормализованное название (normalize_venue): по нему ищутся дубли
+    key = models.CharField(
+        max_length=200,
+        unique=True,
+        editable=False,
+        verbose_name='Ключ'
+    )
+    
+    objects = VenueQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Место проведения'
+        verbose_name_plural = 'Места проведения'
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+    
+    def clean(self):
+        self.name = ' '.join(self.name.split())
+        self.key = normalize_venue(self.name)
+        if Venue.objects.filter(key=self.key).exclude(pk=self.pk).exists():
+            raise ValidationError({'name': 'Такое место уже есть.'})
+    
+    def save(self, *args, **kwargs):
+        self.key = normalize_venue(self.name)
+        super().save(*args, **kwargs)
+
+
+class EventQuerySet(models.QuerySet):
+    def active(self):
+        """Активные мероприятия.
+
+        filter(is_active=True) в SQLite превращается в WHERE "is_active" без
+        сравнения, и индекс (is_active, starts_at) тогда только сканируется.
+        Условие IN (1) оптимизатор считает равенством и ищет по индексу.
+        """
+        return self.filter(is_active__in=[True])
+
+    def upcoming(self, now=None):
+        """Активные мероприятия, которые ещё не начались.
+
+        Условие по дате следует из условия по starts_at, но даёт оптимизатору
+        диапазон и по индексу (is_active, date, time, id): список страницы
+        тогда читается сразу в нужном порядке, без сортировки всех строк.
+        """
+        now = now or timezone.now()
+        return self.active().filter(date__gte=timezone.localdate(now), starts_at__gt=now)
+
+    def past(self, now=None):
+        """Мероприятия, которые уже начались"""
+        return self.filter(starts_at__lte=now or timezone.now())
+
+    def with_teaser(self, length=TEASER_LENGTH):
+        """Анонс описания ``teaser`` (как short_description), посчитанный
+        в SQL: из базы приходят ``length`` символов, а не всё описание"""
+        return self.annotate(teaser=Teaser('description', length))
+
+    def with_started(self, now=None):
+        """Флаг ``has_started`` (как is_past()) одним сравнением в SQL
+        с общим для всех строк моментом ``now``"""
+        return self.annotate(has_started=ExpressionWrapper(
+            Q(starts_at__lte=now or timezone.now()), output_field=BooleanField()
+        ))
+
 
 class Event(models.Model):
     # 1. Название (обязательное)
@@ -28,6 +179,18 @@ class Event(models.Model):
         verbose_name='Место проведения'
     )
     
+    # Место из справочника; location хранит копию его названия
+    venue = models.ForeignKey(
+        Venue,
+        on_delete=models.PROTECT,
+        related_name='events',
+        verbose_name='Площадка',
+        blank=True,
+        null=True,
+        # Отдельный индекс не нужен: venue - первое поле event_venue_date_idx
+        db_index=False
+    )
+    
     # 5. Полное описание
     description = models.TextField(
         verbose_name='Описание мероприятия'
@@ -41,12 +204,85 @@ class Event(models.Model):
         null=True
     )
     
+    # Загруженная афиша: имя файла - хэш содержимого (см. images.py)
+    image = models.ImageField(
+        verbose_name='Изображение',
+        upload_to=images.ORIGINALS_DIR,
+        storage=images.image_storage,
+        blank=True
+    )
+    
+    # Ширины готовых уменьшенных копий image (заполняет фоновый пул)
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии',
+        default=list,
+        blank=True,
+        editable=False
+    )
+    
     # 7. Флаг «Активно»
     is_active = models.BooleanField(
         verbose_name='Активно',
         default=True
     )
     
+    # Повторение: правило хранится у первого мероприятия серии, а
+    # повторы на RECURRENCE_WINDOW_DAYS вперёд - обычными строками с
+    # series (events/recurrence.py)
+    recurrence = models.CharField(
+        verbose_name='Повторение',
+        max_length=10,
+        choices=RECURRENCE_CHOICES,
+        blank=True,
+        default=''
+    )
+    
+    recurrence_interval = models.PositiveSmallIntegerField(
+        verbose_name='Интервал повторения',
+        default=1
+    )
+    
+    recurrence_until = models.DateField(
+        verbose_name='Повторять до',
+        blank=True,
+        null=True
+    )
+    
+    # Даты удалённых повторов: при продлении окна они не создаются заново
+    recurrence_exclude = models.JSONField(
+        verbose_name='Исключённые даты',
+        default=list,
+        blank=True,
+        editable=False
+    )
+    
+    # До какой даты включительно повторы уже созданы строками
+    recurrence_materialized_until = models.DateField(
+        verbose_name='Повторы созданы до',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    
+    # Первое мероприятие серии, из которого создан этот повтор
+    series = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='occurrences',
+        verbose_name='Серия',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    
+    # Момент начала (дата + время) одним полем для индексируемых запросов.
+    # Мероприятие без времени идёт весь день и считается начавшимся
+    # с наступлением следующих суток.
+    starts_at = models.DateTimeField(
+        verbose_name='Начало',
+        editable=False
+    )
+    
     # Дополнительные поля
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -58,10 +294,24 @@ class Event(models.Model):
         verbose_name='Дата обновления'
     )
     
+    objects = EventQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Мероприятие'
         verbose_name_plural = 'Мероприятия'
         ordering = ['date', 'time']
+        indexes = [
+            models.Index(fields=['is_active', 'starts_at'], name='event_active_starts_idx'),
+            models.Index(fields=['date', 'time', 'id'], name='event_date_time_id_idx'),
+            # Список предстоящих: равенство по is_active и готовый порядок
+            # страницы, чтение останавливается на первых подходящих строках
+            models.Index(fields=['is_active', 'date', 'time', 'id'], name='event_active_date_time_idx'),
+            # Предстоящие мероприятия одного места в порядке списка
+            models.Index(fields=['venue', 'is_active', 'date', 'time', 'id'], name='event_venue_date_idx'),
+            # Частичный индекс: серий мало, и продление окна не читает
+            # остальные мероприятия
+            models.Index(fields=['recurrence'], condition=~Q(recurrence=''), name='event_recurrence_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} ({self.date})"
@@ -69,23 +319,129 @@ class Event(models.Model):
     @property
     def short_description(self):
         """Короткий анонс (первые 100 символов)"""
-        if len(self.description) > 100:
-            return self.description[:100] + '...'
+        if len(self.description) > TEASER_LENGTH:
+            return self.description[:TEASER_LENGTH] + '...'
         return self.description
     
+    @property
+    def image_sources(self):
+        """src и srcset загруженной афиши (None, если её нет)"""
+        if not self.image:
+            return None
+        return images.sources(self.image.name, self.image_variants)
+    
+    @staticmethod
+    def compute_starts_at(date, time):
+        """Момент начала мероприятия в текущем часовом поясе"""
+        if date is None:
+            return None
+        if time is None:
+            return timezone.make_aware(datetime.combine(date + timedelta(days=1), datetime.min.time()))
+        return timezone.make_aware(datetime.combine(date, time))
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Дата на момент загрузки: при переносе мероприятия на другой день
+        # пересчитываются счётчики обоих дней (events/day_counts.py)
+        instance._loaded_date = instance.__dict__.get('date')
+        # Было ли правило повторения: при его снятии удаляются повторы
+        instance._loaded_recurrence = instance.__dict__.get('recurrence')
+        return instance
+    
+    def clean(self):
+        if not self.recurrence:
+            return
+        if self.series_id is not None:
+            raise ValidationError({'recurrence': 'Повтор из серии не может сам повторяться.'})
+        if self.recurrence_interval < 1:
+            raise ValidationError({'recurrence_interval': 'Интервал должен быть не меньше 1.'})
+        if self.recurrence_until and self.date and self.recurrence_until < self.date:
+            raise ValidationError({'recurrence_until': 'Повторы не могут закончиться раньше первого мероприятия.'})
+    
     def is_past(self):
-        now = timezone.now()
-
-        if self.date < now.date():
-            return True
-
-        if self.date == now.date() and self.time and self.time <= now.time():
-            return True
-
-        return False
+        starts_at = self.compute_starts_at(self.date, self.time)
+        return starts_at is not None and starts_at <= timezone.now()
     
     def save(self, *args, **kwargs):
+        self.starts_at = self.compute_starts_at(self.date, self.time)
         if self.is_past():
             self.is_active = False
+        # Новый файл ещё не записан в хранилище: копии старого ему не подходят
+        if not self.image or not self.image._committed:
+            self.image_variants = []
+        # Место из справочника по введённому тексту; название выбранного
+        # места копируется в location (только если место уже загружено)
+        if self.venue_id is None and self.location:
+            self.venue = Venue.objects.for_name(self.location)
+        if self.venue_id is not None and Event.venue.is_cached(self):
+            self.location = self.venue.name
         self.full_clean()
         super().save(*args, **kwargs)
+
+
+class DailyEventCount(models.Model):
+    """Число мероприятий за день - готовые данные для календаря.
+
+    Пересчитывается по затронутым дням при каждом изменении мероприятий
+    (events/day_counts.py), поэтому календарь читает по строке на день и
+    не группирует всю таблицу Event. Дни без мероприятий не хранятся.
+    """
+    date = models.DateField(
+        primary_key=True,
+        verbose_name='Дата'
+    )
+    
+    active = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Активных'
+    )
+    
+    total = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Всего'
+    )
+    
+    class Meta:
+        verbose_name = 'Мероприятий за день'
+        verbose_name_plural = 'Мероприятий по дням'
+    
+    def __str__(self):
+        return f"{self.date}: {self.active} из {self.total}"
+
+
+CHANGE_ACTIONS = [
+    ('created', 'Создано'),
+    ('updated', 'Изменено'),
+    ('deleted', 'Удалено'),
+]
+
+
+class EventChange(models.Model):
+    """Запись журнала изменений мероприятий для синхронизации клиентов.
+
+    Журнал только дополняется (events/changes.py): клиент запоминает
+    курсор (время, id) последней прочитанной записи и забирает только
+    более новые. Запись об удалении остаётся после удаления мероприятия,
+    поэтому ссылка на него - просто число, а не внешний ключ.
+    """
+    event_id = models.IntegerField(
+        verbose_name='Мероприятие'
+    )
+    
+    action = models.CharField(
+        max_length=10,
+        choices=CHANGE_ACTIONS,
+        verbose_name='Действие'
+    )
+    
+    changed_at = models.DateTimeField(
+        verbose_name='Время изменения'
+    )
+    
+    class Meta:
+        verbose_name = 'Изменение мероприятия'
+        verbose_name_plural = 'Журнал изменений мероприятий'
+    
+    def __str__(self):
+        return f"{self.changed_at}: {self.get_action_display()} #{self.event_id}"
@@ -0,0 +1,225 @@
+"""Кэш готовых HTML-страниц афиши для анонимных посетителей.
+
+Страницы сбрасываются при любом изменении мероприятий (через номер
+поколения в ключе), а срок хранения не превышает времени до начала
+ближайшего мероприятия - поэтому в кэше не бывает уже начавшихся событий.
+Пока одна копия страницы строится, остальные запросы ждут её, а не
+повторяют те же запросы к базе. Декоратор работает и с асинхронными
+представлениями (events/async_views.py).
+"""
+import asyncio
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+
+from .expiry import anext_expiry, next_expiry
+
+
+# Максимальное время хранения страницы в секундах
+PAGE_CACHE_TIMEOUT = 300
+
+# Сколько держится блокировка построения страницы и сколько её ждут
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+GENERATION_KEY = 'events:pages:generation'
+NOT_FOUND = 'not-found'
+
+
+def invalidate_pages():
+    """Сбрасывает все закэшированные страницы"""
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+def drop_local_pages():
+    """Сбрасывает страницы, если кэш живёт в памяти процесса. Общий кэш
+    (Redis, Memcached) уже сброшен тем процессом, где изменили данные."""
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        invalidate_pages()
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not cache.add(GENERATION_KEY, generation, None):
+            generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+async def acache(method, *args):
+    """Вызов метода кэша из асинхронного кода.
+
+    Асинхронный API кэша в Django 4.2 выполняет каждый вызов в отдельном
+    потоке. Кэш в памяти процесса (LocMemCache) не блокирует цикл событий,
+    поэтому его методы вызываются напрямую.
+    """
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        return getattr(cache, method)(*args)
+    return await getattr(cache, f'a{method}')(*args)
+
+
+async def _ageneration():
+    generation = await acache('get', GENERATION_KEY)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not await acache('add', GENERATION_KEY, generation, None):
+            generation = await acache('get', GENERATION_KEY, generation)
+    return generation
+
+
+def timeout_until(moment, now=None):
+    """Время хранения до момента ``moment``, но не дольше PAGE_CACHE_TIMEOUT"""
+    if moment is None:
+        return PAGE_CACHE_TIMEOUT
+    now = now or timezone.now()
+    return max(0, min(PAGE_CACHE_TIMEOUT, int((moment - now).total_seconds())))
+
+
+def page_timeout(now=None):
+    """Время хранения: не дольше PAGE_CACHE_TIMEOUT и не позже начала
+    ближайшего мероприятия"""
+    now = now or timezone.now()
+    return timeout_until(next_expiry(now), now)
+
+
+async def apage_timeout(now=None):
+    now = now or timezone.now()
+    return timeout_until(await anext_expiry(now), now)
+
+
+def versioned_key(name):
+    """Ключ кэша, который сбрасывается вместе со страницами"""
+    return f'events:{_generation()}:{name}'
+
+
+async def aversioned_key(name):
+    return f'events:{await _ageneration()}:{name}'
+
+
+def _page_name(prefix, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{prefix}:{path}'
+
+
+def _cache_key(prefix, request):
+    return versioned_key(_page_name(prefix, request))
+
+
+async def auser_is_authenticated(request):
+    """``request.user.is_authenticated`` для асинхронного кода.
+
+    Пользователь загружается лениво из сессии в базе, а без cookie сессии
+    он заведомо анонимный - тогда база и отдельный поток не нужны.
+    """
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return False
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+def _build(view, request, args, kwargs, key):
+    started_at = timezone.now()
+    try:
+        response = view(request, *args, **kwargs)
+    except Http404:
+        # Отсутствие страницы тоже запоминается, чтобы такие запросы
+        # не ждали блокировку и не ходили в базу
+        cache.set(key, NOT_FOUND, page_timeout(started_at))
+        raise
+    if response.status_code == 200 and not response.streaming:
+        timeout = page_timeout(started_at)
+        if timeout > 0:
+            cache.set(key, (response.content, response['Content-Type']), timeout)
+    return response
+
+
+async def _abuild(view, request, args, kwargs, key):
+    started_at = timezone.now()
+    try:
+        response = await view(request, *args, **kwargs)
+    except Http404:
+        await acache('set', key, NOT_FOUND, await apage_timeout(started_at))
+        raise
+    if response.status_code == 200 and not response.streaming:
+        timeout = await apage_timeout(started_at)
+        if timeout > 0:
+            await acache('set', key, (response.content, response['Content-Type']), timeout)
+    return response
+
+
+def _cached_response(cached):
+    if cached == NOT_FOUND:
+        raise Http404
+    content, content_type = cached
+    return HttpResponse(content, content_type=content_type)
+
+
+def _async_cache_public_page(prefix, view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or await auser_is_authenticated(request):
+            return await view(request, *args, **kwargs)
+
+        key = await aversioned_key(_page_name(prefix, request))
+        cached = await acache('get', key)
+        if cached is None:
+            lock_key = f'{key}:lock'
+            if await acache('add', lock_key, 1, LOCK_TIMEOUT):
+                try:
+                    return await _abuild(view, request, args, kwargs, key)
+                finally:
+                    await acache('delete', lock_key)
+
+            # Ожидание не занимает поток: цикл событий обслуживает другие запросы
+            deadline = time.monotonic() + LOCK_WAIT
+            while cached is None and time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                cached = await acache('get', key)
+            if cached is None:
+                return await view(request, *args, **kwargs)
+
+        return _cached_response(cached)
+    return wrapper
+
+
+def cache_public_page(prefix):
+    """Декоратор: кэширует ответ представления для анонимных GET-запросов"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _async_cache_public_page(prefix, view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            key = _cache_key(prefix, request)
+            cached = cache.get(key)
+            if cached is None:
+                lock_key = f'{key}:lock'
+                if cache.add(lock_key, 1, LOCK_TIMEOUT):
+                    try:
+                        return _build(view, request, args, kwargs, key)
+                    finally:
+                        cache.delete(lock_key)
+
+                # Страницу уже строит другой запрос - ждём результат
+                deadline = time.monotonic() + LOCK_WAIT
+                while cached is None and time.monotonic() < deadline:
+                    time.sleep(LOCK_POLL_INTERVAL)
+                    cached = cache.get(key)
+                if cached is None:
+                    return view(request, *args, **kwargs)
+
+            return _cached_response(cached)
+        return wrapper
+    return decorator
@@ -0,0 +1,152 @@
+"""Постраничный вывод по ключу (keyset pagination).
+
+Вместо OFFSET запрос продолжается с ключа последней показанной строки,
+поэтому время ответа не зависит от номера страницы и размера таблицы.
+Курсор кодирует направление и значения полей сортировки этой строки.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+
+class KeysetPage:
+    """Страница результатов с курсорами на соседние страницы"""
+
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Пагинатор по набору полей сортировки.
+
+    ``ordering`` - последовательность полей в формате ``order_by``
+    (``'-date'`` - по убыванию). Последним полем должен быть уникальный
+    ключ, обычно ``id``. NULL считается меньше любого значения.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        self.model_fields = {
+            name: queryset.model._meta.get_field(name) for name, _ in self.fields
+        }
+
+    def page(self, cursor=None):
+        """Возвращает страницу, на которую указывает курсор"""
+        queryset, key, backwards = self._page_query(cursor)
+        return self._make_page(list(queryset), key, backwards)
+
+    async def apage(self, cursor=None):
+        """То же, что ``page()``, для асинхронных представлений"""
+        queryset, key, backwards = self._page_query(cursor)
+        return self._make_page([obj async for obj in queryset], key, backwards)
+
+    def _page_query(self, cursor):
+        direction, key = self.decode_cursor(cursor)
+        backwards = direction == 'p'
+
+        queryset = self.queryset.order_by(*self._order_by(reverse=backwards))
+        if key is not None:
+            queryset = queryset.filter(self._after(key, reverse=backwards))
+        return queryset[:self.per_page + 1], key, backwards
+
+    def _make_page(self, rows, key, backwards):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = key is not None, has_more
+        else:
+            has_next, has_previous = has_more, key is not None
+
+        if not rows:
+            return KeysetPage(rows)
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor('n', rows[-1]) if has_next else None,
+            prev_cursor=self.encode_cursor('p', rows[0]) if has_previous else None,
+        )
+
+    def encode_cursor(self, direction, obj):
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        data = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Разбирает курсор; некорректный курсор означает первую страницу"""
+        if not cursor:
+            return 'n', None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in ('n', 'p') or len(values) != len(self.fields):
+                raise ValueError
+            key = [
+                None if value is None else self.model_fields[name].to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            return 'n', None
+        return direction, key
+
+    def _order_by(self, reverse=False):
+        order_by = []
+        for name, descending in self.fields:
+            if descending != reverse:
+                order_by.append(F(name).desc(nulls_last=True))
+            else:
+                order_by.append(F(name).asc(nulls_first=True))
+        return order_by
+
+    def _after(self, key, reverse=False):
+        """Условие «строка идёт после ключа» в выбранном порядке"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, key):
+            greater = self._greater(name, value, descending != reverse)
+            if greater is not None:
+                condition |= equal & greater
+            if value is None:
+                equal &= Q(**{f'{name}__isnull': True})
+            else:
+                equal &= Q(**{name: value})
+        return condition
+
+    def _greater(self, name, value, descending):
+        nullable = self.model_fields[name].null
+        if not descending:
+            if value is None:
+                return Q(**{f'{name}__isnull': False})
+            return Q(**{f'{name}__gt': value})
+        if value is None:
+            # В порядке убывания NULL идут последними
+            return None
+        greater = Q(**{f'{name}__lt': value})
+        if nullable:
+            greater |= Q(**{f'{name}__isnull': True})
+        return greater
@@ -0,0 +1,205 @@
+"""Статические копии публичных страниц для раздачи без Python.
+
+Команда ``prerender_site`` записывает в ``settings.PRERENDER_ROOT``
+главную страницу (``index.html``) и страницу каждого предстоящего
+мероприятия (``event/<id>/index.html``) вместе со сжатыми копиями
+``.gz``. Раскладка файлов повторяет адреса сайта, поэтому nginx или
+whitenoise отдают их напрямую, а Django получает только запросы, для
+которых файла нет.
+
+Повторный запуск перерисовывает только мероприятия, у которых изменился
+``updated_at``, и удаляет страницы начавшихся, снятых и удалённых
+мероприятий. Что уже записано, хранится в ``manifest.json``.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections, transaction
+from django.http import Http404, HttpRequest
+
+from .models import Event
+
+try:
+    import fcntl
+except ImportError:  # Windows: запуски согласуются только внутри процесса
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+class PrerenderResult:
+    def __init__(self):
+        self.rendered = 0
+        self.removed = 0
+        self.list_changed = False
+
+
+def _root():
+    return Path(settings.PRERENDER_ROOT)
+
+
+def _request(path):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META = {
+        'SERVER_NAME': settings.PRERENDER_HOST,
+        'SERVER_PORT': '80',
+        'HTTP_HOST': settings.PRERENDER_HOST,
+    }
+    request.user = AnonymousUser()
+    return request
+
+
+def _write(path, content):
+    """Атомарно записывает страницу и её сжатую копию"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for target, data in ((path, content), (path.with_name(path.name + '.gz'), gzip.compress(content, 9, mtime=0))):
+        temporary = target.with_name(target.name + '.tmp')
+        temporary.write_bytes(data)
+        os.replace(temporary, target)
+
+
+def _load_manifest(root):
+    try:
+        manifest = json.loads((root / MANIFEST_NAME).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _save_manifest(root, manifest):
+    temporary = root / (MANIFEST_NAME + '.tmp')
+    temporary.write_text(json.dumps(manifest, sort_keys=True), encoding='utf-8')
+    os.replace(temporary, root / MANIFEST_NAME)
+
+
+_process_lock = threading.Lock()
+
+
+@contextmanager
+def _locked(root):
+    """Один запуск за раз: и между потоками, и между процессами"""
+    with _process_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(root / '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def render_list():
+    # Представления импортируются здесь: views зависят от кэша страниц,
+    # а этот модуль подключается из receivers
+    from .views import event_list
+    return event_list(_request('/')).content
+
+
+def render_detail(event_id):
+    from .views import event_detail
+    return event_detail(_request(f'/event/{event_id}/'), event_id=event_id).content
+
+
+def prerender_site(force=False):
+    """Обновляет статические страницы; возвращает PrerenderResult"""
+    root = _root()
+    root.mkdir(parents=True, exist_ok=True)
+    result = PrerenderResult()
+
+    with _locked(root):
+        manifest = None if force else _load_manifest(root)
+        if manifest is None:
+            manifest = {'version': MANIFEST_VERSION, 'events': {}, 'list': None}
+        rendered = manifest['events']
+
+        current = {
+            str(event_id): updated_at.isoformat()
+            for event_id, updated_at in Event.objects.upcoming().values_list('id', 'updated_at')
+        }
+
+        for event_id, stamp in current.items():
+            if rendered.get(event_id) == stamp:
+                continue
+            try:
+                content = render_detail(int(event_id))
+            except Http404:
+                # Мероприятие началось или снято между запросами
+                continue
+            _write(root / 'event' / event_id / 'index.html', content)
+            rendered[event_id] = stamp
+            result.rendered += 1
+
+        for event_id in set(rendered) - set(current):
+            shutil.rmtree(root / 'event' / event_id, ignore_errors=True)
+            del rendered[event_id]
+            result.removed += 1
+
+        # Главная страница меняется и без правок (начавшиеся мероприятия
+        # уходят из списка), поэтому рисуется всегда, а записывается,
+        # только если изменилась
+        content = render_list()
+        digest = hashlib.sha256(content).hexdigest()
+        if digest != manifest['list'] or not (root / 'index.html').exists():
+            _write(root / 'index.html', content)
+            manifest['list'] = digest
+            result.list_changed = True
+
+        _save_manifest(root, manifest)
+    return result
+
+
+_state_lock = threading.Lock()
+_pending = False
+_worker = None
+
+
+def schedule_prerender(using='default'):
+    """Запускает обновление страниц в фоновом потоке после фиксации
+    транзакции. Изменения, пришедшие во время работы, собираются в
+    один следующий запуск."""
+    transaction.on_commit(_start_worker, using=using)
+
+
+def _start_worker():
+    global _pending, _worker
+    with _state_lock:
+        _pending = True
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name='prerender-site')
+            _worker.start()
+
+
+def _work():
+    global _pending, _worker
+    try:
+        while True:
+            with _state_lock:
+                if not _pending:
+                    _worker = None
+                    return
+                _pending = False
+            try:
+                prerender_site()
+            except Exception:
+                logger.exception('Не удалось обновить статические страницы')
+    finally:
+        connections.close_all()
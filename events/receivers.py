@@ -0,0 +1,138 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import changes, day_counts, db, images, invalidation, metrics, page_cache, prerender, recurrence, search
+from .models import Event, Venue
+from .signals import events_changed, events_invalidated
+
+
+@receiver(post_save, sender=Event)
+def index_saved_event(sender, instance, using, **kwargs):
+    """Обновляет поисковый индекс после сохранения мероприятия"""
+    search.index_events([instance], using)
+
+
+@receiver(post_delete, sender=Event)
+def unindex_deleted_event(sender, instance, using, **kwargs):
+    """Удаляет мероприятие из поискового индекса"""
+    search.remove_events([instance.id], using)
+
+
+@receiver(post_save, sender=Event)
+def count_saved_event(sender, instance, using, **kwargs):
+    """Пересчитывает календарь для дня мероприятия (и прежнего дня,
+    если мероприятие перенесли)"""
+    day_counts.mark_days({instance.date, getattr(instance, '_loaded_date', None)}, using)
+    instance._loaded_date = instance.date
+
+
+@receiver(post_delete, sender=Event)
+def count_deleted_event(sender, instance, using, **kwargs):
+    day_counts.mark_days([instance.date], using)
+
+
+@receiver(events_changed, sender=Event)
+def count_changed_events(sender, event_ids, using='default', action='updated', **kwargs):
+    """Массовые операции: дни берутся по id изменённых мероприятий.
+    Удалённых строк уже нет - их дни отмечает сам удаляющий код."""
+    if action != 'deleted':
+        day_counts.mark_events(event_ids, using)
+
+
+@receiver(post_save, sender=Event)
+def log_saved_event(sender, instance, created, using, **kwargs):
+    """Записывает создание или правку мероприятия в журнал изменений"""
+    changes.record([instance.id], 'created' if created else 'updated', using)
+
+
+@receiver(post_delete, sender=Event)
+def log_deleted_event(sender, instance, using, **kwargs):
+    """Запись об удалении остаётся в журнале после самого мероприятия"""
+    changes.record([instance.id], 'deleted', using)
+
+
+@receiver(events_changed, sender=Event)
+def log_changed_events(sender, event_ids, using='default', action='updated', **kwargs):
+    """Массовые операции: новые строки из bulk_create - как созданные"""
+    changes.record(event_ids, action, using)
+
+
+@receiver(post_save, sender=Event)
+def materialize_series(sender, instance, **kwargs):
+    """Создаёт и обновляет повторы после сохранения первого мероприятия
+    серии (и удаляет их, если правило повторения сняли)"""
+    if instance.series_id is None and (instance.recurrence or getattr(instance, '_loaded_recurrence', '')):
+        recurrence.materialize(instance, sync=True)
+    instance._loaded_recurrence = instance.recurrence
+
+
+@receiver(post_delete, sender=Event)
+def exclude_deleted_occurrence(sender, instance, using, **kwargs):
+    """Удалённый администратором повтор не создаётся снова"""
+    if instance.series_id is not None and not recurrence.is_syncing():
+        recurrence.mark_excluded(instance.series_id, instance.date, using)
+
+
+@receiver(post_save, sender=Venue)
+def rename_venue_events(sender, instance, created, using, **kwargs):
+    """Переносит новое название места в location его мероприятий"""
+    if created:
+        return
+    renamed = Event.objects.using(using).filter(venue=instance).exclude(location=instance.name)
+    ids = list(renamed.values_list('id', flat=True))
+    if not ids:
+        return
+    renamed.update(location=instance.name, updated_at=timezone.now())
+    search.index_events(Event.objects.using(using).filter(id__in=ids).only('id', 'title', 'location', 'description'), using)
+    events_changed.send(sender=Event, event_ids=ids, using=using)
+
+
+@receiver(post_save, sender=Event)
+def schedule_image_variants(sender, instance, using, **kwargs):
+    """Заказывает уменьшенные копии новой афиши"""
+    if instance.image and not instance.image_variants:
+        images.schedule_variants(instance.id, instance.image.name, using)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(events_changed, sender=Event)
+def invalidate_page_cache(sender, **kwargs):
+    """Сбрасывает кэш страниц афиши при любом изменении мероприятий"""
+    page_cache.invalidate_pages()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(events_changed, sender=Event)
+def notify_workers(sender, using='default', **kwargs):
+    """Сообщает остальным воркерам, что их кэши устарели"""
+    invalidation.publish(using)
+
+
+@receiver(events_invalidated)
+def drop_worker_caches(sender, **kwargs):
+    """Другой процесс изменил мероприятия: сбрасывает кэш страниц этого"""
+    page_cache.drop_local_pages()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(events_changed, sender=Event)
+def update_prerendered_pages(sender, using='default', **kwargs):
+    """Обновляет статические копии страниц (если включено PRERENDER_ON_SAVE)"""
+    if settings.PRERENDER_ON_SAVE:
+        prerender.schedule_prerender(using)
+
+
+@receiver(connection_created)
+def configure_database_connection(sender, connection, **kwargs):
+    """Включает WAL и остальные параметры SQLite для нового соединения
+    и подключает замер SQL-запросов для метрик"""
+    db.configure_connection(connection)
+    # Объект соединения переживает переподключения - обёртка ставится один раз
+    if metrics.execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.execute_wrapper)
@@ -0,0 +1,249 @@
+"""Повторяющиеся мероприятия.
+
+Правило повторения (каждый день, неделю или месяц с интервалом и
+необязательной датой окончания) хранится у первого мероприятия серии.
+Даты повторов считает генератор ``expand`` только для запрошенного
+промежутка. На ``settings.RECURRENCE_WINDOW_DAYS`` дней вперёд повторы
+созданы обычными строками Event со ссылкой ``series``: афиша, поиск,
+календарь, API и лента iCalendar читают их по тем же индексам, что и
+остальные мероприятия. Окно продлевает планировщик (``expire_events``),
+он же удаляет прошедшие повторы, поэтому число строк серии не растёт.
+Календарь за пределами окна досчитывает повторы через ``expand``.
+
+Правка первого мероприятия переносится во все будущие повторы. Скрытые
+повторы остаются скрытыми, а удалённые не создаются заново.
+"""
+import calendar
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import search
+from .models import Event
+from .signals import events_changed
+
+
+# Поля, которые повтор берёт у первого мероприятия серии
+COPIED_FIELDS = ('title', 'time', 'location', 'venue_id', 'description', 'image', 'image_url', 'image_variants')
+
+# Поля правила: их достаточно, чтобы посчитать даты повторов
+RULE_FIELDS = (
+    'id', 'date', 'recurrence', 'recurrence_interval', 'recurrence_until',
+    'recurrence_exclude', 'recurrence_materialized_until',
+)
+
+_local = threading.local()
+
+
+@contextmanager
+def syncing():
+    """Удаления внутри блока делает сама серия, а не администратор:
+    их даты не попадают в исключения"""
+    previous = getattr(_local, 'active', False)
+    _local.active = True
+    try:
+        yield
+    finally:
+        _local.active = previous
+
+
+def is_syncing():
+    return getattr(_local, 'active', False)
+
+
+def window_end(today=None):
+    """Последний день окна созданных повторов"""
+    return (today or timezone.localdate()) + timedelta(days=settings.RECURRENCE_WINDOW_DAYS)
+
+
+def _months_later(first, months):
+    year, month = divmod(first.month - 1 + months, 12)
+    return first.year + year, month + 1
+
+
+def expand(event, start, end):
+    """Даты повторов серии ``event`` с ``start`` по ``end`` включительно,
+    без даты самого первого мероприятия. Даты считаются по одной по мере
+    чтения, с первого повтора внутри промежутка."""
+    if not event.recurrence:
+        return
+    first = event.date
+    if event.recurrence_until is not None:
+        end = min(end, event.recurrence_until)
+    start = max(start, first + timedelta(days=1))
+    if start > end:
+        return
+    interval = event.recurrence_interval
+    excluded = set(event.recurrence_exclude)
+
+    if event.recurrence == 'monthly':
+        # Месяцы без такого числа (31-е, 29 февраля) пропускаются, как в RFC 5545
+        months = (start.year - first.year) * 12 + start.month - first.month
+        number = months // interval
+        while True:
+            year, month = _months_later(first, number * interval)
+            if date(year, month, 1) > end:
+                return
+            number += 1
+            if first.day > calendar.monthrange(year, month)[1]:
+                continue
+            day = date(year, month, first.day)
+            if start <= day <= end and day.isoformat() not in excluded:
+                yield day
+        return
+
+    step = interval * (7 if event.recurrence == 'weekly' else 1)
+    number = -(-(start - first).days // step)
+    day = first + timedelta(days=number * step)
+    while day <= end:
+        if day.isoformat() not in excluded:
+            yield day
+        day += timedelta(days=step)
+
+
+def _copied_values(master):
+    values = {field: getattr(master, field) for field in COPIED_FIELDS}
+    # Имя файла, а не FieldFile: иначе файл «переедет» к повтору
+    values['image'] = master.image.name
+    values['image_variants'] = list(master.image_variants)
+    return values
+
+
+def _occurrence(master, day, values, now):
+    starts_at = Event.compute_starts_at(day, values['time'])
+    return Event(series=master, date=day, starts_at=starts_at, is_active=starts_at > now, **values)
+
+
+def materialize(master, today=None, sync=False):
+    """Создаёт строки повторов серии до конца окна.
+
+    Обычно создаются только дни после уже созданных. ``sync=True`` (после
+    правки первого мероприятия) пересчитывает всё окно: переносит
+    изменения в будущие повторы, удаляет повторы, которых больше нет в
+    правиле, и создаёт недостающие. Возвращает число созданных повторов.
+    """
+    today = today or timezone.localdate()
+    now = timezone.now()
+    end = window_end(today)
+    values = _copied_values(master)
+    upcoming = Event.objects.filter(series=master, date__gte=today)
+
+    if sync:
+        wanted = set(expand(master, today, end))
+    else:
+        start = today
+        if master.recurrence_materialized_until is not None:
+            start = max(start, master.recurrence_materialized_until + timedelta(days=1))
+        wanted = set(expand(master, start, end))
+
+    updated = []
+    with transaction.atomic(), syncing():
+        if sync:
+            upcoming.exclude(date__in=wanted).delete()
+            rows = list(upcoming.filter(date__in=wanted))
+            for row in rows:
+                for field, value in values.items():
+                    setattr(row, field, value)
+                row.starts_at = Event.compute_starts_at(row.date, row.time)
+                # Скрытый вручную повтор остаётся скрытым
+                row.is_active = row.is_active and row.starts_at > now
+                row.updated_at = now
+            Event.objects.bulk_update(rows, [*values, 'starts_at', 'is_active', 'updated_at'])
+            search.index_events(rows)
+            updated = rows
+            wanted -= {row.date for row in rows}
+
+        created = Event.objects.bulk_create(
+            [_occurrence(master, day, values, now) for day in sorted(wanted)]
+        )
+        search.index_events(created)
+
+        master.recurrence_materialized_until = end if master.recurrence else None
+        Event.objects.filter(id=master.id).update(
+            recurrence_materialized_until=master.recurrence_materialized_until
+        )
+
+    if updated:
+        events_changed.send(sender=Event, event_ids=[event.id for event in updated], using='default')
+    if created:
+        events_changed.send(
+            sender=Event, event_ids=[event.id for event in created], using='default', action='created'
+        )
+    return len(created)
+
+
+def roll_window(today=None):
+    """Продлевает окно всех серий и удаляет прошедшие повторы.
+    Возвращает пару (создано, удалено)."""
+    today = today or timezone.localdate()
+    end = window_end(today)
+    with syncing():
+        _, deleted = Event.objects.filter(series__isnull=False, date__lt=today).delete()
+
+    created = 0
+    masters = Event.objects.exclude(recurrence='').filter(
+        Q(recurrence_materialized_until__isnull=True) | Q(recurrence_materialized_until__lt=end)
+    )
+    for master in masters:
+        created += materialize(master, today)
+    return created, deleted.get(Event._meta.label, 0)
+
+
+def exclude_date(series_id, day):
+    """Запоминает дату удалённого повтора, чтобы не создавать его снова"""
+    exclude_dates({series_id: {day}})
+
+
+def exclude_dates(days_by_series):
+    """Запоминает даты удалённых повторов нескольких серий: одно чтение
+    и одна запись на серию. Удалённые серии пропускаются."""
+    masters = Event.objects.filter(id__in=days_by_series).only('id', 'recurrence_exclude')
+    for master in masters:
+        excluded = {*master.recurrence_exclude, *(day.isoformat() for day in days_by_series[master.id])}
+        master.recurrence_exclude = sorted(excluded)
+    Event.objects.bulk_update(masters, ['recurrence_exclude'])
+
+
+def mark_excluded(series_id, day, using='default'):
+    """Откладывает исключение даты до фиксации транзакции: массовое
+    удаление пишет одно исключение на серию, а если вместе с повторами
+    удалили и саму серию, исключать нечего"""
+    pending = getattr(_local, 'excluded', None)
+    if pending is None:
+        pending = _local.excluded = {}
+    pending.setdefault(series_id, set()).add(day)
+    # Как в day_counts.mark_days: после отката колбэк пропадает, а даты
+    # уйдут со следующим
+    transaction.on_commit(_flush_excluded, using=using)
+
+
+def _flush_excluded():
+    pending = getattr(_local, 'excluded', None)
+    _local.excluded = None
+    if pending:
+        exclude_dates(pending)
+
+
+def count_beyond_window(start, end):
+    """Число повторов по датам с ``start`` по ``end``, которые ещё не
+    созданы строками (за пределами окна каждой серии)"""
+    counts = Counter()
+    # is_active первого мероприятия не проверяется: оно снимается с
+    # публикации, когда начинается, а повторы серии остаются в календаре
+    masters = (
+        Event.objects.exclude(recurrence='')
+        .filter(Q(recurrence_until__isnull=True) | Q(recurrence_until__gte=start))
+        .only(*RULE_FIELDS)
+    )
+    for master in masters:
+        lazy_start = start
+        if master.recurrence_materialized_until is not None:
+            lazy_start = max(start, master.recurrence_materialized_until + timedelta(days=1))
+        counts.update(expand(master, lazy_start, end))
+    return counts
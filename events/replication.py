@@ -0,0 +1,68 @@
+"""Копирование основной базы SQLite в реплику для чтения.
+
+Копия делается через backup API SQLite: это согласованный снимок, а
+в режиме WAL копирование не мешает ни записи в основную базу, ни
+чтению реплики. Для локальной проверки маршрутизации этого достаточно;
+в рабочей среде реплику обычно ведёт сама СУБД (например, потоковая
+репликация PostgreSQL), и команда не нужна.
+"""
+import sqlite3
+import time
+
+from django.db import connections
+
+from . import invalidation, page_cache
+from .routers import PRIMARY_ALIAS, REPLICA_ALIAS
+
+
+# Как часто проверять изменения основной базы, секунды
+INTERVAL = 2.0
+
+
+def _database_path(alias):
+    return str(connections[alias].settings_dict['NAME'])
+
+
+def copy_database(source=None):
+    """Копирует основную базу в реплику; ``source`` - открытое соединение
+    с основной базой (если нет, открывается новое)"""
+    own_source = source is None
+    if own_source:
+        source = sqlite3.connect(_database_path(PRIMARY_ALIAS))
+    # Соединения Django с репликой закрываются, чтобы следующие запросы
+    # увидели новую копию целиком
+    connections[REPLICA_ALIAS].close()
+    target = sqlite3.connect(_database_path(REPLICA_ALIAS), timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        if own_source:
+            source.close()
+    # Страницы и состояние афиши могли закэшироваться по данным старой
+    # копии - и в этом процессе, и в воркерах сайта: общий номер
+    # поколения заставляет каждый воркер сбросить свои кэши
+    page_cache.invalidate_pages()
+    invalidation.publish()
+
+
+def run_replication(interval=INTERVAL, should_stop=lambda: False, log=None):
+    """Копирует базу каждый раз, когда в ней что-то изменилось.
+
+    PRAGMA data_version меняется, когда изменения фиксирует другое
+    соединение, поэтому без записей в основную базу копирования нет.
+    """
+    source = sqlite3.connect(_database_path(PRIMARY_ALIAS))
+    last_version = None
+    try:
+        while not should_stop():
+            version = source.execute('PRAGMA data_version').fetchone()[0]
+            if version != last_version:
+                started = time.monotonic()
+                copy_database(source)
+                last_version = version
+                if log:
+                    log(f'Реплика обновлена за {time.monotonic() - started:.2f} с')
+            time.sleep(interval)
+    finally:
+        source.close()
@@ -0,0 +1,78 @@
+"""Маршрутизация запросов к базе: чтение с реплики, запись в основную.
+
+Реплика используется только при обработке веб-запросов (состояние
+задаёт ``ReplicaPinMiddleware``) и только для моделей приложения events -
+пользователи и сессии всегда читаются из основной базы, иначе вход на
+сайт зависел бы от задержки репликации. Команды управления работают с
+основной базой.
+
+С реплики читают только безопасные (GET/HEAD/OPTIONS) запросы без
+сессии, то есть анонимные посетители публичных страниц: админка и
+формы целиком работают с основной базой. После записи запрос и
+следующие ``REPLICA_PIN_SECONDS`` секунд запросов того же браузера тоже
+читают из основной базы.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+REPLICA_ALIAS = 'replica'
+PRIMARY_ALIAS = 'default'
+
+
+class RoutingState:
+    """Состояние маршрутизации одного веб-запроса"""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+    @property
+    def use_primary(self):
+        return self.pinned or self.wrote
+
+
+_state = ContextVar('events_routing_state', default=None)
+
+
+def start_request(pinned=False):
+    """Начинает веб-запрос; возвращает токен для ``end_request``"""
+    state = RoutingState(pinned)
+    return state, _state.set(state)
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.use_primary or model._meta.app_label != 'events':
+            return None
+        if not replica_configured():
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY_ALIAS, REPLICA_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплика - копия основной базы, её схему создаёт replicate_db
+        if db == REPLICA_ALIAS:
+            return False
+        return None
@@ -0,0 +1,123 @@
+"""Полнотекстовый поиск мероприятий на SQLite FTS5.
+
+Индекс ``events_event_fts`` хранит название, место и описание; rowid
+совпадает с id мероприятия. Индекс обновляется сигналами при сохранении
+и удалении Event, а массовые операции вызывают ``index_events`` сами.
+На других СУБД (или без FTS5) поиск работает через ``icontains``.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Case, Q, When
+
+from .models import Event
+
+
+FTS_TABLE = 'events_event_fts'
+
+# Сколько лучших совпадений возвращает поиск
+SEARCH_LIMIT = 200
+
+# Веса столбцов для bm25: название важнее места, место важнее описания
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Базы, в которых индекс уже найден
+_available = set()
+
+
+def is_available(using='default'):
+    """Есть ли FTS-индекс в базе ``using``"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    if using not in _available:
+        if FTS_TABLE not in connection.introspection.table_names():
+            return False
+        _available.add(using)
+    return True
+
+
+def build_match_query(text):
+    """Превращает пользовательский ввод в запрос FTS5.
+
+    Каждое слово ищется как префикс, все слова обязательны. Кавычки
+    защищают от синтаксиса FTS5 во вводе пользователя.
+    """
+    words = re.findall(r'\w+', text or '')
+    if not words:
+        return None
+    return ' AND '.join(f'"{word}"*' for word in words)
+
+
+def search_events(queryset, text, limit=SEARCH_LIMIT, offset=0):
+    """Мероприятия из ``queryset``, подходящие под запрос, по убыванию
+    релевантности: ``limit`` совпадений, начиная с ``offset``-го"""
+    match = build_match_query(text)
+    if match is None:
+        return queryset.none()
+
+    if not is_available(queryset.db):
+        return queryset.filter(
+            Q(title__icontains=text) | Q(location__icontains=text) | Q(description__icontains=text)
+        )[offset:offset + limit]
+
+    subquery, params = queryset.order_by().values('id').query.sql_with_params()
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    # Унарный плюс не даёт передать условие на rowid в FTS5: иначе индекс
+    # заново выполняет MATCH для каждого id из подзапроса
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND +rowid IN ({subquery}) '
+            f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s',
+            (match, *params, limit, offset),
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+    if not ids:
+        return queryset.none()
+    ranking = Case(*[When(id=event_id, then=position) for position, event_id in enumerate(ids)])
+    return queryset.filter(id__in=ids).order_by(ranking)
+
+
+def index_events(events, using='default'):
+    """Добавляет или обновляет мероприятия в индексе"""
+    if not is_available(using):
+        return
+    rows = [(event.id, event.title, event.location, event.description) for event in events]
+    if not rows:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, location, description) VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def remove_events(ids, using='default'):
+    """Удаляет мероприятия из индекса"""
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(event_id,) for event_id in ids])
+
+
+def rebuild_index(using='default', batch_size=1000):
+    """Перестраивает индекс целиком; возвращает число проиндексированных мероприятий"""
+    if not is_available(using):
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    count = 0
+    batch = []
+    events = Event.objects.using(using).only('id', 'title', 'location', 'description')
+    for event in events.iterator(chunk_size=batch_size):
+        batch.append(event)
+        if len(batch) >= batch_size:
+            index_events(batch, using)
+            count += len(batch)
+            batch = []
+    index_events(batch, using)
+    return count + len(batch)
@@ -0,0 +1,13 @@
+from django.dispatch import Signal
+
+
+# Отправляется массовыми операциями (queryset.update, bulk_create, удаление
+# одним запросом), которые не вызывают post_save/post_delete. Аргументы:
+# event_ids, using и action - 'created' для новых строк из bulk_create,
+# 'deleted' для удалённых, по умолчанию 'updated'.
+events_changed = Signal()
+
+# Отправляется в каждом процессе, который узнал об изменении мероприятий
+# из общего номера поколения (events/invalidation.py). Получатели
+# сбрасывают кэши в памяти процесса. Аргумент: generation.
+events_invalidated = Signal()
@@ -0,0 +1,129 @@
+"""Статика сайта: имена с хэшем содержимого, сжатые копии и раздача.
+
+``collectstatic`` складывает файлы в ``STATIC_ROOT`` под именами вида
+``base.3f2a9c1e.css`` и рядом пишет ``.gz``-копии текстовых файлов.
+Содержимое файла с хэшем в имени никогда не меняется, поэтому
+``StaticFilesMiddleware`` отдаёт его с ``Cache-Control: immutable`` на
+год, и повторные визиты не запрашивают CSS и JS вовсе. nginx может
+раздавать тот же каталог сам (``gzip_static on``).
+"""
+import gzip
+import mimetypes
+import posixpath
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import HttpResponse, HttpResponseNotFound
+from django.utils._os import safe_join
+
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Файлы без хэша в имени (до collectstatic или по прямой ссылке)
+REVALIDATE = 'public, max-age=60'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, который дополнительно сжимает
+    собранные файлы"""
+
+    def stored_name(self, name):
+        # Пока collectstatic не запускался, страницы ссылаются на файлы
+        # без хэша - их отдаёт StaticFilesMiddleware прямо из приложений
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        path = Path(self.path(name))
+        content = path.read_bytes()
+        compressed = gzip.compress(content, 9, mtime=0)
+        # Сжатие почти без выигрыша только тратит время клиента
+        if len(compressed) < len(content) * 0.95:
+            path.with_name(path.name + '.gz').write_bytes(compressed)
+
+
+@lru_cache(maxsize=None)
+def _immutable_names():
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+class Asset:
+    def __init__(self, path, immutable):
+        self.path = path
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        gzipped = path.with_name(path.name + '.gz')
+        self.gzipped = gzipped if gzipped.is_file() else None
+        self.cached = {}
+
+    def read(self, compressed):
+        if compressed in self.cached:
+            return self.cached[compressed]
+        content = (self.gzipped if compressed else self.path).read_bytes()
+        # Содержимое файла с хэшем в имени не меняется - его можно
+        # держать в памяти
+        if self.immutable:
+            self.cached[compressed] = content
+        return content
+
+
+@lru_cache(maxsize=1024)
+def _find_immutable(name):
+    path = Path(safe_join(settings.STATIC_ROOT, name))
+    return Asset(path, immutable=True) if path.is_file() else None
+
+
+def find(name):
+    """Файл статики по имени из адреса (None, если его нет)"""
+    name = posixpath.normpath(unquote(name)).lstrip('/')
+    if name.startswith('..'):
+        return None
+    if settings.STATIC_ROOT and name in _immutable_names():
+        return _find_immutable(name)
+    if settings.STATIC_ROOT:
+        try:
+            path = Path(safe_join(settings.STATIC_ROOT, name))
+        except SuspiciousFileOperation:
+            return None
+        if path.is_file():
+            return Asset(path, immutable=False)
+    found = finders.find(name)
+    if found and Path(found).is_file():
+        return Asset(Path(found), immutable=False)
+    return None
+
+
+def serve(request):
+    """Ответ на запрос статики или None, если адрес не из STATIC_URL"""
+    if not request.path.startswith(settings.STATIC_URL) or request.method not in ('GET', 'HEAD'):
+        return None
+    asset = find(request.path[len(settings.STATIC_URL):])
+    if asset is None:
+        return HttpResponseNotFound()
+
+    compressed = asset.gzipped is not None and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    content = asset.read(compressed)
+
+    response = HttpResponse(b'' if request.method == 'HEAD' else content, content_type=asset.content_type)
+    response['Content-Length'] = len(content)
+    response['Cache-Control'] = IMMUTABLE if asset.immutable else REVALIDATE
+    if asset.gzipped is not None:
+        response['Vary'] = 'Accept-Encoding'
+    if compressed:
+        response['Content-Encoding'] = 'gzip'
+    return response
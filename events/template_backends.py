@@ -0,0 +1,30 @@
+"""Бэкенд шаблонов Django, который замеряет время отрисовки.
+
+Подключается в ``TEMPLATES`` вместо стандартного бэкенда; время попадает
+в метрики и заголовок Server-Timing (events/middleware.py).
+"""
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates
+
+from .metrics import template_timer
+
+
+class TimedTemplate:
+    """Обёртка шаблона бэкенда с замером ``render()``"""
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        with template_timer():
+            return self._template.render(context, request)
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
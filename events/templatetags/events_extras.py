@@ -0,0 +1,48 @@
+from functools import lru_cache
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+
+register = template.Library()
+
+ICON_SPRITE = 'events/icons.svg'
+
+
+@lru_cache(maxsize=None)
+def icon_html(name, css_class=''):
+    # Адрес спрайта с хэшем меняется только после collectstatic и
+    # перезапуска, поэтому разметку иконки достаточно собрать один раз
+    return format_html(
+        '<svg class="bi{}" aria-hidden="true"><use href="{}#{}"></use></svg>',
+        f' {css_class}' if css_class else '', static(ICON_SPRITE), name,
+    )
+
+
+class IconNode(template.Node):
+    def __init__(self, name, css_class):
+        self.name = name
+        self.css_class = css_class
+
+    def render(self, context):
+        return icon_html(self.name, self.css_class)
+
+
+@register.tag
+def icon(parser, token):
+    """Иконка Bootstrap Icons из спрайта events/icons.svg:
+    ``{% icon 'calendar3' %}`` или ``{% icon 'calendar3' 'доп-класс' %}``.
+
+    Спрайт содержит только иконки, которые используются в шаблонах;
+    новую иконку нужно сначала добавить в него. Аргументы - только
+    строки: на странице списка иконок десятки, и разбирать переменные
+    при каждой отрисовке незачем.
+    """
+    bits = token.split_contents()[1:]
+    if not 1 <= len(bits) <= 2 or any(len(bit) < 2 or bit[0] != bit[-1] or bit[0] not in '\'"' for bit in bits):
+        raise template.TemplateSyntaxError(
+            "Тег icon принимает имя иконки и необязательный CSS-класс в кавычках"
+        )
+    name, css_class = [bit[1:-1] for bit in bits] + [''] * (2 - len(bits))
+    return IconNode(name, css_class)
@@ -1,3 +1,1117 @@
-from django.test import TestCase
+import base64
+import json
+import multiprocessing
+import queue
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, connections, router, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import changes, expiry, ical, recurrence, search
+from .benchmarks import generate_events, seed_events
+from .middleware import ReplicaPinMiddleware
+from .models import DailyEventCount, Event, EventChange, Venue, normalize_venue
+from .pagination import KeysetPaginator
+from .signals import events_changed
+
+
+def create_event(days=1, time=None, **fields):
+    """Мероприятие через ``days`` дней от сегодняшнего"""
+    fields.setdefault('title', 'Концерт')
+    fields.setdefault('location', 'Центральный парк')
+    fields.setdefault('description', 'Описание')
+    return Event.objects.create(date=timezone.localdate() + timedelta(days=days), time=time, **fields)
+
+
+def use_database(path):
+    """В дочернем процессе переключает соединение на файловую базу path.
+    Унаследованное от родителя соединение с тестовой базой в памяти не
+    закрывается (это уничтожило бы её), а просто забывается."""
+    connection.settings_dict['NAME'] = path
+    connection.connection = None
+
+
+def prepare_database(path, count):
+    use_database(path)
+    call_command('migrate', verbosity=0)
+    seed_events(count)
+    connections.close_all()
+
+
+def read_loop(path, deadline, batch_size, committed, results):
+    """Читатель: число мероприятий не меньше зафиксированного к началу
+    чтения и кратно пачке писателя (незафиксированных строк не видно)"""
+    use_database(path)
+    errors, stale, reads = [], 0, 0
+    base = committed.value
+    while time.monotonic() < deadline:
+        expected = committed.value
+        try:
+            seen = Event.objects.count()
+        except OperationalError as error:
+            errors.append(str(error))
+            continue
+        reads += 1
+        if seen < expected or (seen - base) % batch_size:
+            stale += 1
+    journal_mode = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+    connections.close_all()
+    results.put(('read', reads, stale, errors, journal_mode))
+
+
+def write_loop(path, deadline, batch_size, committed, results):
+    """Писатель: добавляет пачку мероприятий и держит транзакцию открытой,
+    как массовое действие в админке"""
+    use_database(path)
+    errors, writes = [], 0
+    while time.monotonic() < deadline:
+        try:
+            with transaction.atomic():
+                Event.objects.bulk_create(generate_events(batch_size, seed=writes))
+                time.sleep(0.02)
+        except OperationalError as error:
+            errors.append(str(error))
+            continue
+        writes += 1
+        committed.value += batch_size
+    connections.close_all()
+    results.put(('write', writes, 0, errors, None))
+
+
+class ExpiryTests(TestCase):
+    def test_expire_past_events_in_batches(self):
+        for _ in range(5):
+            create_event(1, dt_time(10))
+        upcoming = create_event(3)
+        later = timezone.now() + timedelta(days=2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(expiry.expire_past_events(later, batch_size=2), 5)
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "events_event"')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(list(Event.objects.filter(is_active=True)), [upcoming])
+        self.assertEqual(expiry.expire_past_events(later), 0)
+
+    def test_next_expiry(self):
+        self.assertIsNone(expiry.next_expiry())
+        event = create_event(1)
+        # Мероприятие без времени идёт до конца дня
+        self.assertEqual(
+            expiry.next_expiry(), timezone.make_aware(datetime.combine(event.date + timedelta(days=1), dt_time()))
+        )
+        create_event(2, dt_time(18))
+        create_event(1, dt_time(9), is_active=False)
+        event = create_event(1, dt_time(10))
+        self.assertEqual(expiry.next_expiry(), timezone.make_aware(datetime.combine(event.date, dt_time(10))))
+
+    def test_save_deactivates_started_event(self):
+        event = create_event(1)
+        event.date = timezone.localdate() - timedelta(days=1)
+        event.save()
+        self.assertFalse(Event.objects.get(id=event.id).is_active)
+
+        event.date = timezone.localdate() + timedelta(days=1)
+        event.is_active = True
+        event.save()
+        self.assertTrue(Event.objects.get(id=event.id).is_active)
+
+    def test_expired_events_get_new_updated_at(self):
+        event = create_event(1, dt_time(10))
+        day_ago = timezone.now() - timedelta(days=1)
+        Event.objects.filter(id=event.id).update(updated_at=day_ago)
+        expiry.expire_past_events(timezone.now() + timedelta(days=2))
+        self.assertGreater(Event.objects.get(id=event.id).updated_at, day_ago)
+
+
+class StartsAtTests(TestCase):
+    def assertStartsAt(self, event, day, start):
+        event.refresh_from_db()
+        self.assertEqual(event.starts_at, timezone.make_aware(datetime.combine(day, start)))
+
+    def test_save_keeps_starts_at_in_sync(self):
+        event = create_event(1, dt_time(10))
+        day = event.date
+        self.assertStartsAt(event, day, dt_time(10))
+
+        event.time = None
+        event.save()
+        self.assertStartsAt(event, day + timedelta(days=1), dt_time())
+
+        event.date = day + timedelta(days=5)
+        event.time = dt_time(19, 30)
+        event.save()
+        self.assertStartsAt(event, day + timedelta(days=5), dt_time(19, 30))
+
+
+class StartsAtMigrationTests(TransactionTestCase):
+    """Миграция 0003 заполняет starts_at у существующих мероприятий"""
+
+    before = [('events', '0002_alter_event_id')]
+    after = [('events', '0003_event_starts_at')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_starts_at_is_backfilled(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldEvent = executor.loader.project_state(self.before).apps.get_model('events', 'Event')
+        day = date(2027, 3, 1)
+        for start in (dt_time(19, 30), None):
+            OldEvent.objects.create(
+                title='Концерт', date=day, time=start, location='Парк', description='Описание',
+            )
+
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        Event = executor.loader.project_state(self.after).apps.get_model('events', 'Event')
+        self.assertEqual(
+            sorted(Event.objects.values_list('starts_at', flat=True)),
+            [
+                timezone.make_aware(datetime(2027, 3, 1, 19, 30)),
+                # Мероприятие без времени идёт до конца дня
+                timezone.make_aware(datetime(2027, 3, 2)),
+            ],
+        )
+
+
+class ConcurrentAccessTests(SimpleTestCase):
+    """Читатели в нескольких процессах и писатель с одной файловой базой
+    в режиме WAL (настройки SQLITE_PRAGMAS, events/db.py). Тестовая база
+    в памяти не используется: процессы работают со своей файловой базой."""
+
+    databases = {'default'}
+
+    READERS = 4
+    DURATION = 2.0
+    BATCH_SIZE = 50
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Проверяется только SQLite.')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = str(Path(directory) / 'concurrency.sqlite3')
+        self.context = multiprocessing.get_context('fork')
+
+    def run_process(self, target, *args):
+        process = self.context.Process(target=target, args=args)
+        process.start()
+        return process
+
+    def test_readers_and_writer(self):
+        process = self.run_process(prepare_database, self.path, 200)
+        process.join(timeout=60)
+        self.assertEqual(process.exitcode, 0)
+
+        committed = self.context.Value('i', 200)
+        results = self.context.Queue()
+        deadline = time.monotonic() + self.DURATION
+        args = (self.path, deadline, self.BATCH_SIZE, committed, results)
+        processes = [self.run_process(read_loop, *args) for _ in range(self.READERS)]
+        processes.append(self.run_process(write_loop, *args))
+        try:
+            collected = [results.get(timeout=self.DURATION + 30) for _ in processes]
+        except queue.Empty:
+            self.fail('Процесс проверки завершился с ошибкой.')
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+
+        writes = [result for result in collected if result[0] == 'write']
+        reads = [result for result in collected if result[0] == 'read']
+        self.assertGreater(writes[0][1], 0)
+        for _, count, stale, errors, journal_mode in reads:
+            self.assertEqual(journal_mode, 'wal')
+            self.assertGreater(count, 0)
+            self.assertEqual(stale, 0)
+        errors = [error for result in collected for error in result[3]]
+        self.assertEqual(errors, [])
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Несколько мероприятий в один день и в одно время, часть без времени
+        for days in (1, 2, 3):
+            for start in (None, dt_time(10), dt_time(10), dt_time(18)):
+                create_event(days, start)
+
+    def expected(self, descending):
+        """Порядок (date, time, id) в Python: NULL меньше любого времени"""
+        events = sorted(
+            Event.objects.all(),
+            key=lambda event: (event.date, event.time or dt_time.min, event.time is not None, event.id),
+            reverse=descending,
+        )
+        return [event.id for event in events]
+
+    def walk(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_next_cursors_visit_every_row_once(self):
+        for ordering, descending in ((('date', 'time', 'id'), False), (('-date', '-time', '-id'), True)):
+            for per_page in (1, 5, 12, 20):
+                with self.subTest(ordering=ordering, per_page=per_page):
+                    pages = self.walk(KeysetPaginator(Event.objects.all(), ordering, per_page))
+                    ids = [event.id for page in pages for event in page]
+                    self.assertEqual(ids, self.expected(descending))
+                    self.assertFalse(pages[0].has_previous)
+                    self.assertTrue(all(page.has_previous for page in pages[1:]))
+
+    def test_previous_cursor_returns_previous_page(self):
+        paginator = KeysetPaginator(Event.objects.all(), ('date', 'time', 'id'), 5)
+        pages = self.walk(paginator)
+        for previous, page in zip(pages, pages[1:]):
+            back = paginator.page(page.prev_cursor)
+            self.assertEqual([event.id for event in back], [event.id for event in previous])
+            self.assertTrue(back.has_next)
+        self.assertIsNone(paginator.page(pages[1].prev_cursor).prev_cursor)
+
+    def test_bad_cursor_returns_first_page(self):
+        paginator = KeysetPaginator(Event.objects.all(), ('date', 'time', 'id'), 5)
+        first = [event.id for event in paginator.page()]
+        valid = paginator.encode_cursor('n', Event.objects.get(id=first[-1]))
+
+        def encode(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        cursors = [
+            'мусор', valid[:-3], encode({}), encode(['x', []]),
+            # Не то число полей и значение не того типа
+            encode(['n', [1]]), encode(['n', ['завтра', None, 1]]),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                page = paginator.page(cursor)
+                self.assertEqual([event.id for event in page], first)
+                self.assertFalse(page.has_previous)
+
+
+class SearchTests(TestCase):
+    def search(self, text):
+        return list(search.search_events(Event.objects.all(), text))
+
+    def test_index_follows_save_and_delete(self):
+        event = create_event(title='Джазовый вечер')
+        self.assertEqual(self.search('джаз'), [event])
+
+        event.title = 'Органный концерт'
+        event.save()
+        self.assertEqual(self.search('джаз'), [])
+        self.assertEqual(self.search('органный'), [event])
+
+        event.delete()
+        self.assertEqual(self.search('органный'), [])
+
+    def test_bulk_update_is_reindexed(self):
+        events = [create_event(days, title='Лекция') for days in (1, 2)]
+        Event.objects.update(title='Мастер-класс')
+        # queryset.update не отправляет сигналов: индекс обновляет вызывающий
+        self.assertEqual(self.search('мастер'), [])
+        search.index_events(Event.objects.all())
+        self.assertEqual(sorted(event.id for event in self.search('мастер')), [event.id for event in events])
+        self.assertEqual(self.search('лекция'), [])
+
+        Event.objects.update(title='Спектакль')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('спектакль')), 2)
+
+    def test_fts_syntax_is_escaped(self):
+        event = create_event(title='Рок-н-ролл "Звёзды" AND NOT')
+        for text in ('рок-н-ролл', '"звёзды', 'звёзды*', 'NOT звёзды', 'рок AND', '(рок)', 'рок^'):
+            with self.subTest(text=text):
+                self.assertEqual(self.search(text), [event])
+        # Операторы FTS5 во вводе - просто слова, а не синтаксис запроса
+        for text in ('', '"', '*', '()', 'NEAR(', 'title:', 'рок OR'):
+            with self.subTest(text=text):
+                self.assertEqual(self.search(text), [])
+        self.assertEqual(search.build_match_query('рок" OR *'), '"рок"* AND "OR"*')
+
+
+# В тестах нет манифеста collectstatic
+PLAIN_STATIC_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class PageCacheTests(TestCase):
+    """Закэшированные страницы обновляются после сохранения и удаления"""
+
+    def setUp(self):
+        cache.clear()
+        self.first = create_event(1, title='Первое мероприятие')
+        self.second = create_event(2, title='Второе мероприятие')
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_page_is_served_from_cache(self):
+        url = reverse('event_list')
+        self.assertContains(self.get(url), 'Первое мероприятие')
+        # Правка в обход приложения не сбрасывает кэш
+        Event.objects.filter(id=self.first.id).update(title='Тайное название')
+        self.assertNotContains(self.get(url), 'Тайное название')
+
+    def test_save_invalidates_list_and_detail(self):
+        list_url = reverse('event_list')
+        detail_url = reverse('event_detail', args=[self.first.id])
+        self.get(list_url)
+        self.get(detail_url)
+
+        self.first.title = 'Новое название'
+        self.first.save()
+        self.assertContains(self.get(list_url), 'Новое название')
+        self.assertContains(self.get(detail_url), 'Новое название')
+
+    def test_delete_invalidates_list(self):
+        url = reverse('event_list')
+        self.get(url)
+        self.second.delete()
+        self.assertNotContains(self.get(url), 'Второе мероприятие')
+        self.get(reverse('event_detail', args=[self.first.id]))
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class ConditionalGetTests(TestCase):
+    """ETag и Last-Modified меняются после сохранения и удаления"""
+
+    def setUp(self):
+        cache.clear()
+        self.first = create_event(1, title='Первое мероприятие')
+        self.second = create_event(2, title='Второе мероприятие')
+
+    def get(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        self.assertIn(response.status_code, (200, 304))
+        return response
+
+    def assertUpdated(self, url, etag, text, present):
+        """Страница с прежним ETag собирается заново и (не) содержит text"""
+        response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        if present:
+            self.assertContains(response, text)
+        else:
+            self.assertNotContains(response, text)
+
+    def test_same_etag_answers_304(self):
+        for url in (reverse('event_list'), reverse('event_detail', args=[self.first.id])):
+            with self.subTest(url=url):
+                etag = self.get(url)['ETag']
+                self.assertEqual(self.get(url, if_none_match=etag).status_code, 304)
+
+    def test_save_changes_etags(self):
+        list_url = reverse('event_list')
+        detail_url = reverse('event_detail', args=[self.first.id])
+        list_etag = self.get(list_url)['ETag']
+        detail_etag = self.get(detail_url)['ETag']
+
+        self.first.title = 'Новое название'
+        self.first.save()
+        self.assertUpdated(list_url, list_etag, 'Новое название', present=True)
+        self.assertUpdated(detail_url, detail_etag, 'Новое название', present=True)
+
+    def test_delete_changes_list_etag(self):
+        url = reverse('event_list')
+        etag = self.get(url)['ETag']
+        self.second.delete()
+        self.assertUpdated(url, etag, 'Второе мероприятие', present=False)
+
+    def test_delete_moves_last_modified(self):
+        url = reverse('event_list')
+        hour_ago = timezone.now() - timedelta(hours=1)
+        Event.objects.update(updated_at=hour_ago)
+        EventChange.objects.update(changed_at=hour_ago)
+        cache.clear()
+        last_modified = self.get(url)['Last-Modified']
+        self.assertEqual(self.get(url, if_modified_since=last_modified).status_code, 304)
+
+        self.second.delete()
+        self.assertEqual(self.get(url, if_modified_since=last_modified).status_code, 200)
+
+    def test_list_validators_skip_table_aggregates(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(reverse('event_list'))
+        statements = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('COUNT(', statements)
+        self.assertNotIn('MAX(', statements)
+
+
+class ApiTests(TestCase):
+    def read_list(self, **params):
+        response = self.client.get(reverse('api_event_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in json.loads(b''.join(response.streaming_content))]
+
+    def test_list_filters(self):
+        first = create_event(1, location='Центральный парк')
+        second = create_event(3, location='Стадион')
+        create_event(2, is_active=False)
+        day = (timezone.localdate() + timedelta(days=2)).isoformat()
+
+        self.assertEqual(self.read_list(), [first.id, second.id])
+        self.assertEqual(self.read_list(date_from=day), [second.id])
+        self.assertEqual(self.read_list(date_to=day), [first.id])
+        self.assertEqual(self.read_list(date_from=day, date_to=day), [])
+        self.assertEqual(self.read_list(location='Стад'), [second.id])
+
+    def test_detail_shows_only_upcoming(self):
+        event = create_event(1, title='Концерт')
+        hidden = create_event(1, is_active=False)
+        response = self.client.get(reverse('api_event_detail', args=[event.id]))
+        self.assertEqual(response.json()['title'], 'Концерт')
+        self.assertEqual(self.client.get(reverse('api_event_detail', args=[hidden.id])).status_code, 404)
+
+    def test_bad_dates_are_rejected(self):
+        for params in ({'date_from': 'завтра'}, {'date_to': '2027-13-01'}, {'date_from': '01.02.2027'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('api_event_list'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('date_', response.json()['error'])
+
+    def test_venue_filter(self):
+        first = create_event(1, location='Центральный парк')
+        create_event(2, location='Стадион')
+        self.assertEqual(self.read_list(venue=str(first.venue_id)), [first.id])
+        response = self.client.get(reverse('api_event_list'), {'venue': 'парк'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportExportTests(TestCase):
+    FIELDS = ('title', 'date', 'time', 'location', 'description', 'image_url', 'is_active')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.directory = Path(directory)
+
+    def run_command(self, name, *args, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(name, *args, stdout=stdout, stderr=stderr, **options)
+        return stderr.getvalue()
+
+    def test_invalid_rows_are_reported(self):
+        day = (timezone.localdate() + timedelta(days=3)).isoformat()
+        path = self.directory / 'events.csv'
+        path.write_text(
+            'title,date,time,location,description\n'
+            f'Концерт,{day},19:00,Парк,Описание\n'
+            f',{day},,Парк,Без названия\n'
+            f'Лекция,послезавтра,,Библиотека,Неверная дата\n'
+            f'Выставка,{day},,Музей,Описание\n',
+            encoding='utf-8',
+        )
+        errors = self.run_command('import_events', str(path))
+        self.assertEqual(sorted(Event.objects.values_list('title', flat=True)), ['Выставка', 'Концерт'])
+        self.assertIn('Строка 3: title:', errors)
+        self.assertIn('Строка 4: date:', errors)
+
+        with self.assertRaisesMessage(CommandError, 'Строка 3: title:'):
+            self.run_command('import_events', str(path), strict=True)
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_export_import_round_trip(self):
+        create_event(1, dt_time(19, 30), title='Концерт, "вечер"', description='Первая строка\nвторая строка')
+        create_event(2, title='Выставка', image_url='https://example.com/poster.jpg')
+        create_event(3, title='Лекция', is_active=False)
+        expected = sorted(Event.objects.values_list(*self.FIELDS))
+        for file_format in ('csv', 'jsonl'):
+            with self.subTest(file_format=file_format):
+                path = self.directory / f'events.{file_format}'
+                self.run_command('export_events', str(path))
+                Event.objects.all().delete()
+                self.assertEqual(self.run_command('import_events', str(path)), '')
+                self.assertEqual(sorted(Event.objects.values_list(*self.FIELDS)), expected)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class BulkActionTests(TestCase):
+    url = reverse('admin_events_bulk')
+
+    def setUp(self):
+        cache.clear()
+        self.first = create_event(1, title='Первое мероприятие')
+        self.second = create_event(2, title='Второе мероприятие')
+        self.staff = Client()
+        self.staff.force_login(User.objects.create_user('admin', password='secret', is_staff=True))
+
+    def post(self, action, events):
+        response = self.staff.post(self.url, {'action': action, 'ids': [event.id for event in events]}, follow=True)
+        self.assertRedirects(response, reverse('admin_events'))
+        return [str(message) for message in response.context['messages']]
+
+    def active_ids(self):
+        return set(Event.objects.filter(is_active=True).values_list('id', flat=True))
+
+    def test_deactivate_and_activate(self):
+        self.assertEqual(self.post('deactivate', [self.first, self.second]), ['Деактивировано мероприятий: 2.'])
+        self.assertEqual(self.active_ids(), set())
+        self.assertEqual(self.post('activate', [self.first]), ['Активировано мероприятий: 1.'])
+        self.assertEqual(self.active_ids(), {self.first.id})
+
+    def test_past_events_are_not_activated(self):
+        past = create_event(-1)
+        self.second.is_active = False
+        self.second.save()
+        self.assertEqual(
+            self.post('activate', [past, self.first, self.second]),
+            ['Активировано мероприятий: 1.', 'Нельзя активировать прошедшие мероприятия: 1.'],
+        )
+        self.assertEqual(self.active_ids(), {self.first.id, self.second.id})
+
+    def test_delete(self):
+        self.assertEqual(self.post('delete', [self.first]), ['Удалено мероприятий: 1.'])
+        self.assertEqual(list(Event.objects.values_list('id', flat=True)), [self.second.id])
+
+    def test_unknown_action_and_empty_selection(self):
+        self.assertEqual(self.post('archive', [self.first]), ['Неизвестное действие.'])
+        self.assertEqual(self.post('delete', []), ['Не выбрано ни одного мероприятия.'])
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_public_list_follows_bulk_actions(self):
+        url = reverse('event_list')
+        self.assertContains(self.client.get(url), 'Первое мероприятие')
+        self.post('deactivate', [self.first])
+        self.assertNotContains(self.client.get(url), 'Первое мероприятие')
+        self.post('activate', [self.first])
+        self.assertContains(self.client.get(url), 'Первое мероприятие')
+        self.post('delete', [self.first])
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Первое мероприятие')
+        self.assertContains(response, 'Второе мероприятие')
+
+    def delete_queries(self, events):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.staff.post(self.url, {'action': 'delete', 'ids': [event.id for event in events]})
+        self.assertFalse(Event.objects.filter(id__in=[event.id for event in events]).exists())
+        return len(queries)
+
+    def test_delete_cost_does_not_grow_with_selection(self):
+        few = [create_event(days) for days in (5, 6)]
+        many = [create_event(days) for days in range(5, 35)]
+        self.assertEqual(self.delete_queries(many), self.delete_queries(few))
+
+    def test_delete_updates_index_counts_and_log(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.staff.post(self.url, {'action': 'delete', 'ids': [self.first.id]})
+        self.assertEqual(list(search.search_events(Event.objects.all(), 'мероприятие')), [self.second])
+        self.assertEqual(set(DailyEventCount.objects.values_list('date', flat=True)), {self.second.date})
+        self.assertEqual(EventChange.objects.filter(event_id=self.first.id).latest('id').action, 'deleted')
+
+    @override_settings(RECURRENCE_WINDOW_DAYS=10)
+    def test_delete_occurrences_and_series(self):
+        master = create_event(1, recurrence='daily')
+        occurrence = Event.objects.filter(series=master).earliest('date')
+        self.assertEqual(self.post('delete', [occurrence]), ['Удалено мероприятий: 1.'])
+        master.refresh_from_db()
+        # Удалённый повтор не создаётся снова
+        self.assertEqual(master.recurrence_exclude, [occurrence.date.isoformat()])
+
+        count = Event.objects.filter(series=master).count()
+        self.assertEqual(self.post('delete', [master]), [f'Удалено мероприятий: {count + 1}.'])
+        self.assertFalse(Event.objects.filter(series_id=master.id).exists())
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class AdminSearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('admin', password='secret', is_staff=True))
+
+    def search_page(self, page=None):
+        params = {'search': 'джаз'}
+        if page is not None:
+            params['page'] = page
+        return self.client.get(reverse('admin_events'), params)
+
+    @patch('events.views.ADMIN_EVENTS_PAGE_SIZE', 2)
+    def test_search_results_are_paginated(self):
+        events = [create_event(days, title=f'Джаз {days}') for days in range(1, 6)]
+        create_event(1, title='Лекция')
+
+        seen, page = [], 1
+        while True:
+            response = self.search_page(page)
+            seen += [event.id for event in response.context['events']]
+            if not response.context['page'].has_next:
+                break
+            self.assertContains(response, f'?search=%D0%B4%D0%B6%D0%B0%D0%B7&amp;page={page + 1}')
+            page += 1
+        self.assertEqual(page, 3)
+        self.assertEqual(sorted(seen), [event.id for event in events])
+        # Неверный номер - первая страница
+        self.assertEqual(list(self.search_page('abc').context['events']), list(self.search_page().context['events']))
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    factory = RequestFactory()
+
+    def read_alias(self, request):
+        """База, из которой представление читает мероприятия"""
+        aliases = []
+
+        def view(request):
+            aliases.append(router.db_for_read(Event))
+            return HttpResponse()
+
+        with patch('events.routers.replica_configured', return_value=True):
+            ReplicaPinMiddleware(view)(request)
+        return aliases[0]
+
+    def test_anonymous_reads_use_replica(self):
+        self.assertEqual(self.read_alias(self.factory.get('/')), 'replica')
+        self.assertEqual(self.read_alias(self.factory.head('/')), 'replica')
+
+    def test_sessions_and_writes_use_primary(self):
+        self.assertEqual(self.read_alias(self.factory.post('/admin/events/1/toggle/')), 'default')
+        for cookie in (settings.SESSION_COOKIE_NAME, settings.REPLICA_PIN_COOKIE):
+            with self.subTest(cookie=cookie):
+                request = self.factory.get('/admin/events/1/edit/')
+                request.COOKIES[cookie] = '1'
+                self.assertEqual(self.read_alias(request), 'default')
+
+
+class DayCountTests(TestCase):
+    def counts(self):
+        return {row.date: (row.active, row.total) for row in DailyEventCount.objects.all()}
+
+    def test_counts_follow_changes(self):
+        day1, day2, day3 = (timezone.localdate() + timedelta(days=days) for days in (1, 2, 3))
+        with self.captureOnCommitCallbacks(execute=True):
+            first = create_event(1)
+            second = create_event(1)
+            create_event(2)
+        self.assertEqual(self.counts(), {day1: (2, 2), day2: (1, 1)})
+
+        # Перенос на другой день пересчитывает оба дня
+        with self.captureOnCommitCallbacks(execute=True):
+            first.date = day3
+            first.save()
+        self.assertEqual(self.counts(), {day1: (1, 1), day2: (1, 1), day3: (1, 1)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.is_active = False
+            second.save()
+        self.assertEqual(self.counts()[day1], (0, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Event.objects.filter(id=first.id).update(is_active=False)
+            events_changed.send(sender=Event, event_ids=[first.id], using='default')
+        self.assertEqual(self.counts()[day3], (0, 1))
+
+        # День без мероприятий не хранится
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.counts(), {day2: (1, 1), day3: (0, 1)})
+
+    def test_rebuild_day_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_event(1)
+            create_event(1, is_active=False)
+            create_event(2)
+        expected = self.counts()
+        DailyEventCount.objects.all().delete()
+        DailyEventCount.objects.create(date=timezone.localdate(), active=5, total=5)
+        call_command('rebuild_day_counts', stdout=StringIO())
+        self.assertEqual(self.counts(), expected)
+
+    def test_calendar_api(self):
+        day = timezone.localdate() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_event(1)
+            create_event(1)
+        response = self.client.get(reverse('api_event_calendar'), {'month': day.strftime('%Y-%m')})
+        self.assertIn({'date': day.isoformat(), 'events': 2}, response.json()['days'])
+        for month in ('2027', '2027-13', 'май'):
+            with self.subTest(month=month):
+                response = self.client.get(reverse('api_event_calendar'), {'month': month})
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class IcalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches[ical.CACHE_ALIAS].clear()
+        self.first = create_event(1, dt_time(19), title='Концерт')
+        self.second = create_event(2, title='Выставка')
+
+    def test_event_ics_answers_304(self):
+        url = reverse('event_ics', args=[self.first.id])
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], ical.CONTENT_TYPE)
+        self.assertContains(response, 'SUMMARY:Концерт')
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, headers={'if_none_match': etag}).status_code, 304)
+
+        self.first.title = 'Новый концерт'
+        self.first.save()
+        response = self.client.get(url, headers={'if_none_match': etag})
+        self.assertContains(response, 'SUMMARY:Новый концерт')
+
+    def test_feed_answers_304(self):
+        url = reverse('events_ics')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'if_none_match': etag}).status_code, 304)
+        self.second.delete()
+        response = self.client.get(url, headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Выставка')
+
+    def test_fragments_are_reused_after_unrelated_edit(self):
+        url = reverse('events_ics')
+        self.client.get(url)
+        self.second.title = 'Новая выставка'
+        self.second.save()
+        with patch.object(ical, 'render_fragment', wraps=ical.render_fragment) as render:
+            response = self.client.get(url)
+        self.assertContains(response, 'SUMMARY:Концерт')
+        self.assertContains(response, 'SUMMARY:Новая выставка')
+        # Заново собран только блок изменённого мероприятия
+        self.assertEqual([call.args[0]['id'] for call in render.call_args_list], [self.second.id])
+
+    @override_settings(ICAL_UID_DOMAIN='afisha.example')
+    def test_uid_uses_fixed_domain(self):
+        response = self.client.get(reverse('event_ics', args=[self.first.id]))
+        self.assertContains(response, f'UID:event-{self.first.id}@afisha.example')
+
+    def test_ics_and_page_have_different_etags(self):
+        page_etag = self.client.get(reverse('event_detail', args=[self.first.id]))['ETag']
+        url = reverse('event_ics', args=[self.first.id])
+        self.assertNotEqual(self.client.get(url)['ETag'], page_etag)
+        response = self.client.get(url, headers={'if_none_match': page_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'BEGIN:VEVENT')
+
+
+class ChangeFeedTests(TestCase):
+    url = reverse('api_event_changes')
+
+    def read(self, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cursor_points_to_last_entry(self):
+        create_event()
+        data = self.read()
+        self.assertRegex(data['next'], r'^\d+-\d+$')
+        last = EventChange.objects.latest('id')
+        self.assertEqual(data['next'], changes.encode_cursor(last.changed_at, last.id))
+        self.assertEqual(changes.parse_cursor(data['next']), (last.changed_at, last.id))
+        # Без новых записей курсор не двигается
+        self.assertEqual(self.read(data['next']), {'changes': [], 'next': data['next'], 'has_more': False})
+
+    def test_since_returns_later_changes_once_per_event(self):
+        first = create_event(title='Первое')
+        cursor = self.read()['next']
+        first.title = 'Первое, новое название'
+        first.save()
+        first.save()
+        second = create_event(title='Второе')
+
+        data = self.read(cursor)
+        self.assertEqual(
+            [(change['event_id'], change['action']) for change in data['changes']],
+            [(first.id, 'updated'), (second.id, 'created')],
+        )
+        self.assertEqual(data['changes'][0]['event']['title'], 'Первое, новое название')
+
+    def test_deleted_event_is_tombstone(self):
+        event = create_event()
+        cursor = self.read()['next']
+        event_id = event.id
+        event.delete()
+
+        change, = self.read(cursor)['changes']
+        self.assertEqual(change['event_id'], event_id)
+        self.assertEqual(change['action'], 'deleted')
+        self.assertIsNone(change['event'])
+
+    def test_created_then_deleted_event_comes_only_as_tombstone(self):
+        cursor = self.read()['next']
+        event = create_event()
+        event_id = event.id
+        event.delete()
+        self.assertEqual(
+            [(change['event_id'], change['action']) for change in self.read(cursor)['changes']],
+            [(event_id, 'deleted')],
+        )
+
+    def test_limit_splits_changes_into_pages(self):
+        events = [create_event(days) for days in (1, 2, 3)]
+        data = self.read(limit=2)
+        self.assertTrue(data['has_more'])
+        self.assertEqual([change['event_id'] for change in data['changes']], [event.id for event in events[:2]])
+        data = self.read(data['next'], limit=2)
+        self.assertFalse(data['has_more'])
+        self.assertEqual([change['event_id'] for change in data['changes']], [events[2].id])
+
+    def test_bulk_created_events_are_logged_as_created(self):
+        seed_events(3, past_ratio=0)
+        self.assertEqual(
+            sorted(EventChange.objects.values_list('action', flat=True)), ['created'] * 3
+        )
+
+    def test_unknown_cursor_is_gone(self):
+        create_event()
+        last = EventChange.objects.latest('id')
+        for cursor in (
+            changes.encode_cursor(last.changed_at, last.id + 1),
+            # Журнал пересоздан: id тот же, а время записи другое
+            changes.encode_cursor(last.changed_at - timedelta(seconds=1), last.id),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'since': cursor})
+                self.assertEqual(response.status_code, 410)
+
+    def test_invalid_parameters(self):
+        for params in ({'since': 'вчера'}, {'since': '12-'}, {'limit': '0'}, {'limit': 'много'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+@override_settings(RECURRENCE_WINDOW_DAYS=10)
+class RecurrenceTests(TestCase):
+    def create_series(self, **fields):
+        fields.setdefault('recurrence', 'daily')
+        return create_event(1, **fields)
+
+    def run_exclusions(self, callbacks):
+        """Колбэки фиксации, которые записывают исключённые даты"""
+        for callback in callbacks:
+            if callback is recurrence._flush_excluded:
+                callback()
+
+    def occurrence_dates(self, master):
+        return list(Event.objects.filter(series=master).order_by('date').values_list('date', flat=True))
+
+    def test_expand_daily_and_weekly(self):
+        first = date(2027, 1, 1)
+        daily = Event(date=first, recurrence='daily', recurrence_interval=3, recurrence_exclude=['2027-01-07'])
+        self.assertEqual(
+            list(recurrence.expand(daily, date(2027, 1, 2), date(2027, 1, 13))),
+            [date(2027, 1, 4), date(2027, 1, 10), date(2027, 1, 13)],
+        )
+        weekly = Event(date=first, recurrence='weekly', recurrence_interval=2, recurrence_until=date(2027, 2, 20))
+        # Первое мероприятие серии в повторы не входит
+        self.assertEqual(
+            list(recurrence.expand(weekly, date(2026, 12, 1), date(2027, 12, 31))),
+            [date(2027, 1, 15), date(2027, 1, 29), date(2027, 2, 12)],
+        )
+
+    def test_expand_monthly_skips_short_months(self):
+        event = Event(date=date(2027, 1, 31), recurrence='monthly', recurrence_interval=1)
+        self.assertEqual(
+            list(recurrence.expand(event, date(2027, 1, 1), date(2027, 8, 31))),
+            [date(2027, 3, 31), date(2027, 5, 31), date(2027, 7, 31), date(2027, 8, 31)],
+        )
+        self.assertEqual(list(recurrence.expand(Event(date=date(2027, 1, 31)), date(2027, 1, 1), date(2027, 12, 31))), [])
+
+    def test_saving_master_materializes_window(self):
+        master = self.create_series()
+        today = timezone.localdate()
+        self.assertEqual(self.occurrence_dates(master), [today + timedelta(days=days) for days in range(2, 11)])
+        master.refresh_from_db()
+        self.assertEqual(master.recurrence_materialized_until, recurrence.window_end(today))
+
+    def test_master_edits_reach_occurrences_except_hidden_state(self):
+        master = self.create_series()
+        hidden = Event.objects.filter(series=master).earliest('date')
+        hidden.is_active = False
+        hidden.save()
+
+        master.title = 'Новое название'
+        master.save()
+        self.assertEqual(set(Event.objects.filter(series=master).values_list('title', flat=True)), {'Новое название'})
+        self.assertFalse(Event.objects.get(id=hidden.id).is_active)
+
+        # Без правила повторения повторы удаляются
+        master.recurrence = ''
+        master.save()
+        self.assertEqual(self.occurrence_dates(master), [])
+
+    def test_deleted_occurrence_is_excluded(self):
+        master = self.create_series()
+        deleted = Event.objects.filter(series=master).order_by('date')[1:3]
+        days = [event.date for event in deleted]
+        with self.captureOnCommitCallbacks(execute=True):
+            Event.objects.filter(id__in=[event.id for event in deleted]).delete()
+
+        master.refresh_from_db()
+        self.assertEqual(master.recurrence_exclude, [day.isoformat() for day in days])
+        recurrence.materialize(master, sync=True)
+        self.assertFalse(set(days) & set(self.occurrence_dates(master)))
+
+    def test_exclusions_are_written_once_per_series(self):
+        master = self.create_series()
+        ids = list(Event.objects.filter(series=master).values_list('id', flat=True))
+        with self.captureOnCommitCallbacks() as callbacks:
+            Event.objects.filter(id__in=ids).delete()
+        # Чтение серии и одна запись её исключений
+        with self.assertNumQueries(2):
+            self.run_exclusions(callbacks)
+        master.refresh_from_db()
+        self.assertEqual(len(master.recurrence_exclude), len(ids))
+
+    def test_deleting_series_skips_exclusions(self):
+        master = self.create_series()
+        with self.captureOnCommitCallbacks() as callbacks:
+            master.delete()
+        self.assertFalse(Event.objects.exists())
+        # Серия не найдена - записывать нечего
+        with self.assertNumQueries(1):
+            self.run_exclusions(callbacks)
+
+    def test_exclude_date(self):
+        master = self.create_series()
+        day = timezone.localdate() + timedelta(days=20)
+        recurrence.exclude_date(master.id, day)
+        recurrence.exclude_date(master.id, day)
+        master.refresh_from_db()
+        self.assertEqual(master.recurrence_exclude, [day.isoformat()])
+        # Серии уже нет: исключать нечего
+        recurrence.exclude_date(master.id + 1000, day)
+
+    def test_roll_window(self):
+        master = self.create_series()
+        today = timezone.localdate() + timedelta(days=3)
+        self.assertEqual(recurrence.roll_window(today), (3, 1))
+        self.assertEqual(self.occurrence_dates(master), [today + timedelta(days=days) for days in range(0, 11)])
+        self.assertEqual(recurrence.roll_window(today), (0, 0))
+
+    def test_count_beyond_window(self):
+        master = self.create_series()
+        today = timezone.localdate()
+        expected = [today + timedelta(days=days) for days in range(11, 21)]
+        self.assertEqual(sorted(recurrence.count_beyond_window(today, today + timedelta(days=20))), expected)
+        # Начавшееся первое мероприятие снято с публикации, а повторы остаются
+        Event.objects.filter(id=master.id).update(is_active=False)
+        self.assertEqual(sorted(recurrence.count_beyond_window(today, today + timedelta(days=20))), expected)
+
+
+class VenueTests(TestCase):
+    def test_normalize_venue(self):
+        self.assertEqual(normalize_venue('Парк Горького'), 'парк горького')
+        for spelling in ('парк  горького', '«Парк Горького»', 'ПАРК ГОРЬКОГО.', ' Парк, Горького '):
+            with self.subTest(spelling=spelling):
+                self.assertEqual(normalize_venue(spelling), 'парк горького')
+        self.assertEqual(normalize_venue('Зелёный театр'), normalize_venue('Зеленый театр'))
+        self.assertNotEqual(normalize_venue('Парк Горького'), normalize_venue('Парк Победы'))
+        # Название из одних знаков не превращается в пустой ключ
+        self.assertEqual(normalize_venue(' !!! '), '!!!')
+
+    def test_spellings_share_one_venue(self):
+        venue = Venue.objects.for_name('  Парк   Горького ')
+        self.assertEqual(venue.name, 'Парк Горького')
+        self.assertEqual(Venue.objects.for_name('«парк горького»'), venue)
+
+        event = create_event(location='ПАРК ГОРЬКОГО')
+        self.assertEqual(event.venue, venue)
+        self.assertEqual(event.location, 'Парк Горького')
+        self.assertEqual(Venue.objects.count(), 1)
+
+    def test_for_names_and_assign(self):
+        existing = Venue.objects.for_name('Парк Горького')
+        events = [
+            Event(location=location)
+            for location in ('парк горького', 'Дом культуры', 'дом  культуры', 'Стадион')
+        ]
+        with self.assertNumQueries(3):
+            Venue.objects.assign(events)
+        self.assertEqual(events[0].venue, existing)
+        self.assertEqual(events[1].venue, events[2].venue)
+        self.assertEqual([event.location for event in events], ['Парк Горького', 'Дом культуры', 'Дом культуры', 'Стадион'])
+        self.assertEqual(Venue.objects.count(), 3)
+
+    def test_duplicate_venue_is_rejected(self):
+        Venue.objects.for_name('Парк Горького')
+        with self.assertRaises(ValidationError):
+            Venue(name='парк, Горького').full_clean()
+
+    def test_rename_updates_event_locations(self):
+        event = create_event(location='Парк Горького')
+        venue = event.venue
+        venue.name = 'Парк имени Горького'
+        venue.save()
+        event.refresh_from_db()
+        self.assertEqual(event.location, 'Парк имени Горького')
+        self.assertEqual(list(search.search_events(Event.objects.all(), 'имени')), [event])
+
+
+class VenueMigrationTests(TransactionTestCase):
+    """Миграция 0009 объединяет написания одного места"""
+
+    before = [('events', '0008_dailyeventcount')]
+    after = [('events', '0009_venue')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_spellings_are_merged(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldEvent = executor.loader.project_state(self.before).apps.get_model('events', 'Event')
+        today = timezone.localdate()
+        for location in ('Парк Горького', 'Парк Горького', 'парк  горького', 'Стадион'):
+            OldEvent.objects.create(
+                title='Концерт', date=today, location=location, description='Описание',
+                starts_at=timezone.now(),
+            )
+
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        Venue = apps.get_model('events', 'Venue')
+        Event = apps.get_model('events', 'Event')
+        self.assertEqual(sorted(Venue.objects.values_list('name', flat=True)), ['Парк Горького', 'Стадион'])
+        self.assertEqual(
+            sorted(Event.objects.values_list('location', 'venue__name')),
+            [('Парк Горького', 'Парк Горького')] * 3 + [('Стадион', 'Стадион')],
+        )
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class ServerTimingTests(TestCase):
+    url = reverse('event_list')
+
+    def test_header_only_for_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get(self.url))
+        self.client.force_login(User.objects.create_user('visitor', password='secret'))
+        self.assertNotIn('Server-Timing', self.client.get(self.url))
+        self.client.force_login(User.objects.create_user('admin', password='secret', is_staff=True))
+        self.assertIn('Server-Timing', self.client.get(self.url))
+
+    @override_settings(DEBUG=True)
+    def test_header_for_everyone_with_debug(self):
+        self.assertIn('Server-Timing', self.client.get(self.url))
@@ -2,66 +2,144 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils import timezone
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
-from datetime import datetime, time as dt_time
-from .models import Event
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from . import conditional, day_counts, ical, metrics, recurrence, search
+from .models import Event, Venue
 from .forms import EventForm
+from .page_cache import cache_public_page
+from .pagination import KeysetPage, KeysetPaginator
+from .search import search_events
+from .signals import events_changed
+
+
+# Размеры страниц и порядок сортировки списков
+EVENT_LIST_PAGE_SIZE = 20
+EVENT_LIST_ORDERING = ('date', 'time', 'id')
+ADMIN_EVENTS_PAGE_SIZE = 50
+ADMIN_EVENTS_ORDERING = ('-date', '-time', '-id')
+
+# Колонки, которые выводят карточки афиши и строки таблицы в админке:
+# описание целиком не читается, анонс и флаг «началось» считает SQL
+EVENT_CARD_FIELDS = ('id', 'title', 'date', 'time', 'location', 'venue', 'image', 'image_variants', 'image_url')
+ADMIN_ROW_FIELDS = ('id', 'title', 'date', 'time', 'location', 'is_active', 'recurrence', 'series')
+
+
+def event_cards(venue=None):
+    """Предстоящие мероприятия для карточек в event_list.html
+    (только места ``venue``, если оно указано)"""
+    events = Event.objects.upcoming()
+    if venue is not None:
+        events = events.filter(venue=venue)
+    return events.only(*EVENT_CARD_FIELDS).with_teaser()
 
 
+def venue_id(request):
+    """id места из параметра ?venue= (None, если его нет)"""
+    value = request.GET.get('venue')
+    if not value:
+        return None
+    if not value.isdigit():
+        raise Http404('Место не найдено.')
+    return int(value)
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=conditional.event_list_etag,
+           last_modified_func=conditional.event_list_last_modified)
+@cache_public_page('event_list')
 def event_list(request):
     """Главная страница - список будущих мероприятий"""
-    now = timezone.now()
-    now_date = now.date()
-    now_time = now.time()
+    # Прошедшие события деактивирует планировщик (команда expire_events),
+    # а здесь они просто отфильтровываются - страница только читает данные
+    selected = venue_id(request)
+    venue = get_object_or_404(Venue, id=selected) if selected is not None else None
+    paginator = KeysetPaginator(
+        event_cards(venue), EVENT_LIST_ORDERING, EVENT_LIST_PAGE_SIZE
+    )
+    page = paginator.page(request.GET.get('cursor'))
+    
+    return render(request, 'events/event_list.html', {
+        'events': page.object_list,
+        'page': page,
+        'venue': venue
+    })
+
+
+def event_search(request):
+    """Поиск по предстоящим мероприятиям (результаты по релевантности)"""
+    search_query = request.GET.get('q', '').strip()
+    if not search_query:
+        return redirect('event_list')
     
-    # Автоматически деактивируем все прошедшие активные события
-    # Получаем все активные события и проверяем каждое
-    all_active = list(Event.objects.filter(is_active=True).values('id', 'date', 'time'))
-    events_to_deactivate = []
+    events = search_events(event_cards(), search_query)
     
-    for event_data in all_active:
-        event_date = event_data['date']
-        event_time = event_data['time']
-        
-        # Если дата в прошлом - событие точно прошло
-        if event_date < now_date:
-            events_to_deactivate.append(event_data['id'])
-        # Если дата сегодня и время указано и уже прошло
-        elif event_date == now_date and event_time is not None:
-            event_datetime = timezone.make_aware(
-                datetime.combine(event_date, event_time)
-            )
-            if event_datetime <= now:
-                events_to_deactivate.append(event_data['id'])
-    
-    # Массово деактивируем прошедшие события
-    if events_to_deactivate:
-        Event.objects.filter(id__in=events_to_deactivate).update(is_active=False)
-    
-    # Фильтруем только активные события, которые еще не прошли
-    # Используем двойную фильтрацию: по is_active и по дате/времени
-    events = Event.objects.filter(
-        is_active=True
-    ).exclude(
-        # Исключаем события с прошедшей датой
-        date__lt=now_date
-    ).exclude(
-        # Исключаем события сегодня с прошедшим временем
-        date=now_date,
-        time__isnull=False,
-        time__lte=now_time
-    ).order_by('date', 'time')
-    
-    return render(request, 'events/event_list.html', {'events': events})
+    return render(request, 'events/event_list.html', {
+        'events': events,
+        'search_query': search_query
+    })
 
 
+@cache_control(no_cache=True)
+@condition(etag_func=conditional.event_detail_etag,
+           last_modified_func=conditional.event_detail_last_modified)
+@cache_public_page('event_detail')
 def event_detail(request, event_id):
     """Страница деталей мероприятия"""
-    event = get_object_or_404(Event, id=event_id, is_active=True)
+    event = get_object_or_404(Event.objects.upcoming(), id=event_id)
     return render(request, 'events/event_detail.html', {'event': event})
 
 
+@cache_control(no_cache=True)
+@condition(etag_func=conditional.event_list_etag,
+           last_modified_func=conditional.event_list_last_modified)
+def events_ics(request):
+    """Лента предстоящих мероприятий в формате iCalendar"""
+    return HttpResponse(ical.render_feed(request), content_type=ical.CONTENT_TYPE)
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=conditional.event_detail_etag,
+           last_modified_func=conditional.event_detail_last_modified)
+def event_ics(request, event_id):
+    """Одно мероприятие в формате iCalendar"""
+    content = ical.render_event(request, event_id)
+    if content is None:
+        raise Http404
+    response = HttpResponse(content, content_type=ical.CONTENT_TYPE)
+    response['Content-Disposition'] = f'inline; filename="event-{event_id}.ics"'
+    return response
+
+
+def event_calendar(request):
+    """Календарь месяца: сколько мероприятий в каждый день.
+    Читает только таблицу счётчиков, не больше 42 строк."""
+    today = timezone.localdate()
+    try:
+        month = day_counts.parse_month(request.GET.get('month'), today)
+    except ValueError:
+        return redirect('event_calendar')
+    weeks, counts = day_counts.month_grid(month.year, month.month)
+    previous_month, next_month = day_counts.adjacent_months(month)
+
+    return render(request, 'events/event_calendar.html', {
+        'month': month,
+        'weeks': [
+            [{'date': day, 'count': counts.get(day, 0), 'in_month': day.month == month.month} for day in week]
+            for week in weeks
+        ],
+        'today': today,
+        'previous_month': previous_month,
+        'next_month': next_month,
+    })
+
+
 def admin_login(request):
     """Страница входа в административную панель"""
     if request.user.is_authenticated:
@@ -97,41 +175,30 @@ def admin_events(request):
         messages.error(request, 'У вас нет доступа к этой странице.')
         return redirect('event_list')
     
-    now = timezone.now()
-    now_date = now.date()
-    now_time = now.time()
+    events = Event.objects.only(*ADMIN_ROW_FIELDS).with_started()
     
-    # Автоматически деактивируем все прошедшие активные события
-    all_active = list(Event.objects.filter(is_active=True).values('id', 'date', 'time'))
-    events_to_deactivate = []
-    
-    for event_data in all_active:
-        event_date = event_data['date']
-        event_time = event_data['time']
-        
-        # Если дата в прошлом - событие точно прошло
-        if event_date < now_date:
-            events_to_deactivate.append(event_data['id'])
-        # Если дата сегодня и время указано и уже прошло
-        elif event_date == now_date and event_time is not None:
-            if event_time <= now_time:
-                events_to_deactivate.append(event_data['id'])
-    
-    # Массово деактивируем прошедшие события
-    if events_to_deactivate:
-        Event.objects.filter(id__in=events_to_deactivate).update(is_active=False)
-    
-    events = Event.objects.all().order_by('-date', '-time')
-    
-    # Поиск по названию или месту
-    search_query = request.GET.get('search', '')
+    # Поиск по названию, месту и описанию: совпадения по релевантности,
+    # страницы - по номеру (смещению в ранжированном списке)
+    search_query = request.GET.get('search', '').strip()
     if search_query:
-        events = events.filter(
-            Q(title__icontains=search_query) | Q(location__icontains=search_query)
+        number = request.GET.get('page', '')
+        number = int(number) if number.isdigit() and int(number) > 0 else 1
+        rows = list(search_events(
+            events, search_query,
+            limit=ADMIN_EVENTS_PAGE_SIZE + 1, offset=(number - 1) * ADMIN_EVENTS_PAGE_SIZE,
+        ))
+        page = KeysetPage(
+            rows[:ADMIN_EVENTS_PAGE_SIZE],
+            next_cursor=number + 1 if len(rows) > ADMIN_EVENTS_PAGE_SIZE else None,
+            prev_cursor=number - 1 if number > 1 else None,
         )
+    else:
+        paginator = KeysetPaginator(events, ADMIN_EVENTS_ORDERING, ADMIN_EVENTS_PAGE_SIZE)
+        page = paginator.page(request.GET.get('cursor'))
     
     return render(request, 'events/admin_events.html', {
-        'events': events,
+        'events': page.object_list,
+        'page': page,
         'search_query': search_query
     })
 
@@ -144,7 +211,7 @@ def admin_event_add(request):
         return redirect('event_list')
     
     if request.method == 'POST':
-        form = EventForm(request.POST)
+        form = EventForm(request.POST, request.FILES)
         if form.is_valid():
             event = form.save()
             messages.success(request, 'Мероприятие успешно добавлено.')
@@ -170,7 +237,7 @@ def admin_event_edit(request, event_id):
     event = get_object_or_404(Event, id=event_id)
     
     if request.method == 'POST':
-        form = EventForm(request.POST, instance=event)
+        form = EventForm(request.POST, request.FILES, instance=event)
         if form.is_valid():
             form.save()
             messages.success(request, 'Мероприятие успешно обновлено.')
@@ -227,4 +294,94 @@ def admin_event_delete(request, event_id):
         messages.success(request, f'Мероприятие "{event_title}" успешно удалено.')
         return redirect('admin_events')
     
-    return render(request, 'events/admin_event_delete.html', {'event': event})
\ No newline at end of file
+    return render(request, 'events/admin_event_delete.html', {'event': event})
+
+
+def _delete_events(ids):
+    """Удаляет мероприятия ``ids`` вместе с повторами их серий одним
+    запросом. queryset.delete() отправлял бы post_delete на каждую строку
+    (индекс, счётчики дней, журнал, кэш), поэтому то же делается здесь
+    сразу для всех строк. Возвращает число удалённых строк."""
+    requested = {int(event_id) for event_id in ids}
+    rows = Event.objects.filter(Q(id__in=requested) | Q(series__in=requested))
+    deleted = list(rows.values_list('id', 'series_id', 'date'))
+    if not deleted:
+        return 0
+    deleted_ids = [event_id for event_id, _, _ in deleted]
+    # Удалённый повтор не создаётся снова, если его серия осталась
+    excluded = {}
+    for _, series_id, day in deleted:
+        if series_id is not None and series_id not in requested:
+            excluded.setdefault(series_id, set()).add(day)
+
+    with transaction.atomic():
+        # Повторы удаляются тем же запросом, что и их серии, поэтому
+        # каскад Django не нужен
+        rows._raw_delete(rows.db)
+        search.remove_events(deleted_ids)
+        day_counts.mark_days({day for _, _, day in deleted})
+        if excluded:
+            recurrence.exclude_dates(excluded)
+        events_changed.send(sender=Event, event_ids=deleted_ids, using='default', action='deleted')
+    return len(deleted_ids)
+
+
+@login_required
+@require_POST
+def admin_events_bulk(request):
+    """Массовые действия с отмеченными мероприятиями"""
+    if not request.user.is_staff:
+        messages.error(request, 'У вас нет доступа к этой странице.')
+        return redirect('event_list')
+    
+    action = request.POST.get('action')
+    ids = [event_id for event_id in request.POST.getlist('ids') if event_id.isdigit()]
+    if not ids:
+        messages.error(request, 'Не выбрано ни одного мероприятия.')
+        return redirect('admin_events')
+    
+    events = Event.objects.filter(id__in=ids)
+    now = timezone.now()
+    
+    if action == 'activate':
+        # Прошедшие мероприятия активировать нельзя
+        inactive = list(events.filter(is_active=False).values_list('id', 'starts_at'))
+        changed_ids = [event_id for event_id, starts_at in inactive if starts_at > now]
+        refused = len(inactive) - len(changed_ids)
+        Event.objects.filter(id__in=changed_ids).update(is_active=True, updated_at=now)
+        messages.success(request, f'Активировано мероприятий: {len(changed_ids)}.')
+        if refused:
+            messages.error(request, f'Нельзя активировать прошедшие мероприятия: {refused}.')
+    elif action == 'deactivate':
+        changed_ids = list(events.filter(is_active=True).values_list('id', flat=True))
+        Event.objects.filter(id__in=changed_ids).update(is_active=False, updated_at=now)
+        messages.success(request, f'Деактивировано мероприятий: {len(changed_ids)}.')
+    elif action == 'delete':
+        deleted = _delete_events(ids)
+        messages.success(request, f'Удалено мероприятий: {deleted}.')
+        return redirect('admin_events')
+    else:
+        messages.error(request, 'Неизвестное действие.')
+        return redirect('admin_events')
+    
+    if changed_ids:
+        events_changed.send(sender=Event, event_ids=changed_ids, using='default')
+    return redirect('admin_events')
+
+
+def metrics_view(request):
+    """Метрики производительности в формате Prometheus.
+
+    Доступны персоналу, а сборщику метрик - по токену из настройки
+    METRICS_TOKEN в заголовке ``Authorization: Bearer <токен>``.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    has_token = bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+    if not has_token and not request.user.is_staff:
+        return HttpResponseForbidden('Нет доступа к метрикам.')
+    
+    return HttpResponse(
+        metrics.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,83 @@
+"""Прогрев процесса перед первыми запросами (gunicorn.conf.py).
+
+Без прогрева воркер компилирует регулярные выражения адресов, шаблоны,
+читает манифест статики и каталоги переводов на первых запросах, и их
+ждут пользователи сразу после выкладки или перезапуска воркера. С
+``preload_app`` код и шаблоны прогреваются один раз в главном процессе
+gunicorn, а воркеры получают готовое при fork. Соединение с базой
+открывается уже в каждом воркере: одно соединение SQLite нельзя делить
+между процессами.
+"""
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connections
+from django.template import engines
+from django.template.loader import get_template
+from django.urls import get_resolver
+from django.utils import formats, translation
+from django.utils.module_loading import import_string
+
+from . import invalidation
+from .templatetags.events_extras import ICON_SPRITE
+
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / 'templates'
+
+
+def template_names():
+    """Шаблоны приложения: events/*.html"""
+    return sorted(f'events/{path.name}' for path in (TEMPLATES_DIR / 'events').glob('*.html'))
+
+
+def warm_code():
+    """Адреса, шаблоны, отложенные импорты Django, статика и переводы.
+    Возвращает время по шагам в миллисекундах."""
+    timings = {}
+
+    started = time.perf_counter()
+    # Обратный словарь строится по всем адресам и компилирует их выражения
+    get_resolver().reverse_dict
+    timings['urls'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    # Кэширующий загрузчик хранит скомпилированные шаблоны до конца процесса
+    for name in template_names():
+        get_template(name)
+    timings['templates'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    # Модули, которые Django импортирует только на первом запросе
+    for engine in engines.all():
+        for path in engine.engine.context_processors:
+            import_string(path)
+    import_string(settings.MESSAGE_STORAGE)
+    import_string(settings.SESSION_SERIALIZER)
+    for alias in connections:
+        connections[alias].ops.compiler('SQLCompiler')
+    timings['modules'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    # Манифест имён с хэшем читается при первом обращении к хранилищу
+    staticfiles_storage.url(ICON_SPRITE)
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('')
+        formats.get_format('DATE_FORMAT')
+    timings['static, i18n'] = (time.perf_counter() - started) * 1000
+
+    # Главный процесс не должен передать воркерам открытых соединений
+    connections.close_all()
+    return timings
+
+
+def warm_connections():
+    """Открывает соединения с базами (с настройками SQLite из
+    events/db.py) и файл номера поколения кэшей. Возвращает время
+    в миллисекундах."""
+    started = time.perf_counter()
+    for alias in connections:
+        connections[alias].ensure_connection()
+    invalidation.check()
+    return (time.perf_counter() - started) * 1000
@@ -0,0 +1,55 @@
+"""Настройки gunicorn: ``gunicorn -c gunicorn.conf.py``.
+
+gunicorn читает этот файл и без ``-c``, если запущен из корня проекта.
+Приложение загружается один раз в главном процессе (``preload_app``) и
+прогревается там же (events/warmup.py): воркеры получают импортированный
+Django, адреса и скомпилированные шаблоны при fork, а не собирают их на
+первых запросах. Каждый воркер при старте только открывает соединение
+с базой. Параметры командной строки (``-b``, ``-w``) важнее этого файла.
+
+Учтите: с ``preload_app`` код не перечитывается по SIGHUP - после
+выкладки gunicorn нужно перезапустить целиком.
+"""
+import os
+
+
+wsgi_app = 'city_events.wsgi:application'
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+preload_app = True
+
+# Ответ больше 30 секунд - признак зависания, а не долгой выгрузки
+timeout = 30
+graceful_timeout = 30
+
+# Перезапуск воркеров ограничивает рост памяти; разброс не даёт им
+# перезапуститься одновременно. Новый воркер уже прогрет (см. выше).
+max_requests = 5000
+max_requests_jitter = 500
+
+
+def when_ready(server):
+    """Главный процесс загрузил приложение: прогрев до запуска воркеров"""
+    from events import warmup
+
+    timings = warmup.warm_code()
+    server.log.info(
+        'Прогрев: %s', ', '.join(f'{step} {elapsed:.1f} мс' for step, elapsed in timings.items())
+    )
+
+
+def child_exit(server, worker):
+    """Воркер завершился: его метрики переносятся в общий файл"""
+    from events import metrics
+
+    metrics.retire(worker.pid)
+
+
+def post_worker_init(worker):
+    """Воркер запущен: соединение с базой до первого запроса"""
+    from events import warmup
+
+    elapsed = warmup.warm_connections()
+    worker.log.debug('Воркер %s: соединение с базой за %.1f мс', worker.pid, elapsed)